@@ -0,0 +1,137 @@
+"""
+Asynchronous extraction of journey data. Each journey's blocking calls run on
+a thread pool, so many journeys can be extracted at once, though the calls
+within one journey depend on each other and run in turn.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
+from functools import cache, partial
+import threading
+
+from config import HTTP_POOL_SIZE
+from extract import (
+    get_airport_location,
+    get_car_carbon_data,
+    get_carbon_rail_data,
+    get_flight_carbon_data,
+    get_journey_data,
+    get_rail_location,
+    resolve_postcodes
+)
+from location_index import LocationIndex
+
+
+@cache
+def get_executor() -> ThreadPoolExecutor:
+    """Returns the executor that runs requests on the shared HTTP session."""
+
+    return ThreadPoolExecutor(max_workers=HTTP_POOL_SIZE, thread_name_prefix="extract")
+
+
+async def run_blocking(func, *args, executor: ThreadPoolExecutor = None):
+    """
+    Runs a blocking extract function without blocking the event loop, on the
+    shared executor unless given another.
+    """
+
+    loop = asyncio.get_running_loop()
+
+    # Runs in a copy of the caller's context so timings reach the current rerun.
+    context = contextvars.copy_context()
+
+    return await loop.run_in_executor(executor or get_executor(),
+                                      partial(context.run, func, *args))
+
+
+async def get_rail_db_data_async(origin_station: str, dest_station: str, station_index: LocationIndex) -> dict:
+    """Returns the database document for a rail journey."""
+
+    origin_location = get_rail_location(origin_station, station_index)
+    dest_location = get_rail_location(dest_station, station_index)
+
+    carbon_data = await run_blocking(get_carbon_rail_data, origin_location, dest_location)
+
+    return get_journey_data({'type': 'rail'},
+                            origin_location | {'name': origin_station},
+                            dest_location | {'name': dest_station},
+                            carbon_data)
+
+
+async def get_car_db_data_async(origin_postcode: str, dest_postcode: str, car_details: dict) -> dict:
+    """
+    Returns the database document for a car journey, locating both postcodes in
+    one bulk lookup before estimating, which needs their coordinates.
+    """
+
+    locations = await run_blocking(resolve_postcodes, [origin_postcode, dest_postcode])
+
+    for postcode, location in locations.items():
+        if location is None:
+            raise ValueError(f"Invalid postcode: {postcode}")
+
+    origin_location, dest_location = locations[origin_postcode], locations[dest_postcode]
+
+    carbon_data = await run_blocking(get_car_carbon_data, origin_location, dest_location, car_details)
+
+    return get_journey_data({'type': 'car',
+                             'car_size': car_details['car_size'],
+                             'car_type': car_details['car_type']},
+                            origin_location, dest_location, carbon_data)
+
+
+async def get_flight_db_data_async(origin_airport: str, dest_airport: str, cabin_class: str,
+                                   airport_index: LocationIndex) -> dict:
+    """Returns the database document for a flight."""
+
+    origin_location = get_airport_location(origin_airport, airport_index)
+    dest_location = get_airport_location(dest_airport, airport_index)
+
+    carbon_data = await run_blocking(get_flight_carbon_data, origin_location, dest_location, cabin_class)
+
+    return get_journey_data({'type': 'air', 'cabin_class': cabin_class},
+                            origin_location | {'name': origin_airport},
+                            dest_location | {'name': dest_airport},
+                            carbon_data)
+
+
+async def gather_db_data_async(coroutines: list, limit: int = HTTP_POOL_SIZE) -> list:
+    """
+    Runs many journey coroutines at once, at most `limit` at a time, returning
+    each journey or the exception it raised in the original order.
+    """
+
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run_limited(coroutine):
+        async with semaphore:
+            return await coroutine
+
+    return await asyncio.gather(*(run_limited(c) for c in coroutines), return_exceptions=True)
+
+
+def run_sync(coroutine):
+    """Runs a coroutine to completion from synchronous code, such as a Streamlit callback."""
+
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+
+    result = dict()
+
+    def run_in_thread():
+        try:
+            result['value'] = asyncio.run(coroutine)
+        except Exception as err:  # pylint: disable=broad-except
+            result['error'] = err
+
+    thread = threading.Thread(target=contextvars.copy_context().run, args=(run_in_thread,))
+    thread.start()
+    thread.join()
+
+    if 'error' in result:
+        raise result['error']
+
+    return result['value']
@@ -0,0 +1,64 @@
+"""Rail estimates from the station distance matrix against estimating them from coordinates."""
+
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, ".")
+
+# pylint: disable=wrong-import-position
+from config import get_station_index
+from distance_matrix import estimate_rail_carbon_data, get_station_distance_matrix
+from offline_estimator import estimate_carbon_data
+
+NUM_JOURNEYS = 10000
+
+
+def time_ms(func, *args) -> float:
+    """Returns how long func(*args) takes in ms."""
+
+    start = time.perf_counter()
+    func(*args)
+
+    return (time.perf_counter() - start) * 1e3
+
+
+def estimate_from_coordinates(pairs: list) -> None:
+    """Estimates each journey from its stations' coordinates."""
+
+    station_index = get_station_index()
+
+    for origin, dest in pairs:
+        origin_location = station_index.get_location(origin)
+        dest_location = station_index.get_location(dest)
+        estimate_carbon_data({
+            'travel_mode': 'rail',
+            'origin': {'latitude': origin_location['lat'], 'longitude': origin_location['long']},
+            'destination': {'latitude': dest_location['lat'], 'longitude': dest_location['long']}
+        })
+
+
+def estimate_from_matrix(pairs: list) -> None:
+    """Estimates each journey from the distance matrix."""
+
+    for origin, dest in pairs:
+        estimate_rail_carbon_data(origin, dest)
+
+
+if __name__ == "__main__":
+
+    load_ms = time_ms(get_station_distance_matrix)
+
+    rng = np.random.default_rng(0)
+    names = get_station_index().get_names()
+    station_pairs = [tuple(rng.choice(names, 2)) for _ in range(NUM_JOURNEYS)]
+    origins, dests = zip(*station_pairs)
+
+    print(f"Matrix loaded (or built) in {load_ms:.1f} ms")
+    print(f"{NUM_JOURNEYS} estimates from coordinates: "
+          f"{time_ms(estimate_from_coordinates, station_pairs):.1f} ms")
+    print(f"{NUM_JOURNEYS} estimates from the matrix: "
+          f"{time_ms(estimate_from_matrix, station_pairs):.1f} ms")
+    print(f"{NUM_JOURNEYS} vectorised distance lookups: "
+          f"{time_ms(get_station_distance_matrix().get_distances, origins, dests):.2f} ms")
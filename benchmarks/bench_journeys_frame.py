@@ -0,0 +1,81 @@
+"""Benchmark of building a journeys dataframe: the original nested joins against typed batches."""
+
+import sys
+import time
+import tracemalloc
+
+from bson import ObjectId
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, ".")
+
+# pylint: disable=wrong-import-position
+from journeys_frame import build_journeys_df, get_memory_usage
+
+JOURNEYS = 200_000
+
+
+def iter_synthetic_journeys(size: int):
+    """Lazily yields random journeys in the shape stored by the dashboard, like a cursor."""
+
+    rng = np.random.default_rng(0)
+    user_id = ObjectId()
+
+    for i in range(size):
+        transport = ['rail', 'car', 'air'][i % 3]
+        details = {'car': {'car_size': 'small', 'car_type': 'petrol'},
+                   'air': {'cabin_class': 'economy'}}.get(transport, {})
+        total = float(rng.uniform(1, 100))
+        yield {
+            '_id': ObjectId(), 'user_id': user_id,
+            'transport': {'type': transport} | details,
+            'origin': {'name': f"Origin {i % 500}", 'lat': float(rng.uniform(50, 58)),
+                       'lon': float(rng.uniform(-5, 1))},
+            'destination': {'name': f"Destination {i % 500}", 'lat': float(rng.uniform(50, 58)),
+                            'lon': float(rng.uniform(-5, 1))},
+            'co2e': {'total': total, 'direct': total * 0.8, 'indirect': total * 0.2},
+            'distance': float(rng.uniform(1, 1000)),
+            'submitted_at': pd.Timestamp(1_700_000_000 + i, unit='s').to_pydatetime()}
+
+
+def get_journeys_df_joins(user_journeys) -> pd.DataFrame:
+    """The original builder, which lists every journey before joining each nested column."""
+
+    journeys_df = pd.DataFrame(list(user_journeys))
+
+    journeys_df = journeys_df.join(pd.DataFrame(
+        journeys_df.pop('transport').values.tolist()).rename(columns={'type': 'transport'}))
+
+    journeys_df = journeys_df.join(pd.DataFrame(
+        journeys_df.pop('origin').values.tolist()).rename(
+            columns={'name': 'origin_name', 'lat': 'origin_lat', 'lon': 'origin_lon'}))
+
+    journeys_df = journeys_df.join(pd.DataFrame(
+        journeys_df.pop('destination').values.tolist()).rename(
+            columns={'name': 'dest_name', 'lat': 'dest_lat', 'lon': 'dest_lon'}))
+
+    return journeys_df.join(pd.DataFrame(journeys_df.pop('co2e').values.tolist()))
+
+
+def measure(label: str, build) -> None:
+    """Prints the build time, peak allocation and final size of a dataframe builder."""
+
+    start = time.perf_counter()
+    build(iter_synthetic_journeys(JOURNEYS))
+    seconds = time.perf_counter() - start
+
+    tracemalloc.start()
+    journeys_df = build(iter_synthetic_journeys(JOURNEYS))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"  {label:10} {seconds * 1e3:7.0f} ms, peak {peak / 1e6:6.1f} MB, "
+          f"frame {get_memory_usage(journeys_df) / 1e6:6.1f} MB")
+
+
+if __name__ == "__main__":
+
+    print(f"{JOURNEYS} journeys, including generating them")
+    measure("Joins", get_journeys_df_joins)
+    measure("Columnar", build_journeys_df)
@@ -0,0 +1,71 @@
+"""Micro-benchmark of station and airport lookups: pandas boolean masks against the indexes."""
+
+import sys
+import timeit
+
+import pandas as pd
+
+sys.path.insert(0, ".")
+
+# pylint: disable=wrong-import-position
+from location_index import build_airport_index, build_station_index
+
+STATIONS = ["Bristol Temple Meads", "London Paddington", "York", "Aber"]
+
+AIRPORTS = ["London Heathrow Airport", "Edinburgh Airport", "Bristol Airport"]
+
+
+def get_rail_location_pandas(station: str, stations_df: pd.DataFrame) -> dict:
+    """The original DataFrame scan used by get_rail_location."""
+
+    station_data = stations_df[stations_df['stationName'] == station]
+
+    lat = station_data['lat'].values[0]
+    long = station_data['long'].values[0]
+
+    return {'lat': lat, 'long': long}
+
+
+def get_airport_location_pandas(airport: str, airports_df: pd.DataFrame) -> dict:
+    """The original DataFrame scan used by get_airport_location."""
+
+    airport_data = airports_df[airports_df['name'] == airport]
+
+    lat = airport_data['latitude_deg'].values[0]
+    long = airport_data['longitude_deg'].values[0]
+    iata = airport_data['iata_code'].values[0]
+
+    return {'lat': lat, 'long': long, 'iata': iata}
+
+
+def time_lookups(func, names: list, number: int) -> float:
+    """Returns the mean time in microseconds of one lookup."""
+
+    total = timeit.timeit(lambda: [func(n) for n in names], number=number)
+
+    return total / (number * len(names)) * 1e6
+
+
+def compare(label: str, df: pd.DataFrame, names: list, build_index, pandas_lookup) -> None:
+    """Prints the build time of an index and its lookup speed against pandas."""
+
+    build_ms = timeit.timeit(lambda: build_index(df), number=5) / 5 * 1e3
+    index = build_index(df)
+
+    pandas_us = time_lookups(lambda n: pandas_lookup(n, df), names, 200)
+    index_us = time_lookups(index.get_location, names, 50000)
+
+    print(f"{label} ({len(df)} rows)")
+    print(f"  Index build:  {build_ms:.2f} ms")
+    print(f"  Pandas mask:  {pandas_us:.2f} us per lookup")
+    print(f"  Index:        {index_us:.2f} us per lookup")
+    print(f"  Speed-up:     {pandas_us / index_us:.0f}x")
+
+
+if __name__ == "__main__":
+
+    compare("Stations", pd.read_csv("./data/stations.csv"), STATIONS,
+            build_station_index, get_rail_location_pandas)
+
+    compare("Airports", pd.read_csv("./data/airports.csv").dropna(axis=0, subset=['iata_code']),
+            AIRPORTS, build_airport_index, get_airport_location_pandas)
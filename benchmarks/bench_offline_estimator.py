@@ -0,0 +1,32 @@
+"""Throughput of the vectorised offline estimator over synthetic journeys."""
+
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, ".")
+
+# pylint: disable=wrong-import-position
+from offline_estimator import estimate_emissions, get_factor_table
+
+NUM_JOURNEYS = 1_000_000
+
+
+if __name__ == "__main__":
+
+    rng = np.random.default_rng(0)
+
+    factor_keys = rng.choice(get_factor_table().index.to_numpy(), NUM_JOURNEYS)
+    lats = rng.uniform(50, 58, (2, NUM_JOURNEYS))
+    longs = rng.uniform(-5, 1, (2, NUM_JOURNEYS))
+
+    estimate_emissions(factor_keys[:10], lats[0, :10],
+                       longs[0, :10], lats[1, :10], longs[1, :10])
+
+    start = time.perf_counter()
+    estimate_emissions(factor_keys, lats[0], longs[0], lats[1], longs[1])
+    elapsed_ms = (time.perf_counter() - start) * 1e3
+
+    print(f"{NUM_JOURNEYS} journeys in {elapsed_ms:.1f} ms "
+          f"({NUM_JOURNEYS / elapsed_ms:.0f} journeys per ms)")
@@ -0,0 +1,46 @@
+"""Micro-benchmark of station and airport search: a linear scan against the search index."""
+
+import sys
+import timeit
+
+import pandas as pd
+
+sys.path.insert(0, ".")
+
+# pylint: disable=wrong-import-position
+from location_index import build_airport_index, build_station_index
+from search_index import SearchIndex
+
+QUERIES = ["l", "lon", "london", "kings cr", "edinb", "lhr", "kgx", "zzz"]
+
+
+def get_stations_linear(search: str, names: list) -> list:
+    """The original lowercase substring scan used by the rail form."""
+
+    return [s for s in names if search.lower() in s.lower()] if search else []
+
+
+def compare(label: str, index) -> None:
+    """Prints the build time of a search index and its query speed against a linear scan."""
+
+    build_ms = timeit.timeit(lambda: SearchIndex.from_location_index(index), number=3) / 3 * 1e3
+    search_index = SearchIndex.from_location_index(index)
+    names = index.get_names()
+
+    print(f"{label} ({len(names)} names, {len(search_index.keys)} keys)")
+    print(f"  Index build:  {build_ms:.2f} ms")
+
+    for query in QUERIES:
+        linear_us = timeit.timeit(
+            lambda q=query: get_stations_linear(q, names), number=50) / 50 * 1e6
+        index_us = timeit.timeit(
+            lambda q=query: search_index.search(q), number=5000) / 5000 * 1e6
+        print(f"  {query!r:12} linear {linear_us:9.1f} us, index {index_us:6.1f} us")
+
+
+if __name__ == "__main__":
+
+    compare("Stations", build_station_index(pd.read_csv("./data/stations.csv")))
+
+    compare("Airports", build_airport_index(
+        pd.read_csv("./data/airports.csv").dropna(axis=0, subset=['iata_code'])))
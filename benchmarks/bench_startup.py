@@ -0,0 +1,49 @@
+"""Startup cost of importing config and first access of the reference data."""
+
+import shutil
+import statistics
+import subprocess
+import sys
+
+RUNS = 5
+
+SNIPPET = """
+import time
+start = time.perf_counter()
+import config
+imported = time.perf_counter()
+config.get_station_index()
+config.get_airport_index()
+config.get_car_size_data()
+loaded = time.perf_counter()
+print((imported - start) * 1e3, (loaded - imported) * 1e3)
+"""
+
+
+def time_startup(clear_cache: bool) -> tuple:
+    """Returns the median import and first-access times in ms over several runs."""
+
+    import_times, load_times = [], []
+
+    for _ in range(RUNS):
+
+        if clear_cache:
+            shutil.rmtree("./data/.cache", ignore_errors=True)
+
+        output = subprocess.run([sys.executable, "-c", SNIPPET], capture_output=True,
+                                text=True, check=True).stdout.split()
+
+        import_times.append(float(output[0]))
+        load_times.append(float(output[1]))
+
+    return statistics.median(import_times), statistics.median(load_times)
+
+
+if __name__ == "__main__":
+
+    for label, clear_cache in (("From CSV", True), ("From Parquet", False)):
+
+        import_ms, load_ms = time_startup(clear_cache)
+
+        print(f"{label}: import config {import_ms:.1f} ms, "
+              f"first access of reference data {load_ms:.1f} ms")
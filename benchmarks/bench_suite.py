@@ -0,0 +1,278 @@
+"""
+End-to-end benchmark suite, run against local stand-ins for Climatiq, postcodes.io and MongoDB.
+
+Measures latency percentiles and throughput of the journey lookups, the
+dashboard's submit flows, the route comparison, building the journeys
+dataframe and every chart builder, and writes them as JSON so runs can be compared across commits:
+
+    python benchmarks/bench_suite.py --latency-ms 50 --error-rate 0.05
+    python benchmarks/bench_suite.py --baseline benchmarks/results/<commit>.json
+"""
+
+from argparse import ArgumentParser
+from datetime import datetime, timedelta
+import json
+from os import environ, makedirs, path
+import platform
+import random
+import subprocess
+import sys
+import time
+
+from bson import ObjectId
+import mongomock
+import numpy as np
+
+sys.path.insert(0, ".")
+sys.path.insert(0, path.dirname(__file__))
+
+# pylint: disable=wrong-import-position
+from fake_services import run_fake_services
+
+RESULTS_DIR = "./benchmarks/results"
+
+POSTCODES = ["BA1 1AA", "BS1 5TR", "GL50 1AA", "BS8 1TH", "BA2 3DQ", "GL51 8NP"]
+
+
+def get_commit() -> str:
+    """Returns the short hash of the checked out commit, or 'unknown'."""
+
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def get_stats(samples: list, wall_seconds: float, errors: int) -> dict:
+    """Returns latency percentiles in ms, throughput per second and the error count."""
+
+    samples_ms = np.asarray(samples) * 1e3 if samples else np.zeros(1)
+
+    return {'runs': len(samples), 'errors': errors,
+            'p50_ms': round(float(np.percentile(samples_ms, 50)), 3),
+            'p90_ms': round(float(np.percentile(samples_ms, 90)), 3),
+            'p99_ms': round(float(np.percentile(samples_ms, 99)), 3),
+            'mean_ms': round(float(samples_ms.mean()), 3),
+            'max_ms': round(float(samples_ms.max()), 3),
+            'throughput_per_s': round(len(samples) / wall_seconds, 1) if wall_seconds else 0.0}
+
+
+def run_scenario(func, iterations: int, setup=None) -> dict:
+    """Times func(i) for each iteration, after an untimed setup(), counting raised errors."""
+
+    samples, errors = [], 0
+    wall_start = time.perf_counter()
+
+    for i in range(iterations):
+
+        if setup:
+            setup()
+
+        start = time.perf_counter()
+
+        try:
+            func(i)
+        except Exception:  # pylint: disable=broad-exception-caught
+            errors += 1
+
+        samples.append(time.perf_counter() - start)
+
+    return get_stats(samples, time.perf_counter() - wall_start, errors)
+
+
+def get_history(user_id: ObjectId, size: int) -> list:
+    """Returns a history of synthetic journeys for the user."""
+
+    rng = random.Random(0)
+    now = datetime.now()
+
+    return [{
+        'user_id': user_id, 'transport': {'type': rng.choice(['rail', 'car', 'air'])},
+        'origin': {'name': f"Origin {i % 100}", 'lat': 51.0, 'lon': -2.0},
+        'destination': {'name': f"Destination {i % 100}", 'lat': 52.0, 'lon': -1.0},
+        'co2e': {'total': 10.0, 'direct': 8.0, 'indirect': 2.0},
+        'distance': rng.uniform(1, 1000), 'submitted_at': now - timedelta(minutes=i)}
+        for i in range(size)]
+
+
+def run_suite(options, service_urls: dict) -> dict:  # pylint: disable=too-many-locals
+    """Runs every scenario against the fake services, returning the results of each."""
+
+    environ['CLIMATIQ_URL'] = service_urls['climatiq']
+    environ['POSTCODE_BASE_URL'] = service_urls['postcodes']
+    environ.setdefault('EMISSIONS_CACHE_PATH', ":memory:")
+    environ.setdefault('ESTIMATION_MODE', "climatiq")
+    environ.setdefault('JOURNEY_OUTBOX_PATH', ":memory:")
+    # The fake Climatiq has no rate limit, so don't throttle the app's calls to it.
+    environ.setdefault('CLIMATIQ_RATE_LIMIT', "1000")
+    environ.setdefault('CLIMATIQ_BURST', "1000")
+
+    # The app reads the service URLs when first imported.
+    # pylint: disable=import-outside-toplevel
+    import streamlit as st
+
+    import dashboard
+    from config import get_airport_index, get_station_index
+    from database import get_journeys_cursor, get_user_summary, insert_journeys
+    from emissions_cache import get_emissions_cache
+    from extract import get_car_db_data, get_flight_db_data, get_rail_db_data
+    from journey_outbox import OutboxFlusher, get_journey_outbox
+    from journeys_frame import build_journeys_df
+    from postcodes import get_postcode_resolver
+    from route_comparison import compare_journey_routes
+    from submission_worker import get_submission_worker
+    import visuals
+
+    rng = random.Random(0)
+    stations = rng.sample(get_station_index().get_names(), 50)
+    airports = get_airport_index().get_names()[:50]
+
+    def pick(names: list, i: int) -> tuple:
+        return names[i % len(names)], names[(i * 7 + 1) % len(names)]
+
+    def clear_caches() -> None:
+        if not options.warm:
+            get_emissions_cache().clear()
+            get_postcode_resolver.cache_clear()
+
+    journey_collection = mongomock.MongoClient().eco_travel.journeys
+    user_id = ObjectId()
+
+    st.session_state.user_id = user_id
+    st.session_state.journey_coll = journey_collection
+
+    def wait_for_submission() -> None:
+        job = get_submission_worker().wait(st.session_state.submission_jobs.pop())
+        if job['status'] != 'done':
+            raise RuntimeError(job['error'])
+
+    def submit_rail(i: int) -> None:
+        origin, dest = pick(stations, i)
+        st.session_state.origin_station = {'result': origin}
+        st.session_state.dest_station = {'result': dest}
+        dashboard.submit_and_clear_rail()
+        wait_for_submission()
+
+    def submit_car(i: int) -> None:
+        st.session_state.origin_postcode, st.session_state.dest_postcode = pick(POSTCODES, i)
+        st.session_state.car_size, st.session_state.car_type = "Small", "Petrol"
+        dashboard.submit_and_clear_car()
+        wait_for_submission()
+
+    def submit_air(i: int) -> None:
+        origin, dest = pick(airports, i)
+        st.session_state.origin_airport = {'result': origin}
+        st.session_state.dest_airport = {'result': dest}
+        st.session_state.cabin_class = "Economy"
+        dashboard.submit_and_clear_air()
+        wait_for_submission()
+
+    car_details = {'car_size': 'small', 'car_type': 'petrol'}
+
+    scenarios = {
+        'get_rail_db_data': (lambda i: get_rail_db_data(*pick(stations, i), get_station_index()),
+                             clear_caches),
+        'get_car_db_data': (lambda i: get_car_db_data(*pick(POSTCODES, i), car_details),
+                            clear_caches),
+        'get_flight_db_data': (lambda i: get_flight_db_data(*pick(airports, i), 'economy',
+                                                            get_airport_index()), clear_caches),
+        'submit_and_clear_rail': (submit_rail, clear_caches),
+        'submit_and_clear_car': (submit_car, clear_caches),
+        'submit_and_clear_air': (submit_air, clear_caches)
+    }
+
+    results = {name: run_scenario(func, options.iterations, setup)
+               for name, (func, setup) in scenarios.items()}
+
+    # The submitted journeys are stored once the outbox is flushed.
+    OutboxFlusher(get_journey_outbox(), journey_collection).flush()
+    insert_journeys(journey_collection, get_history(user_id, options.history))
+
+    journeys_df = build_journeys_df(get_journeys_cursor(journey_collection, user_id, 1000))
+    summary = get_user_summary(journey_collection, user_id)
+    journey = journey_collection.find_one({'user_id': user_id, 'co2e.total': {'$ne': 10.0}})
+    comparison = compare_journey_routes(journey)
+
+    history = list(journey_collection.find({'user_id': user_id}, limit=options.iterations))
+
+    results['compare_journey_routes'] = run_scenario(
+        lambda i: compare_journey_routes(history[i % len(history)]), options.iterations,
+        clear_caches)
+
+    builders = {
+        'build_journeys_df': lambda _: build_journeys_df(
+            get_journeys_cursor(journey_collection, user_id, 1000)),
+        'get_journey_map': lambda _: visuals.get_journey_map(journey).to_json(),
+        'get_carbon_pie': lambda _: visuals.get_carbon_pie(journey).to_dict(),
+        'get_comparison_bar': lambda _: visuals.get_comparison_bar(comparison, 12.5).to_dict(),
+        'get_transport_bar': lambda _: visuals.get_transport_bar(journeys_df).to_dict(),
+        'get_transport_avgs': lambda _: visuals.get_transport_avgs(summary).to_dict(),
+        'get_transport_avg_km': lambda _: visuals.get_transport_avg_km(summary).to_dict(),
+        'get_transport_donut': lambda _: visuals.get_transport_donut(summary).to_dict()
+    }
+
+    results |= {name: run_scenario(func, options.builder_iterations)
+                for name, func in builders.items()}
+
+    return results
+
+
+def print_results(results: dict, baseline: dict = None) -> None:
+    """Prints each scenario's latency and throughput, with the change from a baseline."""
+
+    for name, stats in results.items():
+
+        line = (f"{name:24} p50 {stats['p50_ms']:9.2f} ms  p90 {stats['p90_ms']:9.2f} ms  "
+                f"p99 {stats['p99_ms']:9.2f} ms  {stats['throughput_per_s']:8.1f}/s  "
+                f"{stats['errors']} errors")
+
+        previous = (baseline or {}).get(name)
+
+        if previous and previous['p50_ms']:
+            line += f"  (p50 {stats['p50_ms'] / previous['p50_ms'] - 1:+.0%})"
+
+        print(line)
+
+
+if __name__ == "__main__":
+
+    parser = ArgumentParser(description="Benchmark the dashboard against local fake services.")
+    parser.add_argument("--latency-ms", type=float, default=20.0,
+                        help="Latency added to every fake API response")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="Fraction of fake API responses that are 503s")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--builder-iterations", type=int, default=20)
+    parser.add_argument("--history", type=int, default=10000,
+                        help="Journeys in the user's history for the dataframe and charts")
+    parser.add_argument("--warm", action="store_true",
+                        help="Keep the emissions and postcode caches between iterations")
+    parser.add_argument("--output", help="Results file, by default named after the commit")
+    parser.add_argument("--baseline", help="A previous results file to compare against")
+    args = parser.parse_args()
+
+    with run_fake_services(args.latency_ms / 1e3, args.error_rate) as (urls, configs):
+        suite_results = run_suite(args, urls)
+
+    report = {'commit': get_commit(), 'created_at': datetime.now().isoformat(timespec='seconds'),
+              'python': platform.python_version(),
+              'config': {k: v for k, v in vars(args).items() if k not in ('output', 'baseline')},
+              'requests': {name: {'requests': c.requests, 'errors': c.errors}
+                           for name, c in configs.items()},
+              'results': suite_results}
+
+    output = args.output or path.join(RESULTS_DIR, f"{report['commit']}.json")
+    makedirs(path.dirname(output) or ".", exist_ok=True)
+
+    with open(output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2)
+
+    baseline_results = None
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline_results = json.load(file)['results']
+
+    print_results(suite_results, baseline_results)
+    print(f"Results written to {output}")
@@ -0,0 +1,159 @@
+"""Local HTTP stand-ins for the Climatiq and postcodes.io APIs, with tunable latency and errors."""
+
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import math
+import random
+import threading
+import time
+
+# Locations returned for any valid postcode, chosen by its hash so answers are stable.
+POSTCODE_RESULTS = [
+    {'parish': "Bath, unparished area", 'admin_ward': "Kingsmead",
+     'latitude': 51.3811, 'longitude': -2.3590},
+    {'parish': None, 'admin_ward': "Cathedral", 'latitude': 51.4545, 'longitude': -2.5879},
+    {'parish': "Cheltenham", 'admin_ward': "Lansdown", 'latitude': 51.8994, 'longitude': -2.0783}
+]
+
+INVALID_POSTCODE_PREFIX = "ZZ"
+
+
+class ServiceConfig:
+    """The latency, in seconds, and the error rate of a fake service."""
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, seed: int = 0):
+
+        self.latency = latency
+        self.error_rate = error_rate
+        self.requests = 0
+        self.errors = 0
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def should_fail(self) -> bool:
+        """Counts a request and decides whether it should get a 503."""
+
+        with self._lock:
+            self.requests += 1
+            failed = self._random.random() < self.error_rate
+            self.errors += failed
+
+        return failed
+
+
+def get_postcode_result(postcode: str) -> dict | None:
+    """Returns the fake postcodes.io result of a postcode, None for an invalid one."""
+
+    postcode = "".join(postcode.split()).upper()
+
+    if postcode.startswith(INVALID_POSTCODE_PREFIX):
+        return None
+
+    result = POSTCODE_RESULTS[sum(map(ord, postcode)) % len(POSTCODE_RESULTS)]
+
+    return {'postcode': postcode} | result
+
+
+def get_climatiq_result(payload: dict) -> dict:
+    """Returns a fake Climatiq distance estimate scaled by the payload's straight-line distance."""
+
+    origin, destination = payload['origin'], payload['destination']
+
+    if 'iata' in origin:
+        distance = 500.0
+    else:
+        distance = 111.0 * math.dist((origin['latitude'], origin['longitude']),
+                                     (destination['latitude'], destination['longitude']))
+
+    co2e = round(distance * 0.1, 3)
+
+    return {'co2e': co2e, 'distance_km': round(distance, 3),
+            'direct_emissions': {'co2e': round(co2e * 0.8, 3)},
+            'indirect_emissions': {'co2e': round(co2e * 0.2, 3)}}
+
+
+class FakeAPIHandler(BaseHTTPRequestHandler):
+    """Answers postcodes.io lookups under /postcodes and Climatiq estimates under /climatiq."""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args) -> None:  # pylint: disable=redefined-builtin
+        pass
+
+    def send_json(self, status: int, body: dict) -> None:
+        """Sends a JSON response that keeps the connection alive."""
+
+        data = json.dumps(body).encode()
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def read_json(self) -> dict:
+        """Returns the JSON request body."""
+
+        return json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+
+    def respond(self, service: str, answer) -> None:
+        """Waits for the service's latency, then fails or sends the answer's status and body."""
+
+        config = self.server.configs[service]
+        body = self.read_json() if self.command == "POST" else None
+
+        time.sleep(config.latency)
+
+        if config.should_fail():
+            self.send_json(503, {'error': "Service unavailable"})
+        else:
+            self.send_json(*answer(body))
+
+    def do_GET(self) -> None:  # pylint: disable=invalid-name
+        """Looks up a single postcode."""
+
+        postcode = self.path.rsplit("/", 1)[-1]
+
+        def answer(_):
+            result = get_postcode_result(postcode)
+            return (200, {'status': 200, 'result': result}) if result else (
+                404, {'status': 404, 'error': "Invalid postcode"})
+
+        self.respond('postcodes', answer)
+
+    def do_POST(self) -> None:  # pylint: disable=invalid-name
+        """Looks up postcodes in bulk or estimates a journey's emissions."""
+
+        if self.path.startswith("/postcodes"):
+            self.respond('postcodes', lambda body: (200, {'status': 200, 'result': [
+                {'query': p, 'result': get_postcode_result(p)} for p in body['postcodes']]}))
+        else:
+            self.respond('climatiq', lambda body: (200, get_climatiq_result(body)))
+
+
+@contextmanager
+def run_fake_services(latency: float = 0.0, error_rate: float = 0.0):
+    """
+    Serves fake postcodes.io and Climatiq APIs on a free local port, yielding
+    their base URLs and per-service configs (for request and error counts).
+    """
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeAPIHandler)
+    server.daemon_threads = True
+    server.configs = {'postcodes': ServiceConfig(latency, error_rate, seed=1),
+                      'climatiq': ServiceConfig(latency, error_rate, seed=2)}
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    try:
+        yield {'postcodes': f"{base_url}/postcodes",
+               'climatiq': f"{base_url}/climatiq"}, server.configs
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,266 @@
+"""
+Streams a user's travel history from CSV or JSONL into the journeys collection.
+
+Each record has `transport` (rail, car or air), `origin`, `destination` and an
+optional `submitted_at`. Origins and destinations are station names, postcodes
+or airport names. Car records also need `car_size` and `car_type`, and flights
+`cabin_class`, using the same values stored by the dashboard.
+"""
+
+from argparse import ArgumentParser
+import csv
+from datetime import datetime
+import hashlib
+from itertools import islice
+import json
+from os import path, replace
+
+from bson import ObjectId
+from pymongo.collection import Collection
+from requests.exceptions import RequestException
+
+from async_extract import gather_db_data_async, run_blocking, run_sync
+from config import get_airport_index, get_station_index
+from database import get_database, insert_journeys
+from emissions_cache import get_cache_key
+from extract import (
+    get_airport_location,
+    get_car_payload,
+    get_carbon_data,
+    get_flight_payload,
+    get_journey_data,
+    get_rail_location,
+    get_rail_payload,
+    resolve_postcodes
+)
+
+DEFAULT_CHUNK_SIZE = 500
+
+
+def read_records(source: str):
+    """Lazily yields each record of a CSV or JSONL file."""
+
+    with open(source, encoding="utf-8", newline="") as file:
+
+        if source.endswith(".csv"):
+            yield from csv.DictReader(file)
+        else:
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def iter_chunks(records, chunk_size: int):
+    """Yields lists of up to chunk_size records."""
+
+    records = iter(records)
+
+    while chunk := list(islice(records, chunk_size)):
+        yield chunk
+
+
+def get_import_id(source: str, user_id: ObjectId, record_number: int) -> ObjectId:
+    """Returns a deterministic _id so that re-importing a record is a no-op."""
+
+    digest = hashlib.sha1(
+        f"{path.abspath(source)}|{user_id}|{record_number}".encode()).digest()
+
+    return ObjectId(digest[:12])
+
+
+def read_checkpoint(checkpoint: str, source: str) -> int:
+    """Returns how many records of the source a previous import got through."""
+
+    if not checkpoint or not path.exists(checkpoint):
+        return 0
+
+    with open(checkpoint, encoding="utf-8") as file:
+        state = json.load(file)
+
+    return state['records_done'] if state['source'] == path.abspath(source) else 0
+
+
+def write_checkpoint(checkpoint: str, source: str, records_done: int) -> None:
+    """Atomically records how many records of the source have been imported."""
+
+    if not checkpoint:
+        return
+
+    with open(f"{checkpoint}.tmp", "w", encoding="utf-8") as file:
+        json.dump({'source': path.abspath(source),
+                  'records_done': records_done}, file)
+
+    replace(f"{checkpoint}.tmp", checkpoint)
+
+
+def get_submitted_at(record: dict) -> datetime:
+    """
+    Returns when a record was submitted, or now if it has no time, raising a
+    ValueError if it lacks a transport, origin or destination.
+    """
+
+    missing = [k for k in ('transport', 'origin', 'destination') if not record.get(k)]
+
+    if missing:
+        raise ValueError(f"Missing {', '.join(missing)}.")
+
+    submitted_at = record.get('submitted_at')
+
+    return datetime.fromisoformat(str(submitted_at)) if submitted_at else datetime.now()
+
+
+def locate_records(records: list) -> list:
+    """
+    Returns (transport, origin, destination, payload, submitted_at) for each
+    record, or the error that stopped it being located. Postcodes are resolved
+    in bulk, so if postcodes.io cannot be reached every car record fails.
+    """
+
+    postcodes = [r[k] for r in records if r.get('transport') == 'car'
+                 for k in ('origin', 'destination') if r.get(k)]
+
+    try:
+        postcode_locations = resolve_postcodes(postcodes) if postcodes else {}
+    except (ConnectionError, TimeoutError, RequestException) as err:
+        postcode_locations = err
+
+    located = []
+
+    for record in records:
+
+        try:
+            submitted_at = get_submitted_at(record)
+
+            if record['transport'] == 'rail':
+                transport = {'type': 'rail'}
+                origin = get_rail_location(record['origin'], get_station_index())
+                dest = get_rail_location(
+                    record['destination'], get_station_index())
+                payload = get_rail_payload(origin, dest)
+
+            elif record['transport'] == 'car':
+                transport = {'type': 'car', 'car_size': record['car_size'],
+                             'car_type': record['car_type']}
+                if isinstance(postcode_locations, Exception):
+                    raise postcode_locations
+                origin = postcode_locations[record['origin']]
+                dest = postcode_locations[record['destination']]
+                if origin is None or dest is None:
+                    raise ValueError("Invalid postcode.")
+                payload = get_car_payload(origin, dest, transport)
+
+            elif record['transport'] == 'air':
+                transport = {'type': 'air',
+                             'cabin_class': record['cabin_class']}
+                origin = get_airport_location(
+                    record['origin'], get_airport_index())
+                dest = get_airport_location(
+                    record['destination'], get_airport_index())
+                payload = get_flight_payload(
+                    origin, dest, record['cabin_class'])
+
+            else:
+                raise ValueError(f"Unknown transport: {record['transport']}")
+
+        except (KeyError, ValueError, ConnectionError, TimeoutError, RequestException) as err:
+            located.append(err)
+            continue
+
+        if record['transport'] != 'car':
+            origin = origin | {'name': record['origin']}
+            dest = dest | {'name': record['destination']}
+
+        located.append((transport, origin, dest, payload, submitted_at))
+
+    return located
+
+
+def estimate_payloads(payloads: list) -> dict:
+    """Returns the CO2e data of each distinct payload, estimated concurrently."""
+
+    unique = {get_cache_key(p): p for p in payloads}
+
+    results = run_sync(gather_db_data_async(
+        [run_blocking(get_carbon_data, p) for p in unique.values()]))
+
+    return dict(zip(unique, results))
+
+
+def import_journeys(source: str, user_id: ObjectId, journey_collection: Collection,
+                    chunk_size: int = DEFAULT_CHUNK_SIZE, checkpoint: str = None,
+                    progress=None, on_error=None) -> dict:
+    """
+    Imports every record of the source for the user, one chunk at a time,
+    resuming after the last checkpointed record. Returns the import totals.
+    """
+
+    records_done = read_checkpoint(checkpoint, source)
+
+    totals = {'records': records_done, 'inserted': 0,
+              'duplicates': 0, 'failed': 0}
+
+    records = islice(read_records(source), records_done, None)
+
+    for chunk in iter_chunks(records, chunk_size):
+
+        located = locate_records(chunk)
+
+        co2e_data = estimate_payloads(
+            [j[3] for j in located if not isinstance(j, Exception)])
+
+        journeys = []
+
+        for number, journey in enumerate(located, start=totals['records']):
+
+            carbon_data = journey if isinstance(journey, Exception) else co2e_data[
+                get_cache_key(journey[3])]
+
+            if isinstance(carbon_data, Exception):
+                totals['failed'] += 1
+                if on_error:
+                    on_error(number, carbon_data)
+                continue
+
+            transport, origin, dest, _, submitted_at = journey
+
+            journeys.append(get_journey_data(transport, origin, dest, carbon_data) | {
+                '_id': get_import_id(source, user_id, number),
+                'user_id': user_id,
+                'submitted_at': submitted_at
+            })
+
+        inserted, duplicates = insert_journeys(journey_collection, journeys)
+
+        totals['records'] += len(chunk)
+        totals['inserted'] += inserted
+        totals['duplicates'] += duplicates
+
+        write_checkpoint(checkpoint, source, totals['records'])
+
+        if progress:
+            progress(totals)
+
+    return totals
+
+
+if __name__ == "__main__":
+
+    parser = ArgumentParser(description="Import a travel history file.")
+    parser.add_argument("source", help="A .csv or .jsonl file of journeys")
+    parser.add_argument("--username", required=True)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--checkpoint", help="File used to resume the import")
+    args = parser.parse_args()
+
+    db = get_database()
+
+    user = db['users'].find_one({"username": args.username})
+
+    if not user:
+        raise SystemExit(f"No user named {args.username}")
+
+    import_journeys(args.source, user['_id'], db['journeys'], args.chunk_size, args.checkpoint,
+                    progress=lambda t: print(
+                        f"{t['records']} records: {t['inserted']} inserted, "
+                        f"{t['duplicates']} already imported, {t['failed']} failed"),
+                    on_error=lambda n, err: print(f"Record {n + 1} failed: {err}"))
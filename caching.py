@@ -0,0 +1,114 @@
+"""Streamlit caches for per-user queries and chart specs."""
+
+from collections import defaultdict
+import threading
+
+import altair as alt
+from bson import ObjectId
+import pydeck as pdk
+from pymongo.collection import Collection
+import streamlit as st
+
+from database import get_journey_page, get_user_journey, get_user_summary
+from metrics import timed
+from route_comparison import compare_journey_routes
+from summary import JourneySummary
+from visuals import (
+    get_carbon_pie,
+    get_comparison_bar,
+    get_journey_map,
+    get_transport_avg_km,
+    get_transport_avgs,
+    get_transport_donut
+)
+
+# Arguments such as user_id and version are only used as cache keys.
+# pylint: disable=unused-argument
+
+USER_CACHE_ENTRIES = 1000
+
+USER_CACHE_TTL = 3600
+
+# Comparisons may be partial, so are recomputed more often.
+COMPARISON_CACHE_TTL = 600
+
+HASH_FUNCS = {ObjectId: str}
+
+_versions_lock = threading.Lock()
+_user_data_versions = defaultdict(int)
+
+
+def get_user_data_version(user_id) -> int:
+    """Returns the version of a user's data, which changes whenever it is invalidated."""
+
+    with _versions_lock:
+        return _user_data_versions[user_id]
+
+
+def invalidate_user_data(user_id) -> None:
+    """Marks every cached query and chart of the user as stale, in every session."""
+
+    with _versions_lock:
+        _user_data_versions[user_id] += 1
+
+
+@st.cache_data(max_entries=USER_CACHE_ENTRIES, ttl=USER_CACHE_TTL, show_spinner=False,
+               hash_funcs=HASH_FUNCS)
+def get_user_id(_user_collection: Collection, username: str):
+    """Returns the _id of the user with the given username."""
+
+    with timed('mongo', 'get_user_id'):
+        return _user_collection.find_one({"username": username}).get("_id")
+
+
+@st.cache_data(max_entries=USER_CACHE_ENTRIES, ttl=USER_CACHE_TTL, show_spinner=False,
+               hash_funcs=HASH_FUNCS)
+def get_cached_journey_page(_journey_collection: Collection, user_id, version: int,
+                            search: str = None, after: tuple = None) -> tuple:
+    """Returns a page of the user's journey names and the next page's cursor for one version of their data."""
+
+    return get_journey_page(_journey_collection, user_id, search, after)
+
+
+@st.cache_data(max_entries=USER_CACHE_ENTRIES, ttl=USER_CACHE_TTL, show_spinner=False,
+               hash_funcs=HASH_FUNCS)
+def get_cached_journey(_journey_collection: Collection, user_id, journey_id) -> dict | None:
+    """Returns one of the user's journeys, which never changes once stored."""
+
+    return get_user_journey(_journey_collection, user_id, journey_id)
+
+
+@st.cache_data(max_entries=USER_CACHE_ENTRIES, ttl=USER_CACHE_TTL, show_spinner=False,
+               hash_funcs=HASH_FUNCS)
+def get_cached_journey_summary(_journey_collection: Collection, user_id, version: int) -> JourneySummary:
+    """Returns the per-transport summary of the user's journeys for one version of their data."""
+
+    return get_user_summary(_journey_collection, user_id)
+
+
+@st.cache_resource(max_entries=USER_CACHE_ENTRIES, ttl=USER_CACHE_TTL, show_spinner=False,
+                   hash_funcs=HASH_FUNCS)
+def get_cached_summary_charts(_summary: JourneySummary, user_id, version: int) -> dict:
+    """Returns the summary charts of the user for one version of their data."""
+
+    return {'donut': get_transport_donut(_summary),
+            'avgs': get_transport_avgs(_summary),
+            'avg_km': get_transport_avg_km(_summary)}
+
+
+@st.cache_resource(max_entries=USER_CACHE_ENTRIES, ttl=USER_CACHE_TTL, show_spinner=False,
+                   hash_funcs=HASH_FUNCS)
+def get_cached_journey_charts(_journey: dict, journey_id) -> tuple[pdk.Deck, alt.Chart]:
+    """Returns the map and emissions pie chart of a journey, which never changes once stored."""
+
+    return get_journey_map(_journey), get_carbon_pie(_journey)
+
+
+@st.cache_resource(max_entries=USER_CACHE_ENTRIES, ttl=COMPARISON_CACHE_TTL, show_spinner=False,
+                   hash_funcs=HASH_FUNCS)
+def get_cached_route_comparison(_journey: dict, journey_id) -> tuple[dict, alt.Chart]:
+    """Returns the comparison of every way of making a journey and its bar chart."""
+
+    comparison = compare_journey_routes(_journey)
+
+    return comparison, get_comparison_bar(comparison, _journey['co2e']['total'])
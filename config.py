@@ -1,15 +1,161 @@
 """Config for the dashboard."""
 
-from os import environ
+from functools import cache
+import logging
+from os import environ, makedirs, path, replace
 
 from dotenv import load_dotenv
 import pandas as pd
 
+from location_index import LocationIndex, build_airport_index, build_station_index
+from search_index import SearchIndex
+
+logger = logging.getLogger(__name__)
+
 load_dotenv()
 
 CLIMATIQ_HEADERS = {'Authorization': f"Bearer: {environ.get('API_KEY')}"}
 
-STATIONS_DATA = pd.read_csv('./data/stations.csv')
-AIRPORTS_DATA = pd.read_csv(
-    './data/airports.csv').dropna(axis=0, subset=['iata_code'])
-CAR_SIZE_DATA = pd.read_csv("./data/car_sizes.csv")
+# One of 'climatiq', 'offline' or 'fallback' (Climatiq, estimating locally on failure).
+ESTIMATION_MODE = environ.get('ESTIMATION_MODE', 'climatiq')
+
+# Rail journeys can be estimated offline from the station distance matrix on their own.
+RAIL_ESTIMATION_MODE = environ.get('RAIL_ESTIMATION_MODE', ESTIMATION_MODE)
+
+HTTP_POOL_SIZE = int(environ.get('HTTP_POOL_SIZE', 10))
+HTTP_MAX_RETRIES = int(environ.get('HTTP_MAX_RETRIES', 3))
+HTTP_BACKOFF_FACTOR = float(environ.get('HTTP_BACKOFF_FACTOR', 0.5))
+HTTP_BACKOFF_JITTER = float(environ.get('HTTP_BACKOFF_JITTER', 0.5))
+
+# Climatiq calls allowed a second across the process, the burst allowed above
+# that, and how long a call may queue for one before giving up.
+CLIMATIQ_RATE_LIMIT = float(environ.get('CLIMATIQ_RATE_LIMIT', 5))
+CLIMATIQ_BURST = int(environ.get('CLIMATIQ_BURST', 10))
+CLIMATIQ_MAX_WAIT = float(environ.get('CLIMATIQ_MAX_WAIT', 10))
+
+# Journeys submitted in the background at once, how many may be queued or
+# running before more are refused, and how long, in seconds, finished jobs are remembered.
+SUBMISSION_WORKERS = int(environ.get('SUBMISSION_WORKERS', 4))
+SUBMISSION_QUEUE_SIZE = int(environ.get('SUBMISSION_QUEUE_SIZE', 32))
+SUBMISSION_JOB_TTL = int(environ.get('SUBMISSION_JOB_TTL', 600))
+
+# Journeys are written to a local outbox, then flushed to MongoDB in batches
+# as they arrive and every OUTBOX_FLUSH_INTERVAL seconds.
+JOURNEY_OUTBOX_PATH = environ.get('JOURNEY_OUTBOX_PATH', './data/journey_outbox.db')
+OUTBOX_BATCH_SIZE = int(environ.get('OUTBOX_BATCH_SIZE', 100))
+OUTBOX_FLUSH_INTERVAL = float(environ.get('OUTBOX_FLUSH_INTERVAL', 5))
+
+# Seconds the estimates of every way of making a journey have to finish in.
+COMPARISON_DEADLINE = float(environ.get('COMPARISON_DEADLINE', 5))
+
+MONGO_MAX_POOL_SIZE = int(environ.get('MONGO_MAX_POOL_SIZE', 50))
+MONGO_MIN_POOL_SIZE = int(environ.get('MONGO_MIN_POOL_SIZE', 0))
+MONGO_TIMEOUT_MS = int(environ.get('MONGO_TIMEOUT_MS', 5000))
+MONGO_READ_PREFERENCE = environ.get('MONGO_READ_PREFERENCE', 'primaryPreferred')
+
+EMISSIONS_CACHE_PATH = environ.get(
+    'EMISSIONS_CACHE_PATH', './data/emissions_cache.db')
+EMISSIONS_CACHE_SIZE = int(environ.get('EMISSIONS_CACHE_SIZE', 10000))
+EMISSIONS_CACHE_TTL = int(environ.get('EMISSIONS_CACHE_TTL', 2592000))
+
+REFERENCE_CACHE_DIR = './data/.cache'
+
+# Comma-separated usernames shown the per-rerun performance panel.
+ADMIN_USERS = {u.strip() for u in environ.get('ADMIN_USERS', '').split(',') if u.strip()}
+METRICS_PORT = int(environ.get('METRICS_PORT', 0))
+METRICS_LOG_JSON = environ.get('METRICS_LOG_JSON', '').lower() in ('1', 'true', 'yes')
+
+
+def load_reference_data(csv_path: str, required_columns: list = None) -> pd.DataFrame:
+    """
+    Returns a reference CSV as a dataframe, reading it from a Parquet copy that
+    is regenerated whenever the CSV is newer than it.
+    """
+
+    name = path.splitext(path.basename(csv_path))[0]
+    parquet_path = path.join(REFERENCE_CACHE_DIR, f"{name}.parquet")
+
+    if path.exists(parquet_path) and path.getmtime(parquet_path) >= path.getmtime(csv_path):
+        return pd.read_parquet(parquet_path)
+
+    df = pd.read_csv(csv_path)
+
+    if required_columns:
+        df = df.dropna(axis=0, subset=required_columns).reset_index(drop=True)
+
+    try:
+        makedirs(REFERENCE_CACHE_DIR, exist_ok=True)
+        df.to_parquet(f"{parquet_path}.tmp", index=False)
+        replace(f"{parquet_path}.tmp", parquet_path)
+    except (ImportError, OSError) as err:
+        logger.warning("Could not cache %s as Parquet, reading the CSV each time: %s",
+                       csv_path, err)
+
+    return df
+
+
+@cache
+def get_stations_data() -> pd.DataFrame:
+    """Returns the railway stations."""
+
+    return load_reference_data('./data/stations.csv')
+
+
+@cache
+def get_airports_data() -> pd.DataFrame:
+    """Returns the airports with an IATA code."""
+
+    return load_reference_data('./data/airports.csv', required_columns=['iata_code'])
+
+
+@cache
+def get_car_size_data() -> pd.DataFrame:
+    """Returns the engine sizes of each car size."""
+
+    return load_reference_data('./data/car_sizes.csv')
+
+
+@cache
+def get_station_index() -> LocationIndex:
+    """Returns the index of railway stations by name and CRS code."""
+
+    return build_station_index(get_stations_data())
+
+
+@cache
+def get_airport_index() -> LocationIndex:
+    """Returns the index of airports by name and IATA code."""
+
+    return build_airport_index(get_airports_data())
+
+
+@cache
+def get_station_search_index() -> SearchIndex:
+    """Returns the search index of railway station names and CRS codes."""
+
+    return SearchIndex.from_location_index(get_station_index())
+
+
+@cache
+def get_airport_search_index() -> SearchIndex:
+    """Returns the search index of airport names and IATA codes."""
+
+    return SearchIndex.from_location_index(get_airport_index())
+
+
+LAZY_REFERENCE_DATA = {
+    'STATIONS_DATA': get_stations_data,
+    'STATION_INDEX': get_station_index,
+    'AIRPORTS_DATA': get_airports_data,
+    'AIRPORT_INDEX': get_airport_index,
+    'CAR_SIZE_DATA': get_car_size_data
+}
+
+
+def __getattr__(name: str):
+    """Loads reference data the first time it is accessed as a module attribute."""
+
+    if name in LAZY_REFERENCE_DATA:
+        return LAZY_REFERENCE_DATA[name]()
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
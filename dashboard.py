@@ -1,30 +1,46 @@
 """Streamlit Dashboard."""
 
 from datetime import datetime
-from os import environ
+from functools import wraps
 import time
 
 import bcrypt
 from extra_streamlit_components.CookieManager import CookieManager
-import pandas as pd
 import pydeck as pdk
 from pydeck.data_utils import compute_view
-from pymongo import MongoClient
 from pymongo.collection import Collection
+from pymongo.database import Database
 import streamlit as st
 from streamlit_lottie import st_lottie
 from st_keyup import st_keyup
-
-from config import AIRPORTS_DATA, STATIONS_DATA, CAR_SIZE_DATA
-from extract import is_valid_postcode, get_car_db_data, get_rail_db_data, get_flight_db_data
-from visuals import (
-    get_carbon_pie,
-    get_car_train_bar,
-    get_transport_avgs,
-    get_transport_avg_km,
-    get_transport_donut,
-    get_journey_map
+from streamlit_searchbox import st_searchbox
+
+from async_extract import run_sync, get_car_db_data_async, get_rail_db_data_async, get_flight_db_data_async
+from caching import (
+    get_cached_journey,
+    get_cached_journey_charts,
+    get_cached_journey_page,
+    get_cached_journey_summary,
+    get_cached_route_comparison,
+    get_cached_summary_charts,
+    get_user_data_version,
+    get_user_id,
+    invalidate_user_data
+)
+from config import (
+    ADMIN_USERS,
+    METRICS_PORT,
+    get_airport_index,
+    get_airport_search_index,
+    get_car_size_data,
+    get_station_index,
+    get_station_search_index
 )
+from database import POOL_METRICS, delete_user_journey, ensure_indexes, get_database
+from extract import is_valid_postcode
+from journey_outbox import get_journey_outbox, start_outbox_flusher
+from metrics import get_rerun_timings, start_metrics_server, start_rerun, timed
+from submission_worker import PENDING_STATUSES, get_submission_worker
 
 TRANSPORT_EMOJIS = {'car': '🚗', 'rail': '🚝', 'air': '✈️'}
 
@@ -39,6 +55,48 @@ CAR_SIZES = {'Small': 'small', 'Medium': 'medium',
 CABIN_CLASSES = {'Economy': 'economy', 'First Class': 'first',
                  'Business Class': 'business', 'Unsure': 'average'}
 
+# Seconds between checks on the status of queued journeys.
+SUBMISSION_POLL_INTERVAL = 1
+
+
+@st.cache_resource
+def provision_indexes(_db: Database) -> list:
+    """Creates the database indexes once per process."""
+
+    return ensure_indexes(_db)
+
+
+@st.cache_resource
+def provision_metrics_server(port: int):
+    """Starts the metrics endpoint once per process."""
+
+    return start_metrics_server(port)
+
+
+def invalidate_flushed_users(journeys: list) -> None:
+    """Marks the cached data of every user with newly flushed journeys as stale."""
+
+    for user_id in {j['user_id'] for j in journeys}:
+        invalidate_user_data(user_id)
+
+
+@st.cache_resource
+def provision_outbox_flusher(_journey_collection: Collection):
+    """Starts flushing the journey outbox to the database once per process."""
+
+    return start_outbox_flusher(_journey_collection, invalidate_flushed_users)
+
+
+def time_callback(func):
+    """Times a widget callback into the timings of the rerun it triggers."""
+
+    @wraps(func)
+    def wrapper():
+        st.session_state.callback_timings = start_rerun()
+        return func()
+
+    return wrapper
+
 
 def set_cookies(cookie_manager: CookieManager, username: str) -> None:
     """Sets cookies after logging in."""
@@ -54,39 +112,81 @@ def clear_cookies(cookie_manager: CookieManager) -> None:
     cookie_manager.delete('username', key='username')
 
 
-def get_stations(search: str, stations: list) -> list:
-    """Returns a list of stations containing the search term."""
+def search_stations(search: str) -> list:
+    """Returns the best matching stations for the search term as (label, name) pairs."""
 
-    return [s for s in stations if search.lower() in s.lower()] if search else []
+    return get_station_search_index().search(search)
 
 
-def submit_and_clear_rail():
-    """Inserts the rail form data into the database and resets the form."""
+def search_airports(search: str) -> list:
+    """Returns the best matching airports for the search term as (label, name) pairs."""
 
-    origin_station = st.session_state.origin_station
-    dest_station = st.session_state.dest_station
+    return get_airport_search_index().search(search)
 
-    journey_data = get_rail_db_data(
-        origin_station, dest_station, STATIONS_DATA)
 
-    user_id = st.session_state.user_id
+def get_search_result(key: str):
+    """Returns the option selected in a searchbox, or None."""
+
+    return st.session_state.get(key, {}).get('result')
+
+
+def clear_search_results(*keys: str) -> None:
+    """Resets searchboxes, which otherwise keep their selection once hidden."""
+
+    for key in keys:
+        st.session_state.pop(key, None)
+
+
+def submit_journey(user_id, submitted_at: datetime, get_db_data_async, *args) -> dict:
+    """
+    Extracts a journey's data and writes it to the outbox, from which it is
+    flushed to the database, from a background worker.
+    """
+
+    journey_data = run_sync(get_db_data_async(*args))
 
     journey_data = journey_data | {
-        "user_id": user_id, "submitted_at": datetime.now()}
+        "user_id": user_id, "submitted_at": submitted_at}
 
-    journey_collection: Collection = st.session_state.journey_coll
+    journey_data['_id'] = get_journey_outbox().append(journey_data)
+
+    return journey_data
+
+
+def queue_journey(name: str, get_db_data_async, *args) -> bool:
+    """Queues a journey to be submitted in the background, returning whether it was queued."""
+
+    try:
+        job_id = get_submission_worker().submit(
+            name, submit_journey, st.session_state.user_id,
+            datetime.now(), get_db_data_async, *args)
+    except RuntimeError as err:
+        st.sidebar.error(str(err), icon="🚦")
+        return False
+
+    st.session_state.setdefault('submission_jobs', []).append(job_id)
+
+    return True
+
+
+@time_callback
+def submit_and_clear_rail():
+    """Queues the rail form's journey to be submitted and resets the form."""
 
-    journey_collection.insert_one(journey_data)
+    origin_station = get_search_result('origin_station')
+    dest_station = get_search_result('dest_station')
 
-    st.sidebar.success("Submitted!", icon="✅")
+    if queue_journey(f"{origin_station} to {dest_station}", get_rail_db_data_async,
+                     origin_station, dest_station, get_station_index()):
 
-    st.session_state.journey = journey_data
+        st.session_state['travel_mode'] = None
 
-    st.session_state['travel_mode'] = None
+        clear_search_results('origin_station', 'dest_station')
 
 
+@time_callback
 def submit_and_clear_car():
-    """Inserts the car form data into the database and resets the form."""
+    """Queues the car form's journey to be submitted and resets the form."""
 
     origin_postcode = st.session_state.origin_postcode
     dest_postcode = st.session_state.dest_postcode
@@ -95,53 +195,35 @@ def submit_and_clear_car():
     car_details = {
         'car_size': CAR_SIZES[car_size], 'car_type': CAR_TYPES[car_type]}
 
-    journey_data = get_car_db_data(
-        origin_postcode, dest_postcode, car_details)
-
-    user_id = st.session_state.user_id
-
-    journey_data = journey_data | {
-        "user_id": user_id, "submitted_at": datetime.now()}
-
-    journey_collection: Collection = st.session_state.journey_coll
-
-    journey_collection.insert_one(journey_data)
+    if queue_journey(f"{origin_postcode} to {dest_postcode}", get_car_db_data_async,
+                     origin_postcode, dest_postcode, car_details):
 
-    st.sidebar.success("Submitted!", icon="✅")
-
-    st.session_state.journey = journey_data
-    st.session_state['travel_mode'] = None
+        st.session_state['travel_mode'] = None
 
 
+@time_callback
 def submit_and_clear_air():
-    """Inserts the air form data into the database and resets the form."""
+    """Queues the air form's journey to be submitted and resets the form."""
 
-    origin_airport = st.session_state.origin_airport
-    dest_airport = st.session_state.dest_airport
+    origin_airport = get_search_result('origin_airport')
+    dest_airport = get_search_result('dest_airport')
     cabin_class = CABIN_CLASSES[st.session_state.cabin_class]
 
-    journey_data = get_flight_db_data(
-        origin_airport, dest_airport, cabin_class, AIRPORTS_DATA)
-
-    user_id = st.session_state.user_id
-
-    journey_data = journey_data | {
-        "user_id": user_id, "submitted_at": datetime.now()}
-
-    journey_collection: Collection = st.session_state.journey_coll
+    if queue_journey(f"{origin_airport} to {dest_airport}", get_flight_db_data_async,
+                     origin_airport, dest_airport, cabin_class, get_airport_index()):
 
-    journey_collection.insert_one(journey_data)
+        st.session_state['travel_mode'] = None
 
-    st.sidebar.success("Submitted!", icon="✅")
-
-    st.session_state.journey = journey_data
-    st.session_state['travel_mode'] = None
+        clear_search_results('origin_airport', 'dest_airport')
 
 
 def validate_username(username: str, collection: Collection) -> bool:
     """Checks whether the username already exists."""
 
-    if collection.find_one({"username": username}):
+    with timed('mongo', 'validate_username'):
+        user = collection.find_one({"username": username})
+
+    if user:
         return False
     return True
 
@@ -149,17 +231,21 @@ def validate_username(username: str, collection: Collection) -> bool:
 def insert_user(username: str, password: str, collection: Collection) -> None:
     """Inserts user data into the MongoDB collection."""
 
-    collection.insert_one({"username": username, "password": password})
+    with timed('mongo', 'insert_user'):
+        collection.insert_one({"username": username, "password": password})
 
 
 def authenticate_user(username: str, password: str, collection: Collection) -> bool:
     """Checks if the user's details are correct."""
 
-    user = collection.find_one({"username": username})
+    with timed('mongo', 'authenticate_user'):
+        user = collection.find_one({"username": username})
 
-    if user and bcrypt.checkpw(password.encode(), user['password']):
-        return True
-    return False
+    if not user:
+        return False
+
+    with timed('bcrypt', 'checkpw'):
+        return bcrypt.checkpw(password.encode(), user['password'])
 
 
 def login(collection: Collection, cookie_manager: CookieManager) -> None:
@@ -227,8 +313,9 @@ def sign_up(collection: Collection) -> None:
             if validate_username(username, collection):
                 if password:
                     if password == conf_password:
-                        hash_password = bcrypt.hashpw(
-                            password.encode(), bcrypt.gensalt())
+                        with timed('bcrypt', 'hashpw'):
+                            hash_password = bcrypt.hashpw(
+                                password.encode(), bcrypt.gensalt())
                         insert_user(username, hash_password, collection)
                         st.success("Account created successfully!")
 
@@ -272,17 +359,6 @@ def render_login_page(user_collection: Collection, cookie_manager: CookieManager
         sign_up(user_collection)
 
 
-def get_sorted_user_journeys(journey_collection: Collection, user_id: str) -> list:
-    """Returns a list of journeys submitted by the user sorted by date in descending order."""
-
-    journeys = list(journey_collection.find({"user_id": user_id}))
-
-    sorted_journeys = sorted(
-        journeys, key=lambda x: x['submitted_at'], reverse=True)
-
-    return sorted_journeys
-
-
 def get_journey_name(journey: dict) -> str:
     """Returns the name of the journey from its dictionary."""
 
@@ -318,7 +394,7 @@ def render_car_form() -> None:
                             'Small', 'Medium', 'Large', 'Unsure'], index=None, key='car_size')
 
     with st.expander("How big is my car?"):
-        st.dataframe(CAR_SIZE_DATA, hide_index=True)
+        st.dataframe(get_car_size_data(), hide_index=True)
         st.write(
             'Data taken from https://www.climatiq.io/docs/api-reference/travel')
 
@@ -334,13 +410,13 @@ def render_car_form() -> None:
 def render_rail_form() -> None:
     """Renders the form for submitting a rail journey."""
 
-    stations = STATIONS_DATA['stationName'].to_list()
-
-    origin_station = st.selectbox(
-        'Origin Station', options=stations, index=None, key='origin_station')
+    origin_station = st_searchbox(
+        search_stations, label='Origin Station', placeholder="Station name or CRS code",
+        key='origin_station')
 
-    destination_station = st.selectbox(
-        'Destination Station', options=stations, index=None, key='dest_station')
+    destination_station = st_searchbox(
+        search_stations, label='Destination Station', placeholder="Station name or CRS code",
+        key='dest_station')
 
     if origin_station and destination_station:
 
@@ -350,15 +426,13 @@ def render_rail_form() -> None:
 def render_air_form() -> None:
     """Renders the form for submitting an air journey."""
 
-    airports = AIRPORTS_DATA['name']
+    origin_airport = st_searchbox(
+        search_airports, label='Origin Airport', placeholder="Airport name or IATA code",
+        key='origin_airport')
 
-    origin_airport = st.selectbox(
-        'Origin Airport', options=airports, index=None, key='origin_airport'
-    )
-
-    destination_airport = st.selectbox(
-        'Destination Airport', options=airports, index=None, key='dest_airport'
-    )
+    destination_airport = st_searchbox(
+        search_airports, label='Destination Airport', placeholder="Airport name or IATA code",
+        key='dest_airport')
 
     cabin_class = st.selectbox(
         'Cabin Class', options=['Economy', 'First Class', 'Business Class', 'Unsure'], index=None, key='cabin_class'
@@ -371,6 +445,64 @@ def render_air_form() -> None:
         )
 
 
+def get_submission_state(job: dict | None) -> dict | None:
+    """
+    Returns a submission job as it appears to the user, pending until its journey
+    has been flushed from the outbox to the database.
+    """
+
+    if job is None or job['status'] != 'done':
+        return job
+
+    state = get_journey_outbox().get_state(job['result']['_id'])
+
+    if state == 'pending':
+        return job | {'status': 'running'}
+
+    if state == 'rejected':
+        return job | {'status': 'failed', 'error': "the database rejected it"}
+
+    return job
+
+
+@st.fragment(run_every=SUBMISSION_POLL_INTERVAL)
+def render_submission_status() -> None:
+    """
+    Polls the user's queued journeys, showing those still in progress and
+    rerunning the whole app once any are stored so their results are shown.
+    """
+
+    worker = get_submission_worker()
+    jobs = st.session_state.submission_jobs
+    pending, finished = [], []
+
+    for job_id in jobs:
+
+        job = get_submission_state(worker.get_status(job_id))
+
+        if job is not None and job['status'] in PENDING_STATUSES:
+            pending.append(job_id)
+            st.info(f"Submitting {job['name']}...", icon="⏳")
+        elif job is not None:
+            finished.append(job)
+
+    if len(pending) < len(jobs):
+        st.session_state.submission_jobs = pending
+        st.session_state.finished_jobs = finished
+        st.rerun(scope='app')
+
+
+def render_finished_jobs() -> None:
+    """Shows the outcome of journeys whose submission finished since the last rerun."""
+
+    for job in st.session_state.pop('finished_jobs', []):
+
+        if job['status'] == 'done':
+            st.success(f"Submitted {job['name']}!", icon="✅")
+        else:
+            st.error(f"Could not submit {job['name']}: {job['error']}", icon="⚠️")
+
+
 def render_sidebar(username: str) -> None:
     """Renders the sidebar."""
 
@@ -383,6 +515,11 @@ def render_sidebar(username: str) -> None:
 
         st.header('Enter Journey Details')
 
+        render_finished_jobs()
+
+        if st.session_state.get('submission_jobs'):
+            render_submission_status()
+
         transport = st.selectbox(
             'Mode of Transport', options=TRAVEL_OPTIONS, index=None, key='travel_mode')
 
@@ -408,6 +545,7 @@ def render_sidebar(username: str) -> None:
             st.rerun()
 
 
+@time_callback
 def delete_journey() -> None:
     """Removes a journey from the db."""
 
@@ -415,42 +553,167 @@ def delete_journey() -> None:
     user_id = st.session_state.user_id
     journey = st.session_state.journey
 
-    journey_collection.delete_one(
-        filter={'user_id': user_id, 'submitted_at': journey['submitted_at']})
+    delete_user_journey(
+        journey_collection, {'_id': journey['_id'], 'user_id': user_id})
+
+    invalidate_user_data(user_id)
 
     st.rerun()
 
 
-def get_journeys_df(user_journeys: list) -> pd.DataFrame:
-    """Returns a dataframe of the users journeys."""
+def load_more_journeys() -> None:
+    """Loads another page of journeys into the journey picker."""
+
+    st.session_state.history_pages += 1
+
+
+def render_journey_picker(journey_collection: Collection, user_id, version: int):
+    """
+    Renders a searchable picker over the user's journeys that loads a page of
+    names at a time, returning the _id of the selected journey.
+    """
+
+    search = st.text_input("Search journeys", key='journey_search',
+                           placeholder="Station, airport or postcode")
+
+    if st.session_state.get('history_key') != (version, search):
+        st.session_state.history_key = (version, search)
+        st.session_state.history_pages = 1
+
+    journeys, after = [], None
+
+    for _ in range(st.session_state.history_pages):
+        page, after = get_cached_journey_page(
+            journey_collection, user_id, version, search, after)
+        journeys.extend(page)
+        if after is None:
+            break
+
+    journey_names = {j['_id']: get_journey_name(j) for j in journeys}
+
+    journey_id = st.selectbox("Select a journey", options=journey_names,
+                              format_func=journey_names.get)
+
+    if after is not None:
+        st.button("Load more journeys", on_click=load_more_journeys)
+
+    if not journey_names:
+        st.caption("No journeys match your search")
+
+    return journey_id
+
+
+def get_selected_journey(journey_collection: Collection, user_id, version: int,
+                         journey_id=None) -> dict | None:
+    """
+    Returns the selected journey, or the user's latest if none is selected or it
+    no longer exists, or None if the user has no stored journeys.
+    """
+
+    journey = get_cached_journey(
+        journey_collection, user_id, journey_id) if journey_id else None
+
+    if journey is None:
+        latest_page = get_cached_journey_page(journey_collection, user_id, version)[0]
+
+        if not latest_page:
+            return None
+
+        journey = get_cached_journey(journey_collection, user_id, latest_page[0]['_id'])
+
+    return journey
+
+
+def render_route_comparison(comparison: dict, comparison_bar, total_co2e: float) -> None:
+    """Renders how much CO2e the journey would save or cost made some other way."""
+
+    options = comparison['options']
+    worse = [o for o in options if o['co2e'] > total_co2e]
+
+    if options and options[0]['co2e'] < total_co2e:
+        st.subheader(
+            f"**:green[{round(total_co2e - options[0]['co2e'], 2)}kg]**")
+        st.write(
+            f"could be saved by travelling by {options[0]['label'].lower()} instead")
+    elif worse:
+        st.subheader(
+            f"**:green[{round(worse[0]['co2e'] - total_co2e, 2)}kg]**")
+        st.write(
+            f"is how much more CO2 would be produced by the next best option, {worse[0]['label'].lower()}")
+
+    if options:
+        st.altair_chart(comparison_bar, use_container_width=True)
+
+    if comparison['missing']:
+        st.caption(
+            f"{', '.join(comparison['missing'])} could not be estimated in time")
+
 
-    journeys_df = pd.DataFrame(user_journeys)
+@st.fragment
+def render_route_comparison_section(journey: dict, total_co2e: float) -> None:
+    """
+    Compares other ways of making the journey once asked to, rerunning only
+    this section so the rest of the page is not rebuilt.
+    """
 
-    journeys_df = journeys_df.join(pd.DataFrame(
-        journeys_df.pop('transport').values.tolist()).rename(columns={'type': 'transport'}))
+    compared = st.session_state.setdefault('compared_journeys', set())
 
-    journeys_df = journeys_df.join(pd.DataFrame(
-        journeys_df.pop('origin').values.tolist()).rename(columns={'name': 'origin_name', 'lat': 'origin_lat', 'lon': 'origin_lon'}))
+    if journey['_id'] not in compared:
 
-    journeys_df = journeys_df.join(pd.DataFrame(
-        journeys_df.pop('destination').values.tolist()).rename(columns={'name': 'dest_name', 'lat': 'dest_lat', 'lon': 'dest_lon'}))
+        if not st.button("Compare ways of travelling", key=f"compare_{journey['_id']}"):
+            return
 
-    journeys_df = journeys_df.join(pd.DataFrame(
-        journeys_df.pop('co2e').values.tolist()))
+        compared.add(journey['_id'])
 
-    return journeys_df
+    comparison, comparison_bar = get_cached_route_comparison(journey, journey['_id'])
+    render_route_comparison(comparison, comparison_bar, total_co2e)
+
+
+def render_performance_panel(rerun_start: float) -> None:
+    """Renders the time spent in each component during this rerun, for admins."""
+
+    timings = get_rerun_timings()
+    rerun_ms = (time.perf_counter() - rerun_start) * 1e3
+
+    with st.sidebar.expander("⏱️ Performance"):
+
+        st.metric("Rerun time", f"{rerun_ms:.1f}ms")
+
+        st.caption("MongoDB connection pool")
+        st.json(POOL_METRICS.snapshot(), expanded=False)
+
+        if not timings:
+            st.caption("No timed operations in this rerun")
+            return
+
+        components = dict()
+
+        for timing in timings:
+            components[timing['component']] = components.get(
+                timing['component'], 0) + timing['ms']
+
+        st.bar_chart({'component': list(components), 'ms': list(components.values())},
+                     x='component', y='ms', horizontal=True)
+        st.dataframe(timings, hide_index=True, use_container_width=True)
 
 
 if __name__ == "__main__":
 
+    rerun_start = time.perf_counter()
+    start_rerun(st.session_state.pop('callback_timings', None))
+
     st.set_page_config(page_title="GreenRoute",
                        page_icon="🌱", layout='centered')
 
+    if METRICS_PORT:
+        provision_metrics_server(METRICS_PORT)
+
     cookie_manager = CookieManager()
     logged_in = cookie_manager.get('logged_in')
 
-    cluster = MongoClient(environ['DB_URL'])
-    db = cluster['eco_travel']
+    db = get_database()
+    provision_indexes(db)
+    provision_outbox_flusher(db['journeys'])
     user_collection = db['users']
 
     if logged_in:
@@ -469,30 +732,25 @@ if __name__ == "__main__":
 
         username = cookie_manager.get('username')
 
-        st.session_state['user_id'] = user_collection.find_one(
-            {"username": username}).get("_id")
+        st.session_state['user_id'] = get_user_id(user_collection, username)
 
         render_sidebar(username)
 
         journey_collection = db['journeys']
         st.session_state.journey_coll = journey_collection
 
-        if not journey_collection.find_one({"user_id": st.session_state.user_id}):
+        user_data_version = get_user_data_version(st.session_state.user_id)
+
+        summary = get_cached_journey_summary(
+            journey_collection, st.session_state.user_id, user_data_version)
+
+        if summary.empty:
             # st_lottie(
             #     "https://lottie.host/37615ec4-3b66-404a-86ab-d1a75894690f/ha454AgqDi.json")
             st.subheader("Enter a journey to get started")
 
         else:
 
-            user_journeys = get_sorted_user_journeys(
-                journey_collection, st.session_state.user_id)
-
-            latest_journey = user_journeys[0]
-
-            journey_names = {get_journey_name(journey): journey['_id']
-                             for journey in user_journeys
-                             }
-
             col1, col2 = st.columns([1.3, 1])
 
             with col1:
@@ -501,110 +759,104 @@ if __name__ == "__main__":
 
             with col2:
 
-                journey_name = st.selectbox(
-                    "Select a journey", options=journey_names.keys())
-                if journey_name:
-                    for j in user_journeys:
-                        if j['_id'] == journey_names[journey_name]:
-                            journey = j
+                journey_id = render_journey_picker(
+                    journey_collection, st.session_state.user_id, user_data_version)
 
-                else:
-                    journey = latest_journey
+            journey = get_selected_journey(
+                journey_collection, st.session_state.user_id, user_data_version, journey_id)
 
-            st.session_state['journey'] = journey
+            if journey is None:
+                st.subheader("Enter a journey to get started")
 
-            emoji = TRANSPORT_EMOJIS[journey['transport']['type']]
+            else:
 
-            journey_map = get_journey_map(journey)
+                st.session_state['journey'] = journey
 
-            st.pydeck_chart(journey_map)
+                emoji = TRANSPORT_EMOJIS[journey['transport']['type']]
 
-            col1, col2 = st.columns([4, 1.5])
+                journey_map, pie = get_cached_journey_charts(
+                    journey, journey['_id'])
 
-            with col1:
-                distance = round(journey['distance'], 2)
-                journey_name = get_journey_name(journey)
-                st.subheader(f"{journey_name} ({distance}km)")
+                st.pydeck_chart(journey_map)
 
-            with col2:
-                if emoji == TRANSPORT_EMOJIS['car']:
-                    with st.expander("Car details"):
-                        st.write(
-                            f"**Car Size:** {journey['transport']['car_size'].capitalize()}")
-                        st.write(
-                            f"**Car Type:** {journey['transport']['car_type'].capitalize()}")
-                if emoji == TRANSPORT_EMOJIS['air']:
-                    with st.expander("Cabin details"):
-                        st.write(
-                            f"**Cabin Class:** {journey['transport']['cabin_class'].capitalize()}")
+                col1, col2 = st.columns([4, 1.5])
 
-            total_co2e = round(journey['co2e']['total'], 2)
+                with col1:
+                    distance = round(journey['distance'], 2)
+                    journey_name = get_journey_name(journey)
+                    st.subheader(f"{journey_name} ({distance}km)")
 
-            co2e_per_kg = round(total_co2e / distance, 2)
+                with col2:
+                    if emoji == TRANSPORT_EMOJIS['car']:
+                        with st.expander("Car details"):
+                            st.write(
+                                f"**Car Size:** {journey['transport']['car_size'].capitalize()}")
+                            st.write(
+                                f"**Car Type:** {journey['transport']['car_type'].capitalize()}")
+                    if emoji == TRANSPORT_EMOJIS['air']:
+                        with st.expander("Cabin details"):
+                            st.write(
+                                f"**Cabin Class:** {journey['transport']['cabin_class'].capitalize()}")
 
-            col1, col2 = st.columns([1.8, 1.5])
+                total_co2e = round(journey['co2e']['total'], 2)
 
-            with col1:
-                subcol1, subcol2 = st.columns(2)
-                with subcol1:
-                    st.metric("Total CO2e Produced",
-                              f"{total_co2e}kg")
-                with subcol2:
-                    st.metric("CO2e per km 📈", f"{co2e_per_kg}kg/km")
-                with st.expander("That's the same as:", expanded=True):
-                    excol1, excol2 = st.columns(2)
-                    with excol1:
-                        st.write(
-                            "Using your washing machine")
-                        st.subheader(
-                            f"**:green[{round(total_co2e/0.6)} times]**")
-                    with excol2:
-                        st.image("./images/washing_machine.png")
-                if emoji == TRANSPORT_EMOJIS['rail']:
-                    with st.expander("How much have you saved?"):
-                        subcol1, subcol2 = st.columns([1.2, 1])
-                        with subcol2:
-                            bar = get_car_train_bar(total_co2e)
-                            st.altair_chart(bar, use_container_width=True)
-                        with subcol1:
-                            st.subheader(f"**:green[{total_co2e * 4}kg]**")
-                            st.write(
-                                "is how much more CO2 would be produced if you traveled by car")
+                co2e_per_kg = round(total_co2e / distance, 2)
 
-                st.button("Delete Journey", on_click=delete_journey)
+                col1, col2 = st.columns([1.8, 1.5])
 
-            with col2:
+                with col1:
+                    subcol1, subcol2 = st.columns(2)
+                    with subcol1:
+                        st.metric("Total CO2e Produced",
+                                  f"{total_co2e}kg")
+                    with subcol2:
+                        st.metric("CO2e per km 📈", f"{co2e_per_kg}kg/km")
+                    with st.expander("That's the same as:", expanded=True):
+                        excol1, excol2 = st.columns(2)
+                        with excol1:
+                            st.write(
+                                "Using your washing machine")
+                            st.subheader(
+                                f"**:green[{round(total_co2e/0.6)} times]**")
+                        with excol2:
+                            st.image("./images/washing_machine.png")
+                    with st.expander("How do other ways of travelling compare?"):
+                        render_route_comparison_section(journey, total_co2e)
+
+                    st.button("Delete Journey", on_click=delete_journey)
+
+                with col2:
+
+                    tab1, tab2 = st.tabs(
+                        ['Emissions Breakdown', 'Direct vs Indirect?'])
+                    with tab1:
+                        subcol1, subcol2 = st.columns([0.8, 2])
+                        # with subcol2:
+                        #     st.write("##### Emissions Breakdown")
+
+                        st.altair_chart(pie)
+
+                    with tab2:
+                        with st.expander("Direct", expanded=True):
+                            # st.write("###### Direct")
+                            st.write("The emissions associated with the direct emissions of the journey, such as the combustion of fuel or generation of electricity. For air flights, the radiative forcing effect is included in these emissions.")
+                        # st.write("###### Indirect")
+                        with st.expander("Indirect", expanded=True):
+                            st.write("The upstream emissions associated with the journey, such as transmission and distribution losses for electricity, or the extraction and transportation of the fuel (i.e. well-to-tank).")
+                        st.write(
+                            "(Taken from [Climatiq](https://www.climatiq.io/docs/api-reference/travel))")
 
-                pie = get_carbon_pie(journey)
-
-                tab1, tab2 = st.tabs(
-                    ['Emissions Breakdown', 'Direct vs Indirect?'])
-                with tab1:
-                    subcol1, subcol2 = st.columns([0.8, 2])
-                    # with subcol2:
-                    #     st.write("##### Emissions Breakdown")
-
-                    st.altair_chart(pie)
-
-                with tab2:
-                    with st.expander("Direct", expanded=True):
-                        # st.write("###### Direct")
-                        st.write("The emissions associated with the direct emissions of the journey, such as the combustion of fuel or generation of electricity. For air flights, the radiative forcing effect is included in these emissions.")
-                    # st.write("###### Indirect")
-                    with st.expander("Indirect", expanded=True):
-                        st.write("The upstream emissions associated with the journey, such as transmission and distribution losses for electricity, or the extraction and transportation of the fuel (i.e. well-to-tank).")
-                    st.write(
-                        "(Taken from [Climatiq](https://www.climatiq.io/docs/api-reference/travel))")
             st.divider()
 
-            journeys_df = get_journeys_df(user_journeys)
+            summary_charts = get_cached_summary_charts(
+                summary, st.session_state.user_id, user_data_version)
 
             col1, col2 = st.columns([3, 1])
 
             with col1:
                 st.title(":green[Summary] of Journeys")
             with col2:
-                num_journeys = len(journeys_df.index)
+                num_journeys = summary.num_journeys
 
                 st.metric("Number of Journeys", num_journeys)
 
@@ -614,11 +866,11 @@ if __name__ == "__main__":
 
                 st.subheader("Transport Breakdown")
 
-                transport_donut = get_transport_donut(journeys_df)
-                st.altair_chart(transport_donut, use_container_width=True)
+                st.altair_chart(
+                    summary_charts['donut'], use_container_width=True)
 
             with col2:
-                total = round(journeys_df['total'].sum(), 2)
+                total = round(summary.total_co2e, 2)
                 st.metric(label="Total CO2e", value=f"{total}kg")
                 with st.expander("How much is this?"):
                     excol1, excol2 = st.columns(2)
@@ -631,22 +883,8 @@ if __name__ == "__main__":
                 avg_co2_journey = round(total / num_journeys, 2)
                 st.metric('CO2 per journey', f"{avg_co2_journey}kg")
 
-                transport_values = journeys_df['transport'].value_counts()
-
-                transport_values = transport_values.sort_values(
-                    ascending=False).to_dict()
-
-                pop_transport = []
-                max_val = 0
-                for k, v in transport_values.items():
-                    if v > max_val:
-                        max_val = v
-                        pop_transport = [
-                            f"{k.capitalize()} {TRANSPORT_EMOJIS[k]}"]
-                        continue
-                    if v == max_val:
-                        pop_transport.append(
-                            f"{k.capitalize()} {TRANSPORT_EMOJIS[k]}")
+                pop_transport = [f"{t.capitalize()} {TRANSPORT_EMOJIS[t]}"
+                                 for t in summary.most_popular]
 
                 pop_transport = " and ".join(pop_transport)
 
@@ -658,14 +896,15 @@ if __name__ == "__main__":
 
                 st.subheader("Average Journey")
 
-                transport_avgs = get_transport_avgs(journeys_df)
-
-                st.altair_chart(transport_avgs, use_container_width=True)
+                st.altair_chart(
+                    summary_charts['avgs'], use_container_width=True)
 
             with col2:
 
                 st.subheader("Average per km")
 
-                transport_avg_km = get_transport_avg_km(journeys_df)
+                st.altair_chart(
+                    summary_charts['avg_km'], use_container_width=True)
 
-                st.altair_chart(transport_avg_km, use_container_width=True)
+        if username in ADMIN_USERS:
+            render_performance_panel(rerun_start)
@@ -0,0 +1,458 @@
+"""MongoDB queries used by the dashboard."""
+
+from argparse import ArgumentParser
+from collections import defaultdict
+from functools import cache
+from os import environ
+import re
+import threading
+
+from bson import SON
+from pymongo import ASCENDING, DESCENDING, MongoClient
+from pymongo.collection import Collection
+from pymongo.cursor import Cursor
+from pymongo.database import Database
+from pymongo.errors import BulkWriteError
+from pymongo.monitoring import ConnectionPoolListener
+
+from config import MONGO_MAX_POOL_SIZE, MONGO_MIN_POOL_SIZE, MONGO_READ_PREFERENCE, MONGO_TIMEOUT_MS
+from metrics import REGISTRY, timed
+from summary import JourneySummary, summarise_totals
+
+DATABASE_NAME = 'eco_travel'
+
+STATS_COLLECTION = 'user_stats'
+
+DUPLICATE_KEY_ERROR = 11000
+
+JOURNEY_PAGE_SIZE = 20
+
+# The fields needed to name a journey in the history, without its coordinates or emissions.
+JOURNEY_NAME_PROJECTION = {'transport.type': 1, 'origin.name': 1,
+                           'destination.name': 1, 'submitted_at': 1}
+
+HISTORY_SORT = [('submitted_at', DESCENDING), ('_id', DESCENDING)]
+
+
+class PoolMetrics(ConnectionPoolListener):
+    """Counts connection pool events and the time spent waiting for a connection."""
+
+    def __init__(self):
+
+        self._lock = threading.Lock()
+        self.open_connections = 0
+        self.checked_out = 0
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _record_wait(self, event) -> None:
+        """Adds the time an event spent waiting for a connection."""
+
+        wait = getattr(event, 'duration', 0.0) or 0.0
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+
+    def connection_created(self, event) -> None:
+        with self._lock:
+            self.open_connections += 1
+
+    def connection_closed(self, event) -> None:
+        with self._lock:
+            self.open_connections -= 1
+
+    def connection_checked_out(self, event) -> None:
+        with self._lock:
+            self.checked_out += 1
+            self.checkouts += 1
+            self._record_wait(event)
+
+    def connection_check_out_failed(self, event) -> None:
+        with self._lock:
+            self.checkout_failures += 1
+            self._record_wait(event)
+
+    def connection_checked_in(self, event) -> None:
+        with self._lock:
+            self.checked_out -= 1
+
+    def connection_check_out_started(self, event) -> None:
+        pass
+
+    def connection_ready(self, event) -> None:
+        pass
+
+    def pool_created(self, event) -> None:
+        pass
+
+    def pool_ready(self, event) -> None:
+        pass
+
+    def pool_cleared(self, event) -> None:
+        pass
+
+    def pool_closed(self, event) -> None:
+        pass
+
+    def snapshot(self) -> dict:
+        """Returns the current pool metrics, with wait times in milliseconds."""
+
+        with self._lock:
+            attempts = self.checkouts + self.checkout_failures
+            return {'open_connections': self.open_connections,
+                    'checked_out': self.checked_out,
+                    'checkouts': self.checkouts,
+                    'checkout_failures': self.checkout_failures,
+                    'mean_wait_ms': round(self.total_wait / attempts * 1e3, 3) if attempts else 0.0,
+                    'max_wait_ms': round(self.max_wait * 1e3, 3)}
+
+
+POOL_METRICS = PoolMetrics()
+
+REGISTRY.register_gauges('mongo_pool', POOL_METRICS.snapshot)
+
+
+@cache
+def get_client() -> MongoClient:
+    """Returns the process-wide MongoDB client, shared by every dashboard session."""
+
+    return MongoClient(environ['DB_URL'],
+                       maxPoolSize=MONGO_MAX_POOL_SIZE,
+                       minPoolSize=MONGO_MIN_POOL_SIZE,
+                       serverSelectionTimeoutMS=MONGO_TIMEOUT_MS,
+                       connectTimeoutMS=MONGO_TIMEOUT_MS,
+                       waitQueueTimeoutMS=MONGO_TIMEOUT_MS,
+                       readPreference=MONGO_READ_PREFERENCE,
+                       event_listeners=[POOL_METRICS])
+
+
+def get_database() -> Database:
+    """Returns the eco_travel database."""
+
+    return get_client()[DATABASE_NAME]
+
+
+def get_journeys_cursor(journey_collection: Collection, user_id, batch_size: int) -> Cursor:
+    """Returns a cursor over the user's journeys, newest first, fetching batch_size at a time."""
+
+    return journey_collection.find({'user_id': user_id}).sort(HISTORY_SORT).batch_size(batch_size)
+
+
+def get_history_query(user_id, search: str = None, after: tuple = None) -> dict:
+    """
+    Returns the query for a user's journeys after a (submitted_at, _id) cursor,
+    optionally only those whose origin or destination contains the search term.
+    """
+
+    query = {'user_id': user_id}
+    conditions = []
+
+    if search:
+        pattern = {'$regex': re.escape(search), '$options': 'i'}
+        conditions.append({'$or': [{'origin.name': pattern},
+                                   {'destination.name': pattern}]})
+
+    if after:
+        submitted_at, journey_id = after
+        conditions.append({'$or': [{'submitted_at': {'$lt': submitted_at}},
+                                   {'submitted_at': submitted_at, '_id': {'$lt': journey_id}}]})
+
+    if conditions:
+        query['$and'] = conditions
+
+    return query
+
+
+@timed('mongo')
+def get_journey_page(journey_collection: Collection, user_id, search: str = None,
+                     after: tuple = None, limit: int = JOURNEY_PAGE_SIZE) -> tuple:
+    """
+    Returns one page of the names of a user's journeys, newest first, and the
+    cursor of the next page, which is None after the last page.
+    """
+
+    journeys = list(journey_collection.find(get_history_query(user_id, search, after),
+                                            JOURNEY_NAME_PROJECTION)
+                    .sort(HISTORY_SORT).limit(limit + 1))
+
+    if len(journeys) <= limit:
+        return journeys, None
+
+    journeys = journeys[:limit]
+
+    return journeys, (journeys[-1]['submitted_at'], journeys[-1]['_id'])
+
+
+@timed('mongo')
+def get_user_journey(journey_collection: Collection, user_id, journey_id) -> dict | None:
+    """Returns one of the user's journeys by its _id."""
+
+    return journey_collection.find_one({'_id': journey_id, 'user_id': user_id})
+
+
+def get_stats_collection(journey_collection: Collection) -> Collection:
+    """Returns the collection of per-user rollup documents next to the journeys."""
+
+    return journey_collection.database[STATS_COLLECTION]
+
+
+def get_stats_increment(journey: dict, sign: int = 1) -> dict:
+    """Returns the $inc that adds (or with sign=-1, removes) a journey from a user's rollup."""
+
+    transport = journey['transport']['type']
+
+    values = {'journeys': 1, 'total': journey['co2e']['total'],
+              'direct': journey['co2e']['direct'],
+              'indirect': journey['co2e']['indirect'],
+              'distance': journey['distance']}
+
+    increment = dict()
+
+    for field, value in values.items():
+        increment[field] = sign * value
+        increment[f"transport.{transport}.{field}"] = sign * value
+
+    return increment
+
+
+def update_user_stats(journey_collection: Collection, journeys: list, sign: int = 1) -> None:
+    """
+    Atomically applies the journeys to their users' rollup documents, one update
+    per user, rebuilding any rollup that did not exist yet from the user's journeys.
+    """
+
+    increments = defaultdict(lambda: defaultdict(int))
+
+    for journey in journeys:
+        for field, value in get_stats_increment(journey, sign).items():
+            increments[journey['user_id']][field] += value
+
+    stats_collection = get_stats_collection(journey_collection)
+
+    for user_id, increment in increments.items():
+        result = stats_collection.update_one(
+            {'_id': user_id}, {'$inc': dict(increment)}, upsert=True)
+
+        # A new rollup only holds these journeys, so is rebuilt from all of the user's.
+        if result.upserted_id is not None:
+            reconcile_user_stats(journey_collection, user_id)
+
+
+@timed('mongo')
+def insert_journey(journey_collection: Collection, journey: dict) -> None:
+    """Inserts a journey and adds it to the user's rollup."""
+
+    journey_collection.insert_one(journey)
+
+    update_user_stats(journey_collection, [journey])
+
+
+@timed('mongo')
+def insert_journeys(journey_collection: Collection, journeys: list) -> tuple:
+    """
+    Inserts journeys unordered, skipping any whose _id is already stored, and adds
+    the new ones to their users' rollups. Returns the number inserted and skipped.
+    A skipped journey may be stored without being in its rollup, so the rollups
+    of its users are rebuilt.
+    """
+
+    if not journeys:
+        return 0, 0
+
+    try:
+        journey_collection.insert_many(journeys, ordered=False)
+        failed = set()
+
+    except BulkWriteError as err:
+        write_errors = err.details['writeErrors']
+
+        if any(e['code'] != DUPLICATE_KEY_ERROR for e in write_errors):
+            raise
+
+        failed = {e['index'] for e in write_errors}
+
+    update_user_stats(journey_collection,
+                      [j for i, j in enumerate(journeys) if i not in failed])
+
+    for user_id in {journeys[i]['user_id'] for i in failed}:
+        reconcile_user_stats(journey_collection, user_id)
+
+    return len(journeys) - len(failed), len(failed)
+
+
+@timed('mongo')
+def delete_user_journey(journey_collection: Collection, query: dict) -> dict | None:
+    """Deletes a journey and removes it from the user's rollup, returning the deleted journey."""
+
+    journey = journey_collection.find_one_and_delete(query)
+
+    if journey:
+        update_user_stats(journey_collection, [journey], sign=-1)
+
+    return journey
+
+
+def get_empty_rollup() -> dict:
+    """Returns the rollup document of a user with no journeys."""
+
+    return {'journeys': 0, 'total': 0.0, 'direct': 0.0, 'indirect': 0.0,
+            'distance': 0.0, 'transport': {}}
+
+
+@timed('mongo')
+def reconcile_user_stats(journey_collection: Collection, user_id=None) -> int:
+    """
+    Rebuilds the rollup documents of one user, or every user, from their journeys,
+    correcting any drift. Returns the number of users reconciled.
+    """
+
+    query = {} if user_id is None else {'user_id': user_id}
+
+    pipeline = [
+        {'$match': query},
+        {'$group': {
+            '_id': {'user_id': '$user_id', 'transport': '$transport.type'},
+            'journeys': {'$sum': 1},
+            'total': {'$sum': '$co2e.total'},
+            'direct': {'$sum': '$co2e.direct'},
+            'indirect': {'$sum': '$co2e.indirect'},
+            'distance': {'$sum': '$distance'}
+        }}
+    ]
+
+    rollups = defaultdict(get_empty_rollup)
+
+    for totals in journey_collection.aggregate(pipeline):
+
+        group = totals.pop('_id')
+        rollup = rollups[group['user_id']]
+
+        rollup['transport'][group['transport']] = totals
+
+        for field, value in totals.items():
+            rollup[field] += value
+
+    if user_id is not None and not rollups:
+        # An empty rollup stops users without journeys being reconciled on every read.
+        rollups[user_id] = get_empty_rollup()
+
+    stats_collection = get_stats_collection(journey_collection)
+
+    if user_id is None:
+        stats_collection.delete_many({'_id': {'$nin': list(rollups)}})
+
+    for uid, rollup in rollups.items():
+        stats_collection.replace_one({'_id': uid}, rollup, upsert=True)
+
+    return len(rollups)
+
+
+@timed('mongo')
+def get_user_summary(journey_collection: Collection, user_id) -> JourneySummary:
+    """
+    Returns the per-transport summary of a user's journeys from their rollup
+    document, building the rollup first if the user does not have one yet.
+    """
+
+    stats_collection = get_stats_collection(journey_collection)
+
+    stats = stats_collection.find_one({'_id': user_id})
+
+    if stats is None:
+        reconcile_user_stats(journey_collection, user_id)
+        stats = stats_collection.find_one({'_id': user_id}) or {}
+
+    return summarise_totals([{'transport': transport} | totals
+                             for transport, totals in stats.get('transport', {}).items()])
+
+
+def ensure_indexes(db: Database) -> list:
+    """Creates the indexes the dashboard's queries rely on, returning their names."""
+
+    indexes = [
+        db['users'].create_index([('username', ASCENDING)], unique=True,
+                                 name='username_unique'),
+        db['journeys'].create_index([('user_id', ASCENDING), ('submitted_at', DESCENDING),
+                                     ('_id', DESCENDING)],
+                                    name='user_id_submitted_at_id')
+    ]
+
+    return indexes
+
+
+def get_plan_stages(plan: dict) -> list:
+    """Returns every stage name in a query plan, outermost first."""
+
+    stages = [plan['stage']] if 'stage' in plan else []
+
+    for value in plan.values():
+        children = value if isinstance(value, list) else [value]
+        for child in children:
+            if isinstance(child, dict):
+                stages.extend(get_plan_stages(child))
+
+    return stages
+
+
+def explain_query(collection: Collection, query: dict, sort: list = None) -> dict:
+    """Returns the winning plan's stages and execution statistics for a query."""
+
+    command = {'find': collection.name, 'filter': query}
+
+    if sort:
+        command['sort'] = SON(sort)
+
+    explained = collection.database.command(
+        'explain', command, verbosity='executionStats')
+
+    stats = explained['executionStats']
+    stages = get_plan_stages(explained['queryPlanner']['winningPlan'])
+
+    return {'collection': collection.name, 'filter': query, 'stages': stages,
+            'collection_scan': 'COLLSCAN' in stages,
+            'keys_examined': stats['totalKeysExamined'],
+            'docs_examined': stats['totalDocsExamined'],
+            'returned': stats['nReturned']}
+
+
+def get_query_report(db: Database, username: str) -> list:
+    """Returns the explain-plan statistics of each dashboard query for a user."""
+
+    users = db['users']
+    journeys = db['journeys']
+
+    user_id = (users.find_one({'username': username}) or {}).get('_id')
+    latest = journeys.find_one({'user_id': user_id}, sort=HISTORY_SORT) or {}
+    after = (latest.get('submitted_at'), latest.get('_id'))
+
+    return [
+        explain_query(users, {'username': username}),
+        explain_query(journeys, get_history_query(user_id), HISTORY_SORT),
+        explain_query(journeys, get_history_query(user_id, after=after), HISTORY_SORT),
+        explain_query(journeys, {'_id': latest.get('_id'), 'user_id': user_id})
+    ]
+
+
+if __name__ == "__main__":
+
+    parser = ArgumentParser(
+        description="Create the eco_travel indexes and explain the dashboard's queries.")
+    parser.add_argument("--username", help="Explain the queries for this user")
+    parser.add_argument("--reconcile", action="store_true",
+                        help="Rebuild every user's rollup from their journeys")
+    args = parser.parse_args()
+
+    eco_travel = get_database()
+
+    print(f"Indexes: {', '.join(ensure_indexes(eco_travel))}")
+
+    if args.reconcile:
+        print(f"Reconciled {reconcile_user_stats(eco_travel['journeys'])} user rollups")
+
+    if args.username:
+        for plan in get_query_report(eco_travel, args.username):
+            print(f"{plan['collection']} {plan['filter']}: {' > '.join(plan['stages'])}, "
+                  f"{plan['keys_examined']} keys and {plan['docs_examined']} documents "
+                  f"examined for {plan['returned']} returned"
+                  + (" (COLLECTION SCAN)" if plan['collection_scan'] else ""))
@@ -0,0 +1,166 @@
+"""Precomputed great-circle distances between every pair of railway stations."""
+
+from argparse import ArgumentParser
+from functools import cache
+from os import close, makedirs, path, remove, replace
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from config import REFERENCE_CACHE_DIR, get_station_index
+from location_index import LocationIndex
+from offline_estimator import get_factor_table, haversine
+
+STATIONS_PATH = './data/stations.csv'
+
+DISTANCE_MATRIX_PATH = path.join(REFERENCE_CACHE_DIR, 'station_distances.npy')
+
+# Rows of the matrix computed at once, keeping each block's float64 temporaries to a few MB.
+BUILD_BLOCK_ROWS = 256
+
+# Held while the matrix is loaded or built, so concurrent first lookups build it once.
+_matrix_lock = threading.Lock()
+
+
+class StationDistanceMatrix:
+    """Great-circle distances in km between stations, looked up by name or CRS code."""
+
+    def __init__(self, station_index: LocationIndex, distances: np.ndarray):
+
+        if distances.shape != (len(station_index), len(station_index)):
+            raise ValueError("The distance matrix does not match the station index.")
+
+        self.station_index = station_index
+        self.distances = distances
+
+    def get_station_row(self, station: str) -> int:
+        """Returns the matrix row of a station name or CRS code."""
+
+        if station in self.station_index:
+            return self.station_index.get_row(station)
+
+        return self.station_index.get_code_row(station)
+
+    def get_distance(self, origin: str, destination: str) -> float:
+        """Returns the distance in km between two stations."""
+
+        return float(self.distances[self.get_station_row(origin),
+                                    self.get_station_row(destination)])
+
+    def get_distances(self, origins: list, destinations: list) -> np.ndarray:
+        """Returns the distances in km between pairs of stations."""
+
+        origin_rows = np.fromiter(map(self.get_station_row, origins), dtype=np.intp)
+        dest_rows = np.fromiter(map(self.get_station_row, destinations), dtype=np.intp)
+
+        return self.distances[origin_rows, dest_rows]
+
+
+def build_distance_matrix(station_index: LocationIndex, matrix_path: str) -> None:
+    """
+    Writes the distance between every pair of stations as a float32 .npy file,
+    a block of rows at a time, replacing any previous matrix atomically. Each
+    build writes its own temporary file, so builds by other processes cannot
+    interleave.
+    """
+
+    matrix_dir = path.dirname(matrix_path) or "."
+    makedirs(matrix_dir, exist_ok=True)
+
+    num_stations = len(station_index)
+    handle, temp_path = tempfile.mkstemp(suffix=".npy", dir=matrix_dir)
+    close(handle)
+
+    try:
+        matrix = np.lib.format.open_memmap(temp_path, mode='w+', dtype=np.float32,
+                                           shape=(num_stations, num_stations))
+
+        lats, longs = station_index.lats, station_index.longs
+
+        for start in range(0, num_stations, BUILD_BLOCK_ROWS):
+            stop = min(start + BUILD_BLOCK_ROWS, num_stations)
+            matrix[start:stop] = haversine(lats[start:stop, None], longs[start:stop, None],
+                                           lats[None, :], longs[None, :])
+
+        matrix.flush()
+        del matrix
+
+        replace(temp_path, matrix_path)
+
+    except BaseException:
+        remove(temp_path)
+        raise
+
+
+def load_distance_matrix(station_index: LocationIndex, matrix_path: str = DISTANCE_MATRIX_PATH,
+                         stations_path: str = STATIONS_PATH) -> StationDistanceMatrix:
+    """
+    Returns the memory-mapped distance matrix, building it first if it is
+    missing, older than the stations file or of the wrong size.
+    """
+
+    with _matrix_lock:
+
+        stale = (not path.exists(matrix_path)
+                 or path.getmtime(matrix_path) < path.getmtime(stations_path))
+
+        if not stale:
+            distances = np.load(matrix_path, mmap_mode='r')
+            stale = distances.shape != (len(station_index), len(station_index))
+
+        if stale:
+            build_distance_matrix(station_index, matrix_path)
+            distances = np.load(matrix_path, mmap_mode='r')
+
+    return StationDistanceMatrix(station_index, distances)
+
+
+@cache
+def get_station_distance_matrix() -> StationDistanceMatrix:
+    """Returns the process-wide station distance matrix."""
+
+    return load_distance_matrix(get_station_index())
+
+
+@cache
+def get_rail_factors() -> tuple:
+    """Returns the rail distance uplift and direct and indirect CO2e per km."""
+
+    factors = get_factor_table().loc['rail']
+
+    return (float(factors['distance_uplift']), float(factors['direct_kg_per_km']),
+            float(factors['indirect_kg_per_km']))
+
+
+def estimate_rail_carbon_data(origin_station: str, dest_station: str) -> dict:
+    """
+    Returns the same CO2e data as get_carbon_data for a rail journey between two
+    stations, given by name or CRS code, from the distance matrix.
+    """
+
+    uplift, direct_per_km, indirect_per_km = get_rail_factors()
+
+    distance = get_station_distance_matrix().get_distance(origin_station, dest_station) * uplift
+
+    direct, indirect = distance * direct_per_km, distance * indirect_per_km
+
+    return {'co2e': round(direct + indirect, 3), 'direct_co2e': round(direct, 3),
+            'indirect_co2e': round(indirect, 3), 'distance': round(distance, 3)}
+
+
+if __name__ == "__main__":
+
+    parser = ArgumentParser(description="Build the station-to-station distance matrix.")
+    parser.add_argument("--output", default=DISTANCE_MATRIX_PATH)
+    args = parser.parse_args()
+
+    index = get_station_index()
+
+    build_start = time.perf_counter()
+    build_distance_matrix(index, args.output)
+
+    print(f"{len(index)}x{len(index)} distances built in "
+          f"{time.perf_counter() - build_start:.2f}s, "
+          f"{path.getsize(args.output) / 1e6:.1f} MB written to {args.output}")
@@ -0,0 +1,136 @@
+"""Persistent cache for emissions estimates returned by the Climatiq API."""
+
+from functools import cache
+import json
+import sqlite3
+import threading
+import time
+
+from config import EMISSIONS_CACHE_PATH, EMISSIONS_CACHE_SIZE, EMISSIONS_CACHE_TTL
+
+COORDINATE_PRECISION = 3
+
+
+def normalise_location(location: dict) -> str:
+    """Returns a normalised string for the origin or destination of a payload."""
+
+    if 'iata' in location:
+        return location['iata'].strip().upper()
+
+    lat = round(float(location['latitude']), COORDINATE_PRECISION)
+    long = round(float(location['longitude']), COORDINATE_PRECISION)
+
+    return f"{lat:.{COORDINATE_PRECISION}f},{long:.{COORDINATE_PRECISION}f}"
+
+
+def get_cache_key(payload: dict) -> str:
+    """Returns the cache key for a Climatiq travel payload."""
+
+    key_parts = [payload['travel_mode'],
+                 normalise_location(payload['origin']),
+                 normalise_location(payload['destination'])]
+
+    details = payload.get('car_details') or payload.get('air_details') or {}
+
+    key_parts.extend(f"{k}={details[k]}" for k in sorted(details))
+
+    return "|".join(key_parts)
+
+
+class EmissionsCache:
+    """A size-bounded LRU cache with a TTL, stored in SQLite."""
+
+    def __init__(self, path: str = ":memory:", max_size: int = 10000, ttl: float = 2592000):
+
+        self.path = path
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS emissions (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )""")
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS emissions_last_used ON emissions (last_used)")
+
+    def get(self, key: str) -> dict | None:
+        """Returns the cached value for the key, or None if missing or expired."""
+
+        now = time.time()
+
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM emissions WHERE key = ?", (key,)).fetchone()
+
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    self._conn.execute(
+                        "DELETE FROM emissions WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+
+            self._conn.execute(
+                "UPDATE emissions SET last_used = ? WHERE key = ?", (now, key))
+            self.hits += 1
+
+        return json.loads(row[0])
+
+    def set(self, key: str, value: dict) -> None:
+        """Stores a value, evicting the least recently used entries when full."""
+
+        now = time.time()
+
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO emissions VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now, now))
+
+            overflow = self._size() - self.max_size
+
+            if overflow > 0:
+                self._conn.execute(
+                    """DELETE FROM emissions WHERE key IN (
+                        SELECT key FROM emissions ORDER BY last_used LIMIT ?
+                    )""", (overflow,))
+
+    def clear(self) -> None:
+        """Removes every entry and resets the counters."""
+
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM emissions")
+            self.hits = 0
+            self.misses = 0
+
+    def _size(self) -> int:
+        """Returns the number of stored entries."""
+
+        return self._conn.execute("SELECT COUNT(*) FROM emissions").fetchone()[0]
+
+    def stats(self) -> dict:
+        """Returns the hit/miss counters and current size of the cache."""
+
+        with self._lock:
+            size = self._size()
+
+        lookups = self.hits + self.misses
+
+        return {'hits': self.hits, 'misses': self.misses, 'size': size,
+                'max_size': self.max_size,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0}
+
+
+@cache
+def get_emissions_cache() -> EmissionsCache:
+    """Returns the process-wide emissions cache."""
+
+    return EmissionsCache(EMISSIONS_CACHE_PATH, EMISSIONS_CACHE_SIZE, EMISSIONS_CACHE_TTL)
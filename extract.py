@@ -1,81 +1,101 @@
 """Script used in extracting data from APIs."""
 
+from functools import cache
 import json
 from os import environ
 
 from dotenv import load_dotenv
 import pandas as pd
-import requests
-
-from config import CLIMATIQ_HEADERS
+from requests.exceptions import RequestException
+
+from config import (CLIMATIQ_BURST, CLIMATIQ_HEADERS, CLIMATIQ_MAX_WAIT, CLIMATIQ_RATE_LIMIT,
+                    ESTIMATION_MODE, RAIL_ESTIMATION_MODE)
+from distance_matrix import estimate_rail_carbon_data
+from emissions_cache import get_cache_key, get_emissions_cache
+from http_client import get_remaining_time, http_post
+from location_index import LocationIndex
+from metrics import timed
+from offline_estimator import estimate_carbon_data
+from postcodes import get_postcode_resolver
+from rate_limit import SingleFlight, TokenBucket
 
 COUNTRY_CODE = "GB"
 
-POSTCODE_BASE_URL = "https://api.postcodes.io/postcodes"
-CLIMATIQ_URL = "https://preview.api.climatiq.io/travel/v1-preview1/distance"
+CLIMATIQ_URL = environ.get(
+    'CLIMATIQ_URL', "https://preview.api.climatiq.io/travel/v1-preview1/distance")
 
 
 ADDRESS_BASE_URL = "https://uk-postcode.p.rapidapi.com/getpostcode"
 
 
-def get_postcode_location(postcode: str) -> str:
-    """Gets the address from the given postcode."""
+@timed('extract')
+def resolve_postcode(postcode: str) -> dict | None:
+    """Validates and locates the given postcode, returning None if it is invalid."""
 
-    res = requests.get(f"{POSTCODE_BASE_URL}/{postcode}")
+    return get_postcode_resolver().resolve(postcode)
 
-    if res.status_code == 200:
 
-        data = res.json()['result']
+@timed('extract')
+def resolve_postcodes(postcodes: list) -> dict:
+    """Returns the location of each given postcode, resolving unknown ones in bulk."""
 
-        parish = data.get('parish')
+    return get_postcode_resolver().resolve_many(postcodes)
 
-        if parish:
 
-            name = parish.split(",")[0] if "," in parish else parish
-        else:
-            name = data.get('admin_ward')
+def get_postcode_location(postcode: str) -> dict:
+    """Gets the address from the given postcode."""
 
-        lat = data.get('latitude')
-        long = data.get('longitude')
+    location = resolve_postcode(postcode)
 
-        return {'name': name, 'lat': lat, 'long': long}
+    if location is None:
+        raise ValueError(f"Invalid postcode: {postcode}")
 
-    raise ConnectionError("Could not connect to the API.")
+    return location
 
 
 def is_valid_postcode(postcode: str) -> bool:
     """Determines whether the given postcode is valid or not."""
 
-    res = requests.get(f"{POSTCODE_BASE_URL}/{postcode}/validate", timeout=10)
+    return resolve_postcode(postcode) is not None
 
-    if res.status_code == 200:
 
-        return res.json()['result']
+@cache
+def get_climatiq_limiter() -> TokenBucket:
+    """Returns the process-wide limiter shared by every Climatiq call."""
 
-    raise ConnectionError("Could not connect to the API.")
+    return TokenBucket(CLIMATIQ_RATE_LIMIT, CLIMATIQ_BURST)
+
+
+@cache
+def get_climatiq_flights() -> SingleFlight:
+    """Returns the process-wide record of Climatiq calls in flight."""
 
+    return SingleFlight()
 
-def get_carbon_rail_data(origin_location: str, dest_location: str) -> dict:
-    """Returns raw data about a rail journey from the Climatiq API."""
+
+def get_max_wait() -> float:
+    """Returns how long a Climatiq call may wait for the rate limit, within any deadline."""
+
+    remaining = get_remaining_time()
+
+    return CLIMATIQ_MAX_WAIT if remaining is None else min(CLIMATIQ_MAX_WAIT, remaining)
+
+
+@timed('extract')
+def request_carbon_data(payload: dict) -> dict:
+    """
+    Returns the CO2e data for a travel payload from the Climatiq API, waiting
+    for the rate limit if needed.
+    """
 
     co2e_data = dict()
 
-    rail_data = {
-        "travel_mode": "rail",
-        "origin": {
-            "latitude": origin_location['lat'],
-            "longitude": origin_location['long'],
-            "country": "GB"
-        },
-        "destination": {
-            "latitude": dest_location['lat'],
-            "longitude": dest_location['long'],
-            "country": "GB"
-        }
-    }
+    with timed('climatiq', 'rate_limit_wait'):
+        if not get_climatiq_limiter().acquire(get_max_wait()):
+            raise TimeoutError("Timed out waiting for the Climatiq rate limit.")
 
-    res = requests.post(CLIMATIQ_URL, json=rail_data,
-                        headers=CLIMATIQ_HEADERS, timeout=10)
+    res = http_post(CLIMATIQ_URL, "climatiq", json=payload,
+                    headers=CLIMATIQ_HEADERS)
 
     if res.status_code == 200:
 
@@ -91,62 +111,52 @@ def get_carbon_rail_data(origin_location: str, dest_location: str) -> dict:
     raise ConnectionError("Could not connect to the API.")
 
 
-def get_rail_location(station: str, stations_df: pd.DataFrame) -> dict:
-    """Returns the latitude and longitude of the given railway station."""
-
-    station_data = stations_df[stations_df['stationName'] == station]
-
-    lat = station_data['lat'].values[0]
-    long = station_data['long'].values[0]
-
-    return {'lat': lat, 'long': long}
-
-
-def get_rail_db_data(origin_station: str, dest_station: str, stations_df: pd.DataFrame) -> dict:
-    """Returns a dictionary of all the necessary data from a rail journey to be inserted into the database."""
-
-    journey_data = dict()
-
-    journey_data['transport'] = dict()
-
-    journey_data['transport']['type'] = 'rail'
+def request_and_cache_carbon_data(payload: dict, cache_key: str) -> dict:
+    """Returns the CO2e data for a travel payload from the Climatiq API, caching it."""
 
-    journey_data['origin'] = dict()
+    co2e_data = request_carbon_data(payload)
 
-    origin_location = get_rail_location(origin_station, stations_df)
+    get_emissions_cache().set(cache_key, co2e_data)
 
-    journey_data['origin']['name'] = origin_station
-    journey_data['origin']['lat'] = origin_location['lat']
-    journey_data['origin']['lon'] = origin_location['long']
+    return co2e_data
 
-    journey_data['destination'] = dict()
 
-    dest_location = get_rail_location(dest_station, stations_df)
+@timed('extract')
+def get_carbon_data(payload: dict) -> dict:
+    """
+    Returns the CO2e data for a travel payload, using the emissions cache where
+    possible and the offline estimator when configured to. Identical payloads
+    requested at the same time share one Climatiq call.
+    """
 
-    journey_data['destination']['name'] = dest_station
-    journey_data['destination']['lat'] = dest_location['lat']
-    journey_data['destination']['lon'] = dest_location['long']
+    if ESTIMATION_MODE == 'offline':
+        return estimate_carbon_data(payload)
 
-    journey_data['co2e'] = dict()
+    emissions_cache = get_emissions_cache()
+    cache_key = get_cache_key(payload)
 
-    carbon_data = get_carbon_rail_data(origin_location, dest_location)
-
-    journey_data['co2e']['total'] = carbon_data['co2e']
-    journey_data['co2e']['direct'] = carbon_data['direct_co2e']
-    journey_data['co2e']['indirect'] = carbon_data['indirect_co2e']
+    co2e_data = emissions_cache.get(cache_key)
 
-    journey_data['distance'] = carbon_data['distance']
+    if co2e_data is None:
 
-    return journey_data
+        try:
+            # Calls with a deadline may fail early, so are only shared with each other.
+            flight_key = cache_key if get_remaining_time() is None else (cache_key, 'deadline')
+            co2e_data = get_climatiq_flights().do(flight_key, request_and_cache_carbon_data,
+                                                  payload, cache_key)
+        except (ConnectionError, TimeoutError, RequestException):
+            if ESTIMATION_MODE != 'fallback':
+                raise
+            return estimate_carbon_data(payload)
 
+    return co2e_data
 
-def get_car_carbon_data(origin_location: dict, dest_location: dict, car_details: dict) -> dict:
-    """Returns the CO2e data of a given car journey from the Climatiq API."""
 
-    co2e_data = dict()
+def get_rail_payload(origin_location: dict, dest_location: dict) -> dict:
+    """Returns the Climatiq request payload for a rail journey."""
 
-    car_data = {
-        "travel_mode": "car",
+    return {
+        "travel_mode": "rail",
         "origin": {
             "latitude": origin_location['lat'],
             "longitude": origin_location['long'],
@@ -156,62 +166,54 @@ def get_car_carbon_data(origin_location: dict, dest_location: dict, car_details:
             "latitude": dest_location['lat'],
             "longitude": dest_location['long'],
             "country": "GB"
-        },
-        "car_details": {
-            "car_size": car_details['car_size'],
-            "car_type": car_details['car_type']
         }
     }
 
-    res = requests.post(CLIMATIQ_URL, json=car_data,
-                        headers=CLIMATIQ_HEADERS, timeout=10)
 
-    if res.status_code == 200:
+def get_carbon_rail_data(origin_location: dict, dest_location: dict) -> dict:
+    """
+    Returns raw data about a rail journey from the Climatiq API or, when rail
+    journeys are estimated offline, from the station distance matrix if both
+    ends are stations.
+    """
 
-        data = res.json()
+    payload = get_rail_payload(origin_location, dest_location)
 
-        co2e_data['co2e'] = data['co2e']
-        co2e_data['direct_co2e'] = data['direct_emissions']['co2e']
-        co2e_data['indirect_co2e'] = data['indirect_emissions']['co2e']
-        co2e_data['distance'] = data['distance_km']
+    if RAIL_ESTIMATION_MODE == 'offline':
+        if 'crs' in origin_location and 'crs' in dest_location:
+            return estimate_rail_carbon_data(origin_location['crs'], dest_location['crs'])
+        return estimate_carbon_data(payload)
 
-        return co2e_data
+    return get_carbon_data(payload)
 
-    raise ConnectionError("Could not connect to the API.")
 
+def get_rail_location(station: str, station_index: LocationIndex) -> dict:
+    """Returns the latitude, longitude and CRS code of the given railway station."""
 
-def get_car_db_data(origin_postcode: str, dest_postcode: str, car_details: dict) -> dict:
-    """Returns a dictionary of all the necessary data from a rail journey to be inserted into the database."""
+    return station_index.get_location(station)
 
-    journey_data = dict()
 
-    journey_data['transport'] = dict()
+def get_journey_data(transport: dict, origin: dict, destination: dict, carbon_data: dict) -> dict:
+    """Returns the database document for a journey from its locations and CO2e data."""
 
-    journey_data['transport']['type'] = 'car'
-    journey_data['transport']['car_size'] = car_details['car_size']
-    journey_data['transport']['car_type'] = car_details['car_type']
+    journey_data = dict()
 
-    journey_data['origin'] = dict()
+    journey_data['transport'] = transport
 
-    origin_location = get_postcode_location(origin_postcode)
+    journey_data['origin'] = dict()
 
-    journey_data['origin']['name'] = origin_location['name']
-    journey_data['origin']['lat'] = origin_location['lat']
-    journey_data['origin']['lon'] = origin_location['long']
+    journey_data['origin']['name'] = origin['name']
+    journey_data['origin']['lat'] = origin['lat']
+    journey_data['origin']['lon'] = origin['long']
 
     journey_data['destination'] = dict()
 
-    dest_location = get_postcode_location(dest_postcode)
-
-    journey_data['destination']['name'] = dest_location['name']
-    journey_data['destination']['lat'] = dest_location['lat']
-    journey_data['destination']['lon'] = dest_location['long']
+    journey_data['destination']['name'] = destination['name']
+    journey_data['destination']['lat'] = destination['lat']
+    journey_data['destination']['lon'] = destination['long']
 
     journey_data['co2e'] = dict()
 
-    carbon_data = get_car_carbon_data(
-        origin_location, dest_location, car_details)
-
     journey_data['co2e']['total'] = carbon_data['co2e']
     journey_data['co2e']['direct'] = carbon_data['direct_co2e']
     journey_data['co2e']['indirect'] = carbon_data['indirect_co2e']
@@ -221,91 +223,113 @@ def get_car_db_data(origin_postcode: str, dest_postcode: str, car_details: dict)
     return journey_data
 
 
-def get_airport_location(airport: str, airports_df: pd.DataFrame) -> dict:
-    """Returns the location of a given airport."""
-
-    airport_data = airports_df[airports_df['name'] == airport]
+@timed('extract')
+def get_rail_db_data(origin_station: str, dest_station: str, station_index: LocationIndex) -> dict:
+    """Returns a dictionary of all the necessary data from a rail journey to be inserted into the database."""
 
-    lat = airport_data['latitude_deg'].values[0]
-    long = airport_data['longitude_deg'].values[0]
-    iata = airport_data['iata_code'].values[0]
+    origin_location = get_rail_location(origin_station, station_index)
+    dest_location = get_rail_location(dest_station, station_index)
 
-    return {'lat': lat, 'long': long, 'iata': iata}
+    carbon_data = get_carbon_rail_data(origin_location, dest_location)
 
+    return get_journey_data({'type': 'rail'},
+                            origin_location | {'name': origin_station},
+                            dest_location | {'name': dest_station},
+                            carbon_data)
 
-def get_flight_carbon_data(origin_location: dict, dest_location: dict, cabin_class: str) -> dict:
-    """Returns CO2e data from a given flight."""
 
-    co2e_data = dict()
+def get_car_payload(origin_location: dict, dest_location: dict, car_details: dict) -> dict:
+    """Returns the Climatiq request payload for a car journey."""
 
-    flight_data = {
-        "travel_mode": "air",
+    return {
+        "travel_mode": "car",
         "origin": {
-            "iata": origin_location['iata']
+            "latitude": origin_location['lat'],
+            "longitude": origin_location['long'],
+            "country": "GB"
         },
         "destination": {
-            "iata": dest_location['iata']
+            "latitude": dest_location['lat'],
+            "longitude": dest_location['long'],
+            "country": "GB"
         },
-        "air_details": {
-            "class": cabin_class
+        "car_details": {
+            "car_size": car_details['car_size'],
+            "car_type": car_details['car_type']
         }
     }
 
-    res = requests.post(CLIMATIQ_URL, json=flight_data,
-                        headers=CLIMATIQ_HEADERS, timeout=10)
 
-    if res.status_code == 200:
+def get_car_carbon_data(origin_location: dict, dest_location: dict, car_details: dict) -> dict:
+    """Returns the CO2e data of a given car journey from the Climatiq API."""
 
-        data = res.json()
+    return get_carbon_data(get_car_payload(origin_location, dest_location, car_details))
 
-        co2e_data['co2e'] = data['co2e']
-        co2e_data['direct_co2e'] = data['direct_emissions']['co2e']
-        co2e_data['indirect_co2e'] = data['indirect_emissions']['co2e']
-        co2e_data['distance'] = data['distance_km']
 
-        return co2e_data
+@timed('extract')
+def get_car_db_data(origin_postcode: str, dest_postcode: str, car_details: dict) -> dict:
+    """Returns a dictionary of all the necessary data from a car journey to be inserted into the database."""
 
-    raise ConnectionError("Could not connect to the API.")
+    locations = resolve_postcodes([origin_postcode, dest_postcode])
 
+    origin_location = locations[origin_postcode]
+    dest_location = locations[dest_postcode]
 
-def get_flight_db_data(origin_airport: str, dest_airport: str, cabin_class: str, airports_df: pd.DataFrame) -> dict:
-    """Returns all the necessary data from a flight to insert into the database."""
+    if origin_location is None or dest_location is None:
+        raise ValueError("Invalid postcode.")
 
-    journey_data = dict()
+    carbon_data = get_car_carbon_data(
+        origin_location, dest_location, car_details)
 
-    journey_data['transport'] = dict()
+    return get_journey_data({'type': 'car',
+                             'car_size': car_details['car_size'],
+                             'car_type': car_details['car_type']},
+                            origin_location, dest_location, carbon_data)
 
-    journey_data['transport']['type'] = 'air'
-    journey_data['transport']['cabin_class'] = cabin_class
 
-    journey_data['origin'] = dict()
+def get_airport_location(airport: str, airport_index: LocationIndex) -> dict:
+    """Returns the location of a given airport."""
 
-    origin_location = get_airport_location(origin_airport, airports_df)
+    return airport_index.get_location(airport)
 
-    journey_data['origin']['name'] = origin_airport
-    journey_data['origin']['lat'] = origin_location['lat']
-    journey_data['origin']['lon'] = origin_location['long']
 
-    journey_data['destination'] = dict()
+def get_flight_payload(origin_location: dict, dest_location: dict, cabin_class: str) -> dict:
+    """Returns the Climatiq request payload for a flight."""
+
+    return {
+        "travel_mode": "air",
+        "origin": {
+            "iata": origin_location['iata']
+        },
+        "destination": {
+            "iata": dest_location['iata']
+        },
+        "air_details": {
+            "class": cabin_class
+        }
+    }
 
-    dest_location = get_airport_location(dest_airport, airports_df)
 
-    journey_data['destination']['name'] = dest_airport
-    journey_data['destination']['lat'] = dest_location['lat']
-    journey_data['destination']['lon'] = dest_location['long']
+def get_flight_carbon_data(origin_location: dict, dest_location: dict, cabin_class: str) -> dict:
+    """Returns CO2e data from a given flight."""
 
-    journey_data['co2e'] = dict()
+    return get_carbon_data(get_flight_payload(origin_location, dest_location, cabin_class))
 
-    carbon_data = get_flight_carbon_data(
-        origin_location, dest_location, cabin_class)
 
-    journey_data['co2e']['total'] = carbon_data['co2e']
-    journey_data['co2e']['direct'] = carbon_data['direct_co2e']
-    journey_data['co2e']['indirect'] = carbon_data['indirect_co2e']
+@timed('extract')
+def get_flight_db_data(origin_airport: str, dest_airport: str, cabin_class: str, airport_index: LocationIndex) -> dict:
+    """Returns all the necessary data from a flight to insert into the database."""
 
-    journey_data['distance'] = carbon_data['distance']
+    origin_location = get_airport_location(origin_airport, airport_index)
+    dest_location = get_airport_location(dest_airport, airport_index)
 
-    return journey_data
+    carbon_data = get_flight_carbon_data(
+        origin_location, dest_location, cabin_class)
+
+    return get_journey_data({'type': 'air', 'cabin_class': cabin_class},
+                            origin_location | {'name': origin_airport},
+                            dest_location | {'name': dest_airport},
+                            carbon_data)
 
 
 if __name__ == "__main__":
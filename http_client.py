@@ -0,0 +1,125 @@
+"""Shared, pooled HTTP session used for every call to an external API."""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import cache
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from config import HTTP_POOL_SIZE, HTTP_MAX_RETRIES, HTTP_BACKOFF_FACTOR, HTTP_BACKOFF_JITTER
+from metrics import timed
+
+TIMEOUTS = {'postcodes': (3.05, 5), 'climatiq': (3.05, 10)}
+
+DEFAULT_TIMEOUT = (3.05, 10)
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# The monotonic time by which the current caller needs its response, if any.
+_request_deadline = ContextVar('request_deadline', default=None)
+
+
+@contextmanager
+def request_deadline(seconds: float):
+    """
+    Limits requests made within the block to finish within `seconds`, capping
+    their timeouts and sending them without retries.
+    """
+
+    token = _request_deadline.set(time.monotonic() + seconds)
+
+    try:
+        yield
+    finally:
+        _request_deadline.reset(token)
+
+
+def get_remaining_time() -> float | None:
+    """Returns the seconds left before the current deadline, or None if there is none."""
+
+    deadline = _request_deadline.get()
+
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def get_retry() -> Retry:
+    """Returns the retry policy for 429 and 5xx responses and dropped connections."""
+
+    return Retry(total=HTTP_MAX_RETRIES,
+                 backoff_factor=HTTP_BACKOFF_FACTOR,
+                 backoff_jitter=HTTP_BACKOFF_JITTER,
+                 status_forcelist=RETRY_STATUSES,
+                 allowed_methods=frozenset({'GET', 'POST'}),
+                 respect_retry_after_header=True,
+                 raise_on_status=False)
+
+
+@cache
+def get_session() -> requests.Session:
+    """Returns the process-wide session, keeping connections alive between calls."""
+
+    adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE,
+                          pool_maxsize=HTTP_POOL_SIZE, max_retries=get_retry())
+
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+    return session
+
+
+@cache
+def get_deadline_session() -> requests.Session:
+    """
+    Returns the process-wide session for requests with a deadline, which are
+    not retried as a retry's backoff would outlast it.
+    """
+
+    adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE,
+                          pool_maxsize=HTTP_POOL_SIZE, max_retries=0)
+
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+    return session
+
+
+def send_request(method: str, url: str, endpoint: str, **kwargs) -> requests.Response:
+    """
+    Sends a request using the timeout configured for the endpoint, within the
+    current deadline if there is one.
+    """
+
+    kwargs.setdefault('timeout', TIMEOUTS.get(endpoint, DEFAULT_TIMEOUT))
+
+    remaining = get_remaining_time()
+    session = get_session()
+
+    if remaining is not None:
+
+        if remaining <= 0:
+            raise requests.exceptions.Timeout(f"The deadline for {endpoint} has passed.")
+
+        timeout = kwargs['timeout']
+        timeout = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+        kwargs['timeout'] = tuple(min(t, remaining) for t in timeout)
+        session = get_deadline_session()
+
+    with timed(endpoint, method):
+        return session.request(method, url, **kwargs)
+
+
+def http_get(url: str, endpoint: str, **kwargs) -> requests.Response:
+    """Sends a GET request using the timeout configured for the endpoint."""
+
+    return send_request('GET', url, endpoint, **kwargs)
+
+
+def http_post(url: str, endpoint: str, **kwargs) -> requests.Response:
+    """Sends a POST request using the timeout configured for the endpoint."""
+
+    return send_request('POST', url, endpoint, **kwargs)
@@ -0,0 +1,244 @@
+"""Durable local outbox that journeys are written to before being flushed to MongoDB."""
+
+from functools import cache
+import logging
+import sqlite3
+import threading
+import time
+
+import bson
+from bson import ObjectId
+from bson.errors import InvalidDocument
+from pymongo.collection import Collection
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from config import JOURNEY_OUTBOX_PATH, OUTBOX_BATCH_SIZE, OUTBOX_FLUSH_INTERVAL
+from database import DUPLICATE_KEY_ERROR, insert_journeys
+
+logger = logging.getLogger(__name__)
+
+# Write error codes that may succeed if retried, from failovers, shutdowns and timeouts.
+RETRYABLE_WRITE_ERRORS = {6, 7, 50, 89, 91, 189, 262, 9001, 10107, 11600, 11602, 13435, 13436}
+
+
+class JourneyOutbox:
+    """
+    An append-only queue of journeys waiting to be inserted, stored in SQLite
+    and synced to disk on every append so an accepted journey is never lost.
+    """
+
+    def __init__(self, path: str = ":memory:"):
+
+        self.path = path
+        self.appended = threading.Event()
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=FULL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS outbox (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    id TEXT UNIQUE NOT NULL,
+                    document BLOB NOT NULL,
+                    created_at REAL NOT NULL
+                )""")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS dead_letter (
+                    id TEXT PRIMARY KEY,
+                    document BLOB NOT NULL,
+                    error TEXT NOT NULL,
+                    failed_at REAL NOT NULL
+                )""")
+
+    def append(self, journey: dict) -> ObjectId:
+        """
+        Stores a journey, giving it an _id if it has none so that inserting it
+        more than once cannot duplicate it, and returns the _id.
+        """
+
+        journey = {'_id': journey.get('_id') or ObjectId()} | journey
+
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO outbox (id, document, created_at) VALUES (?, ?, ?)",
+                (str(journey['_id']), bson.encode(journey), time.time()))
+
+        self.appended.set()
+
+        return journey['_id']
+
+    def peek(self, limit: int) -> list:
+        """Returns up to `limit` of the oldest journeys, leaving them in the outbox."""
+
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT document FROM outbox ORDER BY seq LIMIT ?", (limit,)).fetchall()
+
+        return [bson.decode(row[0]) for row in rows]
+
+    def remove(self, journey_ids: list) -> None:
+        """Removes journeys once they are stored in the database."""
+
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM outbox WHERE id = ?",
+                                   [(str(journey_id),) for journey_id in journey_ids])
+
+    def dead_letter(self, journeys: list, error: str) -> None:
+        """Moves journeys that can never be inserted out of the outbox, keeping them to inspect."""
+
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO dead_letter (id, document, error, failed_at) "
+                "VALUES (?, ?, ?, ?)",
+                [(str(j['_id']), bson.encode(j), error, time.time()) for j in journeys])
+            self._conn.executemany("DELETE FROM outbox WHERE id = ?",
+                                   [(str(j['_id']),) for j in journeys])
+
+    def get_dead_letters(self) -> list:
+        """Returns the journeys that could not be inserted, with their errors."""
+
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT document, error FROM dead_letter ORDER BY failed_at").fetchall()
+
+        return [{'journey': bson.decode(document), 'error': error} for document, error in rows]
+
+    def get_state(self, journey_id) -> str:
+        """
+        Returns 'pending' while a journey is waiting to be inserted, 'rejected' if
+        it was moved to the dead letters and 'flushed' once it is stored.
+        """
+
+        with self._lock:
+            for state, table in (('pending', 'outbox'), ('rejected', 'dead_letter')):
+                if self._conn.execute(f"SELECT 1 FROM {table} WHERE id = ?",
+                                      (str(journey_id),)).fetchone():
+                    return state
+
+        return 'flushed'
+
+    def size(self) -> int:
+        """Returns the number of journeys waiting to be inserted."""
+
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+
+class OutboxFlusher:
+    """
+    Drains an outbox into the journeys collection in batches from a background
+    thread, whenever journeys are appended and every `interval` seconds so that
+    batches which failed are retried.
+    """
+
+    def __init__(self, outbox: JourneyOutbox, journey_collection: Collection,
+                 batch_size: int = 100, interval: float = 5.0, on_flush=None):
+
+        self.outbox = outbox
+        self.journey_collection = journey_collection
+        self.batch_size = batch_size
+        self.interval = interval
+        self.on_flush = on_flush
+
+        self._lock = threading.Lock()
+
+    def flush(self) -> int:
+        """
+        Inserts every journey in the outbox, removing each batch once stored,
+        and returns how many were flushed. Re-inserted journeys are skipped.
+        """
+
+        flushed = 0
+
+        with self._lock:
+
+            while batch := self.outbox.peek(self.batch_size):
+
+                batch = self.insert_batch(batch)
+
+                # Run before the journeys leave the outbox, so anyone watching for that sees it.
+                if self.on_flush:
+                    self.on_flush(batch)
+
+                self.outbox.remove([j['_id'] for j in batch])
+
+                flushed += len(batch)
+
+        return flushed
+
+    def insert_batch(self, batch: list) -> list:
+        """
+        Inserts a batch, moving any journeys that can never be inserted to the
+        dead letters, and returns the journeys that were stored. Raises if the
+        batch may be stored by retrying it.
+        """
+
+        try:
+            insert_journeys(self.journey_collection, batch)
+
+        except BulkWriteError as err:
+            write_errors = err.details['writeErrors']
+
+            if any(e['code'] in RETRYABLE_WRITE_ERRORS for e in write_errors):
+                raise
+
+            rejected = {e['index']: e['errmsg'] for e in write_errors
+                        if e['code'] != DUPLICATE_KEY_ERROR}
+
+            for index, error in rejected.items():
+                self.outbox.dead_letter([batch[index]], error)
+
+            # The rest were stored, so are inserted again to skip them and update their rollups.
+            batch = [j for i, j in enumerate(batch) if i not in rejected]
+            insert_journeys(self.journey_collection, batch)
+
+        except InvalidDocument as err:
+
+            if len(batch) == 1:
+                self.outbox.dead_letter(batch, str(err))
+                return []
+
+            # The batch is inserted a journey at a time to find those that are invalid.
+            return [j for journey in batch for j in self.insert_batch([journey])]
+
+        return batch
+
+    def run(self) -> None:
+        """Flushes the outbox until the process exits."""
+
+        while True:
+
+            self.outbox.appended.clear()
+
+            try:
+                self.flush()
+            except PyMongoError as err:
+                logger.warning("Could not flush the journey outbox, retrying: %s", err)
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Unexpected error flushing the journey outbox, retrying")
+
+            self.outbox.appended.wait(self.interval)
+
+    def start(self) -> "OutboxFlusher":
+        """Starts flushing from a daemon thread."""
+
+        threading.Thread(target=self.run, daemon=True, name="outbox-flusher").start()
+
+        return self
+
+
+@cache
+def get_journey_outbox() -> JourneyOutbox:
+    """Returns the process-wide journey outbox."""
+
+    return JourneyOutbox(JOURNEY_OUTBOX_PATH)
+
+
+def start_outbox_flusher(journey_collection: Collection, on_flush=None) -> OutboxFlusher:
+    """Starts draining the process-wide outbox into the journeys collection."""
+
+    return OutboxFlusher(get_journey_outbox(), journey_collection, OUTBOX_BATCH_SIZE,
+                         OUTBOX_FLUSH_INTERVAL, on_flush).start()
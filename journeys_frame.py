@@ -0,0 +1,116 @@
+"""Columnar construction of compact dataframes of journey documents."""
+
+from argparse import ArgumentParser
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+
+from database import get_database, get_journeys_cursor
+from metrics import timed
+
+DEFAULT_BATCH_SIZE = 10000
+
+# Each column's path in a journey document and its dtype in the dataframe.
+JOURNEY_COLUMNS = {
+    '_id': (('_id',), object),
+    'user_id': (('user_id',), 'category'),
+    'submitted_at': (('submitted_at',), 'datetime64[ns]'),
+    'transport': (('transport', 'type'), 'category'),
+    'car_size': (('transport', 'car_size'), 'category'),
+    'car_type': (('transport', 'car_type'), 'category'),
+    'cabin_class': (('transport', 'cabin_class'), 'category'),
+    'origin_name': (('origin', 'name'), 'category'),
+    'origin_lat': (('origin', 'lat'), np.float32),
+    'origin_lon': (('origin', 'lon'), np.float32),
+    'dest_name': (('destination', 'name'), 'category'),
+    'dest_lat': (('destination', 'lat'), np.float32),
+    'dest_lon': (('destination', 'lon'), np.float32),
+    'distance': (('distance',), np.float32),
+    'total': (('co2e', 'total'), np.float32),
+    'direct': (('co2e', 'direct'), np.float32),
+    'indirect': (('co2e', 'indirect'), np.float32)
+}
+
+
+def get_batch_columns(journeys: list) -> dict:
+    """Returns a batch of journeys as one typed array per column, missing fields empty."""
+
+    # Each nested document is looked up once per journey rather than once per column.
+    documents = {(): journeys}
+
+    for path, _ in JOURNEY_COLUMNS.values():
+        for depth in range(1, len(path)):
+            if path[:depth] not in documents:
+                documents[path[:depth]] = [d.get(path[depth - 1]) or {}
+                                           for d in documents[path[:depth - 1]]]
+
+    columns = dict()
+
+    for column, (path, dtype) in JOURNEY_COLUMNS.items():
+
+        values = [d.get(path[-1]) for d in documents[path[:-1]]]
+
+        if dtype == 'datetime64[ns]':
+            columns[column] = pd.to_datetime(values).to_numpy(dtype=dtype)
+        else:
+            # Categories are built once every batch is read, so are held as objects until then.
+            columns[column] = np.array(values, dtype=object if dtype == 'category' else dtype)
+
+    return columns
+
+
+@timed('pandas')
+def build_journeys_df(journeys, batch_size: int = DEFAULT_BATCH_SIZE) -> pd.DataFrame:
+    """
+    Returns a dataframe with a typed column per journey field, reading journeys
+    from a list or Mongo cursor a batch at a time so that only one batch is
+    ever held as Python objects.
+    """
+
+    journeys = iter(journeys)
+    batches = []
+
+    while batch := list(islice(journeys, batch_size)):
+        batches.append(get_batch_columns(batch))
+
+    if not batches:
+        batches.append(get_batch_columns([]))
+
+    data = dict()
+
+    for column, (_, dtype) in JOURNEY_COLUMNS.items():
+
+        values = np.concatenate([b[column] for b in batches])
+
+        data[column] = pd.Categorical(values) if dtype == 'category' else values
+
+    return pd.DataFrame(data, copy=False)
+
+
+def get_memory_usage(journeys_df: pd.DataFrame) -> int:
+    """Returns the bytes used by a dataframe, including the objects it references."""
+
+    return int(journeys_df.memory_usage(deep=True).sum())
+
+
+if __name__ == "__main__":
+
+    parser = ArgumentParser(
+        description="Build a user's journeys dataframe and report its memory use.")
+    parser.add_argument("--username", required=True)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    db = get_database()
+
+    user = db['users'].find_one({"username": args.username})
+
+    if not user:
+        raise SystemExit(f"No user named {args.username}")
+
+    df = build_journeys_df(get_journeys_cursor(
+        db['journeys'], user['_id'], args.batch_size), args.batch_size)
+
+    print(f"{len(df)} journeys: {get_memory_usage(df.astype(object)) / 1e6:.2f} MB as objects, "
+          f"{get_memory_usage(df) / 1e6:.2f} MB typed")
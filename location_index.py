@@ -0,0 +1,116 @@
+"""Array-backed indexes for looking up station and airport locations."""
+
+import numpy as np
+import pandas as pd
+
+AIRPORT_TYPE_RANKS = {'large_airport': 0, 'medium_airport': 1, 'small_airport': 2,
+                      'seaplane_base': 3, 'heliport': 4, 'balloonport': 5, 'closed': 6}
+
+
+class LocationIndex:
+    """
+    Maps location names and codes to rows of contiguous coordinate arrays.
+    When a name or code appears more than once, the first row wins.
+    """
+
+    def __init__(self, names: list, lats: list, longs: list, codes: list,
+                 code_key: str, kind: str = "location"):
+
+        self.names = np.asarray(names, dtype=object)
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.longs = np.asarray(longs, dtype=np.float64)
+        self.codes = np.asarray(codes, dtype=object)
+        self.code_key = code_key
+        self.kind = kind
+
+        self._name_rows = dict()
+        self._code_rows = dict()
+
+        for row, (name, code) in enumerate(zip(self.names, self.codes)):
+            self._name_rows.setdefault(name, row)
+            if isinstance(code, str) and code:
+                self._code_rows.setdefault(code.upper(), row)
+
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame, name_col: str, lat_col: str, long_col: str,
+                       code_col: str, code_key: str, kind: str = "location") -> "LocationIndex":
+        """Builds an index from the columns of a dataframe."""
+
+        return cls(df[name_col].to_numpy(), df[lat_col].to_numpy(), df[long_col].to_numpy(),
+                   df[code_col].to_numpy(), code_key, kind)
+
+    def __len__(self) -> int:
+
+        return len(self.names)
+
+    def __contains__(self, name: str) -> bool:
+
+        return name in self._name_rows
+
+    def get_row(self, name: str) -> int:
+        """Returns the array row of the given name."""
+
+        try:
+            return self._name_rows[name]
+        except KeyError:
+            raise ValueError(f"Unknown {self.kind}: {name}") from None
+
+    def get_code_row(self, code: str) -> int:
+        """Returns the array row of the given code."""
+
+        try:
+            return self._code_rows[code.upper()]
+        except (KeyError, AttributeError):
+            raise ValueError(
+                f"Unknown {self.kind} code: {code}") from None
+
+    def get_location_at(self, row: int) -> dict:
+        """Returns the latitude, longitude and code of the given row."""
+
+        return {'lat': float(self.lats[row]), 'long': float(self.longs[row]),
+                self.code_key: self.codes[row]}
+
+    def get_location(self, name: str) -> dict:
+        """Returns the latitude, longitude and code of the given name."""
+
+        return self.get_location_at(self.get_row(name))
+
+    def get_location_by_code(self, code: str) -> dict:
+        """Returns the name, latitude, longitude and code of the given code."""
+
+        row = self.get_code_row(code)
+
+        return {'name': self.names[row]} | self.get_location_at(row)
+
+    def get_code_rows(self) -> np.ndarray:
+        """Returns the rows that codes map to, in row order."""
+
+        return np.sort(np.fromiter(self._code_rows.values(), dtype=np.intp))
+
+    def get_names(self) -> list:
+        """Returns every distinct name in the index in row order."""
+
+        return list(self._name_rows)
+
+
+def build_station_index(stations_df: pd.DataFrame) -> LocationIndex:
+    """Returns an index of railway stations by name and CRS code."""
+
+    return LocationIndex.from_dataframe(stations_df, 'stationName', 'lat', 'long',
+                                        'crsCode', code_key='crs', kind="station")
+
+
+def build_airport_index(airports_df: pd.DataFrame) -> LocationIndex:
+    """
+    Returns an index of airports by name and IATA code. Airports sharing a
+    name or code are ranked by size, then by their order in the file.
+    """
+
+    if 'type' in airports_df:
+        ranks = airports_df['type'].map(AIRPORT_TYPE_RANKS).fillna(
+            len(AIRPORT_TYPE_RANKS))
+        airports_df = airports_df.iloc[np.argsort(
+            ranks.to_numpy(), kind='stable')]
+
+    return LocationIndex.from_dataframe(airports_df, 'name', 'latitude_deg', 'longitude_deg',
+                                        'iata_code', code_key='iata', kind="airport")
@@ -0,0 +1,230 @@
+"""Timing of the dashboard's hot paths, exported as Prometheus text or JSON log lines."""
+
+from contextvars import ContextVar
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import logging
+import threading
+import time
+
+from config import METRICS_LOG_JSON
+
+METRIC_PREFIX = "greenroute"
+
+# Histogram bucket upper bounds in seconds, from a cache hit to a slow API call.
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+logger = logging.getLogger(__name__)
+
+# The timings of the current rerun, shared by reference with the threads it starts.
+_rerun_timings: ContextVar[list | None] = ContextVar('rerun_timings', default=None)
+
+
+class Histogram:
+    """Counts observations into cumulative buckets, with their sum and count."""
+
+    def __init__(self):
+
+        self.bucket_counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        """Adds an observation."""
+
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.bucket_counts[i] += 1
+
+        self.count += 1
+        self.sum += value
+
+
+class MetricsRegistry:
+    """Thread-safe operation durations and error counts, labelled by component and operation."""
+
+    def __init__(self):
+
+        self._lock = threading.Lock()
+        self._histograms = dict()
+        self._errors = dict()
+        self._gauges = dict()
+
+    def observe(self, component: str, operation: str, seconds: float, failed: bool = False) -> None:
+        """Records how long an operation took and whether it raised."""
+
+        key = (component, operation)
+
+        with self._lock:
+            self._histograms.setdefault(key, Histogram()).observe(seconds)
+            self._errors[key] = self._errors.get(key, 0) + failed
+
+    def snapshot(self) -> list:
+        """Returns the count, errors, total and mean seconds of every operation."""
+
+        with self._lock:
+            return [{'component': component, 'operation': operation,
+                     'count': h.count, 'errors': self._errors[(component, operation)],
+                     'total_seconds': round(h.sum, 6),
+                     'mean_seconds': round(h.sum / h.count, 6)}
+                    for (component, operation), h in sorted(self._histograms.items())]
+
+    def register_gauges(self, source: str, read) -> None:
+        """Adds gauges read from a function returning each gauge's value by name, when exported."""
+
+        with self._lock:
+            self._gauges[source] = read
+
+    def read_gauges(self) -> dict:
+        """Returns the current value of every registered gauge, by source and name."""
+
+        with self._lock:
+            sources = dict(self._gauges)
+
+        return {source: read() for source, read in sources.items()}
+
+    def to_prometheus(self) -> str:
+        """Returns every metric in the Prometheus text exposition format."""
+
+        name = f"{METRIC_PREFIX}_operation_seconds"
+        errors = f"{METRIC_PREFIX}_operation_errors_total"
+
+        lines = [f"# HELP {name} Duration of dashboard operations.",
+                 f"# TYPE {name} histogram"]
+
+        with self._lock:
+
+            for (component, operation), h in sorted(self._histograms.items()):
+                labels = f'component="{component}",operation="{operation}"'
+                for bound, count in zip(BUCKETS, h.bucket_counts):
+                    lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {h.count}')
+                lines.append(f"{name}_sum{{{labels}}} {h.sum}")
+                lines.append(f"{name}_count{{{labels}}} {h.count}")
+
+            lines += [f"# HELP {errors} Dashboard operations that raised an error.",
+                      f"# TYPE {errors} counter"]
+
+            for (component, operation), count in sorted(self._errors.items()):
+                lines.append(
+                    f'{errors}{{component="{component}",operation="{operation}"}} {count}')
+
+        for source, gauges in self.read_gauges().items():
+            for gauge, value in gauges.items():
+                lines += [f"# TYPE {METRIC_PREFIX}_{source}_{gauge} gauge",
+                          f"{METRIC_PREFIX}_{source}_{gauge} {value}"]
+
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+
+def start_rerun(timings: list = None) -> list:
+    """
+    Starts collecting the timings of a new rerun, optionally continuing a list
+    from its callbacks, returning the list they are added to.
+    """
+
+    timings = [] if timings is None else timings
+    _rerun_timings.set(timings)
+
+    return timings
+
+
+def get_rerun_timings() -> list:
+    """Returns the timings recorded so far in the current rerun."""
+
+    return list(_rerun_timings.get() or [])
+
+
+def record(component: str, operation: str, seconds: float, failed: bool = False) -> None:
+    """Records an operation's duration in the registry, the current rerun and the JSON log."""
+
+    REGISTRY.observe(component, operation, seconds, failed)
+
+    timings = _rerun_timings.get()
+
+    if timings is not None:
+        timings.append({'component': component, 'operation': operation,
+                        'ms': round(seconds * 1e3, 3), 'failed': failed})
+
+    if METRICS_LOG_JSON:
+        logger.info(json.dumps({'metric': f"{METRIC_PREFIX}_operation_seconds",
+                                'component': component, 'operation': operation,
+                                'seconds': round(seconds, 6), 'failed': failed}))
+
+
+class timed:  # pylint: disable=invalid-name
+    """
+    Times a block as a context manager, or every call of a function as a
+    decorator, in which case the operation defaults to the function's name.
+    """
+
+    def __init__(self, component: str, operation: str = None):
+
+        self.component = component
+        self.operation = operation
+        self._start = None
+
+    def __enter__(self):
+
+        self._start = time.perf_counter()
+
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+
+        record(self.component, self.operation, time.perf_counter() - self._start,
+               failed=exc_type is not None)
+
+    def __call__(self, func):
+
+        operation = self.operation or func.__name__
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed(self.component, operation):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """Serves the registry at /metrics in Prometheus format and at /metrics.json as JSON."""
+
+    def log_message(self, format, *args) -> None:  # pylint: disable=redefined-builtin
+        pass
+
+    def do_GET(self) -> None:  # pylint: disable=invalid-name
+        """Sends the metrics."""
+
+        if self.path == "/metrics.json":
+            body = json.dumps({'operations': REGISTRY.snapshot()} | REGISTRY.read_gauges())
+            content_type = "application/json"
+        elif self.path == "/metrics":
+            body, content_type = REGISTRY.to_prometheus(), "text/plain; version=0.0.4"
+        else:
+            self.send_error(404)
+            return
+
+        data = body.encode()
+
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def start_metrics_server(port: int) -> ThreadingHTTPServer:
+    """Serves the metrics for scraping from a background thread."""
+
+    server = ThreadingHTTPServer(("0.0.0.0", port), MetricsHandler)
+    server.daemon_threads = True
+
+    threading.Thread(target=server.serve_forever, daemon=True,
+                     name="metrics").start()
+
+    return server
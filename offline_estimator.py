@@ -0,0 +1,97 @@
+"""Local emissions estimates from bundled emission factors, for when Climatiq is unavailable."""
+
+from functools import cache
+
+import numpy as np
+import pandas as pd
+
+from config import get_airport_index
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Per passenger-km factors approximating the UK government conversion factors,
+# with an uplift on great-circle distance for the route not being a straight line.
+FACTORS_PATH = "./data/emission_factors.csv"
+
+
+@cache
+def get_factor_table() -> pd.DataFrame:
+    """Returns the bundled emission factors indexed by factor key."""
+
+    return pd.read_csv(FACTORS_PATH, index_col='key')
+
+
+def get_factor_key(payload: dict) -> str:
+    """Returns the emission factor key for a Climatiq travel payload."""
+
+    travel_mode = payload['travel_mode']
+
+    if travel_mode == 'car':
+        details = payload['car_details']
+        return f"car|{details['car_size']}|{details['car_type']}"
+
+    if travel_mode == 'air':
+        return f"air|{payload['air_details']['class']}"
+
+    return travel_mode
+
+
+def haversine(origin_lats: np.ndarray, origin_longs: np.ndarray,
+              dest_lats: np.ndarray, dest_longs: np.ndarray) -> np.ndarray:
+    """Returns the great-circle distances in km between arrays of coordinates."""
+
+    origin_lats, origin_longs, dest_lats, dest_longs = map(
+        np.radians, (origin_lats, origin_longs, dest_lats, dest_longs))
+
+    a = (np.sin((dest_lats - origin_lats) / 2) ** 2
+         + np.cos(origin_lats) * np.cos(dest_lats) * np.sin((dest_longs - origin_longs) / 2) ** 2)
+
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def estimate_emissions(factor_keys: np.ndarray, origin_lats: np.ndarray, origin_longs: np.ndarray,
+                       dest_lats: np.ndarray, dest_longs: np.ndarray) -> dict:
+    """
+    Returns arrays of distance, total, direct and indirect CO2e for arrays of
+    journeys, keyed the same way as get_carbon_data.
+    """
+
+    factors = get_factor_table()
+
+    rows = factors.index.get_indexer(np.asarray(factor_keys))
+
+    if (rows == -1).any():
+        unknown = np.asarray(factor_keys)[rows == -1][0]
+        raise ValueError(f"No emission factor for {unknown}")
+
+    distance = haversine(origin_lats, origin_longs, dest_lats,
+                         dest_longs) * factors['distance_uplift'].to_numpy()[rows]
+
+    direct = distance * factors['direct_kg_per_km'].to_numpy()[rows]
+    indirect = distance * factors['indirect_kg_per_km'].to_numpy()[rows]
+
+    return {'co2e': direct + indirect, 'direct_co2e': direct,
+            'indirect_co2e': indirect, 'distance': distance}
+
+
+def get_payload_coordinates(location: dict) -> tuple:
+    """Returns the latitude and longitude of a payload origin or destination."""
+
+    if 'iata' in location:
+        airport = get_airport_index().get_location_by_code(location['iata'])
+        return airport['lat'], airport['long']
+
+    return location['latitude'], location['longitude']
+
+
+def estimate_carbon_data(payload: dict) -> dict:
+    """Returns the same CO2e data as get_carbon_data without calling Climatiq."""
+
+    origin_lat, origin_long = get_payload_coordinates(payload['origin'])
+    dest_lat, dest_long = get_payload_coordinates(payload['destination'])
+
+    estimates = estimate_emissions(np.array([get_factor_key(payload)]),
+                                   np.array([origin_lat]), np.array([origin_long]),
+                                   np.array([dest_lat]), np.array([dest_long]))
+
+    return {k: round(float(v[0]), 3) for k, v in estimates.items()}
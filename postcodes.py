@@ -0,0 +1,137 @@
+"""Memoised and bulk postcode resolution using the postcodes.io API."""
+
+from collections import OrderedDict
+from functools import cache
+from os import environ
+import threading
+
+from http_client import http_get, http_post
+
+POSTCODE_BASE_URL = environ.get(
+    'POSTCODE_BASE_URL', "https://api.postcodes.io/postcodes")
+
+BULK_LIMIT = 100
+
+
+def normalise_postcode(postcode: str) -> str:
+    """Returns the postcode in upper case with all whitespace removed."""
+
+    return "".join(postcode.split()).upper()
+
+
+def get_location_from_result(result: dict) -> dict:
+    """Returns the name, latitude and longitude from a postcodes.io result."""
+
+    parish = result.get('parish')
+
+    if parish:
+
+        name = parish.split(",")[0] if "," in parish else parish
+    else:
+        name = result.get('admin_ward')
+
+    lat = result.get('latitude')
+    long = result.get('longitude')
+
+    return {'name': name, 'lat': lat, 'long': long}
+
+
+class PostcodeResolver:
+    """Validates and locates postcodes, remembering every answer it receives."""
+
+    def __init__(self, max_size: int = 4096):
+
+        self.max_size = max_size
+
+        self._lock = threading.Lock()
+        self._locations = OrderedDict()
+
+    def _remember(self, postcode: str, location: dict | None) -> None:
+        """Stores the location of a normalised postcode, None if it is invalid."""
+
+        with self._lock:
+            self._locations[postcode] = location
+            self._locations.move_to_end(postcode)
+
+            while len(self._locations) > self.max_size:
+                self._locations.popitem(last=False)
+
+    def _recall(self, postcode: str) -> tuple:
+        """Returns whether the normalised postcode is known and its location."""
+
+        with self._lock:
+            if postcode in self._locations:
+                self._locations.move_to_end(postcode)
+                return True, self._locations[postcode]
+
+        return False, None
+
+    def resolve(self, postcode: str) -> dict | None:
+        """Returns the location of the postcode, or None if it is invalid."""
+
+        postcode = normalise_postcode(postcode)
+
+        if not postcode.isalnum():
+            return None
+
+        known, location = self._recall(postcode)
+
+        if known:
+            return location
+
+        res = http_get(f"{POSTCODE_BASE_URL}/{postcode}", "postcodes")
+
+        if res.status_code == 200:
+            location = get_location_from_result(res.json()['result'])
+        elif res.status_code == 404:
+            location = None
+        else:
+            raise ConnectionError("Could not connect to the API.")
+
+        self._remember(postcode, location)
+
+        return location
+
+    def resolve_many(self, postcodes: list) -> dict:
+        """Returns a dictionary of each postcode to its location, using bulk lookups."""
+
+        normalised = {postcode: normalise_postcode(postcode)
+                      for postcode in postcodes}
+
+        locations = dict()
+        unknown = []
+
+        for postcode in dict.fromkeys(normalised.values()):
+            known, locations[postcode] = self._recall(postcode)
+            if not known and postcode.isalnum():
+                unknown.append(postcode)
+
+        for i in range(0, len(unknown), BULK_LIMIT):
+
+            res = http_post(POSTCODE_BASE_URL, "postcodes", json={
+                "postcodes": unknown[i:i + BULK_LIMIT]})
+
+            if res.status_code != 200:
+                raise ConnectionError("Could not connect to the API.")
+
+            for item in res.json()['result']:
+                result = item['result']
+                location = get_location_from_result(
+                    result) if result else None
+                locations[item['query']] = location
+                self._remember(item['query'], location)
+
+        return {postcode: locations.get(normalised[postcode])
+                for postcode in postcodes}
+
+    def is_valid(self, postcode: str) -> bool:
+        """Determines whether the given postcode is valid or not."""
+
+        return self.resolve(postcode) is not None
+
+
+@cache
+def get_postcode_resolver() -> PostcodeResolver:
+    """Returns the process-wide postcode resolver."""
+
+    return PostcodeResolver()
@@ -0,0 +1,96 @@
+"""Process-wide throttling and coalescing of calls to rate-limited APIs."""
+
+from concurrent.futures import Future
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    A thread-safe token bucket that refills at `rate` tokens a second up to
+    `capacity`, so bursts are allowed but the average rate is capped.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+        self._lock = threading.Lock()
+
+    def reserve(self, max_wait: float) -> float | None:
+        """
+        Takes a token, returning how long to wait before it can be used, or None
+        if that would be longer than max_wait, in which case none is taken.
+        """
+
+        with self._lock:
+
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+            # Tokens go negative as callers queue, each waiting for the one before.
+            wait = max(0.0, (1 - self.tokens) / self.rate)
+
+            if wait > max_wait:
+                return None
+
+            self.tokens -= 1
+
+        return wait
+
+    def acquire(self, max_wait: float) -> bool:
+        """Waits for a token, for at most max_wait seconds, returning whether one was taken."""
+
+        wait = self.reserve(max_wait)
+
+        if wait is None:
+            return False
+
+        time.sleep(wait)
+
+        return True
+
+
+class SingleFlight:
+    """Shares the result of a call between every caller that makes it with the same key at once."""
+
+    def __init__(self):
+
+        self._lock = threading.Lock()
+        self._calls = dict()
+        self.coalesced = 0
+
+    def do(self, key, func, *args):
+        """
+        Calls func(*args), unless a call with the same key is in flight, in which
+        case returns its result (or raises its exception) once it finishes.
+        """
+
+        with self._lock:
+
+            future = self._calls.get(key)
+            leader = future is None
+
+            if leader:
+                future = self._calls[key] = Future()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = func(*args)
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
@@ -0,0 +1,136 @@
+"""Concurrent estimates of a journey's emissions by every mode of transport, for comparison."""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import cache
+
+import numpy as np
+
+from async_extract import run_blocking, run_sync
+from config import COMPARISON_DEADLINE, get_airport_index, get_station_index
+from extract import get_car_carbon_data, get_carbon_rail_data, get_flight_carbon_data
+from http_client import request_deadline
+from location_index import LocationIndex
+from metrics import timed
+from offline_estimator import haversine
+
+# The cars every journey is compared with, by their size and type.
+COMPARISON_CARS = {'Small car': ('small', 'average'),
+                   'Medium car': ('medium', 'average'),
+                   'Large car': ('large', 'average'),
+                   'Electric car': ('average', 'battery')}
+
+COMPARISON_CABIN_CLASS = 'economy'
+
+# Flights are only compared when both ends are this close to an airport.
+MAX_AIRPORT_DISTANCE_KM = 75.0
+
+
+@cache
+def get_airport_rows(airport_index: LocationIndex) -> np.ndarray:
+    """Returns the rows of the airports that can be looked up by IATA code."""
+
+    return airport_index.get_code_rows()
+
+
+def get_nearest_airport(location: dict, airport_index: LocationIndex) -> dict | None:
+    """Returns the nearest airport with an IATA code to a location, or None if none are close."""
+
+    rows = get_airport_rows(airport_index)
+
+    distances = haversine(location['lat'], location['long'],
+                          airport_index.lats[rows], airport_index.longs[rows])
+
+    nearest = int(np.argmin(distances))
+
+    if distances[nearest] > MAX_AIRPORT_DISTANCE_KM:
+        return None
+
+    row = rows[nearest]
+
+    return {'name': airport_index.names[row]} | airport_index.get_location_at(row)
+
+
+def get_comparison_estimates(origin: dict, destination: dict, airport_index: LocationIndex) -> dict:
+    """
+    Returns the mode, function and arguments that estimate each compared way of
+    making a journey, by its label.
+    """
+
+    estimates = {'Train': ('rail', get_carbon_rail_data, (origin, destination))}
+
+    for label, (car_size, car_type) in COMPARISON_CARS.items():
+        estimates[label] = ('car', get_car_carbon_data,
+                            (origin, destination, {'car_size': car_size, 'car_type': car_type}))
+
+    origin_airport = get_nearest_airport(origin, airport_index)
+    dest_airport = get_nearest_airport(destination, airport_index)
+
+    if origin_airport and dest_airport and origin_airport['iata'] != dest_airport['iata']:
+        estimates['Flight'] = ('air', get_flight_carbon_data,
+                               (origin_airport, dest_airport, COMPARISON_CABIN_CLASS))
+
+    return estimates
+
+
+async def compare_routes_async(origin: dict, destination: dict, airport_index: LocationIndex,
+                               deadline: float = COMPARISON_DEADLINE) -> dict:
+    """
+    Estimates every way of making a journey at once, returning those that
+    finished within the deadline ranked by CO2e, and the labels of those that
+    did not or failed. Each comparison has a thread per estimate, so no other
+    comparison or submission can hold it up, and no estimate's requests or
+    rate-limit wait outlast the deadline.
+    """
+
+    estimates = get_comparison_estimates(origin, destination, airport_index)
+
+    executor = ThreadPoolExecutor(max_workers=len(estimates), thread_name_prefix="comparison")
+
+    try:
+        with request_deadline(deadline):
+            tasks = {asyncio.ensure_future(run_blocking(func, *args, executor=executor)):
+                     (label, mode) for label, (mode, func, args) in estimates.items()}
+
+        done, pending = await asyncio.wait(tasks, timeout=deadline)
+
+        for task in pending:
+            task.cancel()
+
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    options, missing = [], []
+
+    for task, (label, mode) in tasks.items():
+
+        if task in done and task.exception() is None:
+            carbon_data = task.result()
+            options.append({'label': label, 'mode': mode, 'co2e': carbon_data['co2e'],
+                            'distance': carbon_data['distance']})
+        else:
+            missing.append(label)
+
+    options.sort(key=lambda option: option['co2e'])
+
+    return {'options': options, 'missing': missing}
+
+
+def get_journey_location(journey: dict, end: str) -> dict:
+    """Returns the origin or destination of a stored journey, with the CRS code of a station."""
+
+    station_index = get_station_index()
+
+    if journey['transport']['type'] == 'rail' and journey[end]['name'] in station_index:
+        return station_index.get_location(journey[end]['name'])
+
+    return {'lat': journey[end]['lat'], 'long': journey[end]['lon']}
+
+
+@timed('extract')
+def compare_journey_routes(journey: dict, deadline: float = COMPARISON_DEADLINE) -> dict:
+    """Returns the ranked comparison of every way of making a stored journey."""
+
+    return run_sync(compare_routes_async(get_journey_location(journey, 'origin'),
+                                         get_journey_location(journey, 'destination'),
+                                         get_airport_index(), deadline))
@@ -0,0 +1,104 @@
+"""Prefix search over station and airport names and codes, for the journey forms."""
+
+from bisect import bisect_left
+import re
+
+import numpy as np
+
+from location_index import LocationIndex
+
+DEFAULT_LIMIT = 10
+
+# Match priorities, best first: the exact code, the start of the name,
+# the start of a later word in the name, then the start of a code.
+EXACT_CODE, NAME_PREFIX, WORD_PREFIX, CODE_PREFIX = range(4)
+
+
+def normalise_search(text: str) -> str:
+    """Returns text lowercased with punctuation and repeated spaces removed."""
+
+    return " ".join(re.sub(r"[^0-9a-z]+", " ", str(text).lower()).split())
+
+
+class SearchIndex:
+    """
+    A sorted array of search keys, being every word-start suffix of each name
+    and each code, so that a prefix query is two binary searches. Results are
+    ranked by match priority, then by the order of the names given.
+    """
+
+    def __init__(self, names: list, codes: list):
+
+        self.names = np.asarray(names, dtype=object)
+        self.codes = np.asarray(codes, dtype=object)
+
+        self._exact_codes = dict()
+        entries = []
+
+        for row, (name, code) in enumerate(zip(self.names, self.codes)):
+
+            words = normalise_search(name).split()
+
+            for start in range(len(words)):
+                entries.append((" ".join(words[start:]), row,
+                                NAME_PREFIX if start == 0 else WORD_PREFIX))
+
+            if isinstance(code, str) and code:
+                self._exact_codes.setdefault(normalise_search(code), row)
+                entries.append((normalise_search(code), row, CODE_PREFIX))
+
+        entries.sort()
+
+        self.keys = [key for key, _, _ in entries]
+        self.rows = np.fromiter((row for _, row, _ in entries), dtype=np.int32,
+                                count=len(entries))
+        self.priorities = np.fromiter((p for _, _, p in entries), dtype=np.int8,
+                                      count=len(entries))
+
+    @classmethod
+    def from_location_index(cls, index: LocationIndex) -> "SearchIndex":
+        """Builds a search index over the distinct names of a location index and their codes."""
+
+        names = index.get_names()
+
+        return cls(names, [index.codes[index.get_row(name)] for name in names])
+
+    def __len__(self) -> int:
+
+        return len(self.names)
+
+    def search_rows(self, query: str, limit: int = DEFAULT_LIMIT) -> np.ndarray:
+        """Returns the rows of the best matches for the query, best first."""
+
+        query = normalise_search(query)
+
+        if not query:
+            return np.empty(0, dtype=np.int32)
+
+        start = bisect_left(self.keys, query)
+        end = bisect_left(self.keys, query + "\x7f", lo=start)
+
+        rows = self.rows[start:end]
+        priorities = self.priorities[start:end]
+
+        if query in self._exact_codes:
+            rows = np.append(rows, self._exact_codes[query])
+            priorities = np.append(priorities, EXACT_CODE)
+
+        ranked = rows[np.lexsort((rows, priorities))]
+
+        _, first = np.unique(ranked, return_index=True)
+
+        return ranked[np.sort(first)][:limit]
+
+    def search(self, query: str, limit: int = DEFAULT_LIMIT) -> list:
+        """Returns (label, name) pairs of the best matches, labelled with their code."""
+
+        results = []
+
+        for row in self.search_rows(query, limit):
+            name, code = self.names[row], self.codes[row]
+            label = f"{name} ({code})" if isinstance(code, str) and code else name
+            results.append((label, name))
+
+        return results
@@ -0,0 +1,114 @@
+"""Background queue that submits journeys without blocking the dashboard's callbacks."""
+
+from concurrent.futures import ThreadPoolExecutor
+from functools import cache
+import threading
+import time
+from uuid import uuid4
+
+from config import SUBMISSION_JOB_TTL, SUBMISSION_QUEUE_SIZE, SUBMISSION_WORKERS
+
+PENDING_STATUSES = ('queued', 'running')
+
+
+class SubmissionWorker:
+    """
+    Runs submission jobs on a bounded thread pool, tracking the status of each
+    by id. At most max_pending jobs are queued or running at once, and any
+    more are refused so that a slow API backs up into an error, not a freeze.
+    """
+
+    def __init__(self, max_workers: int = 4, max_pending: int = 32, job_ttl: float = 600):
+
+        self.job_ttl = job_ttl
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix="submission")
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._jobs = dict()
+        self._futures = dict()
+
+    def submit(self, name: str, func, *args) -> str:
+        """
+        Queues func(*args), returning the id of its job, or raises a RuntimeError
+        if the queue is full.
+        """
+
+        if not self._slots.acquire(blocking=False):  # pylint: disable=consider-using-with
+            raise RuntimeError("Too many journeys are being submitted, please try again shortly.")
+
+        job_id = uuid4().hex
+
+        with self._lock:
+            self._prune()
+            self._jobs[job_id] = {'id': job_id, 'name': name, 'status': 'queued',
+                                  'error': None, 'result': None,
+                                  'submitted_at': time.time(), 'finished_at': None}
+
+        try:
+            self._futures[job_id] = self._executor.submit(self._run, job_id, func, *args)
+        except RuntimeError:
+            self._slots.release()
+            raise
+
+        return job_id
+
+    def _run(self, job_id: str, func, *args) -> None:
+        """Runs a job, recording its result or error."""
+
+        self._update(job_id, status='running')
+
+        try:
+            result = func(*args)
+        except Exception as err:  # pylint: disable=broad-except
+            self._update(job_id, status='failed', error=str(err), finished_at=time.time())
+        else:
+            self._update(job_id, status='done', result=result, finished_at=time.time())
+        finally:
+            self._slots.release()
+
+    def _update(self, job_id: str, **fields) -> None:
+        """Updates the fields of a job."""
+
+        with self._lock:
+            self._jobs[job_id] = self._jobs[job_id] | fields
+
+    def _prune(self) -> None:
+        """Forgets jobs that finished more than job_ttl seconds ago."""
+
+        expired = time.time() - self.job_ttl
+
+        for job_id, job in list(self._jobs.items()):
+            if job['finished_at'] is not None and job['finished_at'] < expired:
+                del self._jobs[job_id]
+                self._futures.pop(job_id, None)
+
+    def get_status(self, job_id: str) -> dict | None:
+        """Returns a job's name, status, error and result, or None if it is unknown."""
+
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def get_pending_count(self) -> int:
+        """Returns the number of jobs that are queued or running."""
+
+        with self._lock:
+            return sum(j['status'] in PENDING_STATUSES for j in self._jobs.values())
+
+    def wait(self, job_id: str, timeout: float = None) -> dict | None:
+        """Waits for a job to finish, returning its status."""
+
+        future = self._futures.get(job_id)
+
+        if future is not None:
+            future.result(timeout)
+
+        return self.get_status(job_id)
+
+
+@cache
+def get_submission_worker() -> SubmissionWorker:
+    """Returns the process-wide submission worker shared by every session."""
+
+    return SubmissionWorker(SUBMISSION_WORKERS, SUBMISSION_QUEUE_SIZE, SUBMISSION_JOB_TTL)
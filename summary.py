@@ -0,0 +1,96 @@
+"""Per-transport summaries of a user's journeys, shared by the summary charts and metrics."""
+
+from dataclasses import dataclass, fields
+
+import numpy as np
+import pandas as pd
+
+TOTAL_FIELDS = ['total', 'direct', 'indirect', 'distance']
+
+
+@dataclass(frozen=True)
+class JourneySummary:  # pylint: disable=too-many-instance-attributes
+    """
+    Totals and averages of a user's journeys per transport, most used
+    transport first. Each field holds one value per transport.
+    """
+
+    transports: tuple = ()
+    journeys: tuple = ()
+    total: tuple = ()
+    direct: tuple = ()
+    indirect: tuple = ()
+    distance: tuple = ()
+    average: tuple = ()
+    average_km: tuple = ()
+
+    @property
+    def empty(self) -> bool:
+        """Whether the user has no journeys."""
+
+        return not self.transports
+
+    @property
+    def labels(self) -> tuple:
+        """The display label of each transport."""
+
+        return tuple(t.capitalize() for t in self.transports)
+
+    @property
+    def num_journeys(self) -> int:
+        """The number of journeys of every transport."""
+
+        return sum(self.journeys)
+
+    @property
+    def total_co2e(self) -> float:
+        """The CO2e of every journey in kg."""
+
+        return sum(self.total)
+
+    @property
+    def most_popular(self) -> tuple:
+        """The transports used for the most journeys."""
+
+        return tuple(t for t, n in zip(self.transports, self.journeys)
+                     if n == max(self.journeys))
+
+    def to_frame(self) -> pd.DataFrame:
+        """Returns the summary as a dataframe with one row per transport."""
+
+        return pd.DataFrame({f.name: list(getattr(self, f.name)) for f in fields(self)})
+
+
+def get_summary(transports, journeys, totals: dict) -> JourneySummary:
+    """
+    Returns the summary of per-transport journey counts and totals, given as
+    arrays keyed by TOTAL_FIELDS, deriving the averages.
+    """
+
+    journeys = np.asarray(journeys, dtype=np.int64)
+    total = np.asarray(totals['total'], dtype=np.float64)
+    distance = np.asarray(totals['distance'], dtype=np.float64)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        average = total / journeys
+        average_km = np.where(distance > 0, total / distance, np.nan)
+
+    order = np.lexsort((np.asarray(transports, dtype=object), -journeys))
+
+    def ordered(values, kind=float) -> tuple:
+        return tuple(kind(v) for v in np.asarray(values)[order])
+
+    return JourneySummary(transports=ordered(transports, str), journeys=ordered(journeys, int),
+                          total=ordered(total), direct=ordered(totals['direct']),
+                          indirect=ordered(totals['indirect']), distance=ordered(distance),
+                          average=ordered(average), average_km=ordered(average_km))
+
+
+def summarise_totals(transport_totals: list) -> JourneySummary:
+    """Returns the summary of per-transport totals, such as a user's rollup or an aggregation."""
+
+    transport_totals = [t for t in transport_totals if t['journeys'] > 0]
+
+    return get_summary([t['transport'] for t in transport_totals],
+                       [t['journeys'] for t in transport_totals],
+                       {f: [t[f] for t in transport_totals] for f in TOTAL_FIELDS})
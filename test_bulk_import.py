@@ -0,0 +1,122 @@
+"""Unit tests for the bulk journey importer."""
+
+import json
+
+from bson import ObjectId
+import mongomock
+
+import bulk_import
+from bulk_import import import_journeys
+
+CO2E_DATA = {'co2e': 1.5, 'direct_co2e': 1.2,
+             'indirect_co2e': 0.3, 'distance': 10.0}
+
+RECORDS = [
+    {'transport': 'rail', 'origin': "Aber", 'destination': "York",
+     'submitted_at': "2023-01-05T08:30:00"},
+    {'transport': 'rail', 'origin': "Aber", 'destination': "York",
+     'submitted_at': "2023-01-06T08:30:00"},
+    {'transport': 'rail', 'origin': "Atlantis", 'destination': "York"},
+    {'transport': 'rail', 'origin': "York", 'destination': "Aber"}
+]
+
+
+def write_history(tmp_path) -> str:
+    """Writes the records as a JSONL file, returning its path."""
+
+    source = tmp_path / "history.jsonl"
+    source.write_text("\n".join(json.dumps(r) for r in RECORDS))
+
+    return str(source)
+
+
+def test_import_journeys(tmp_path, monkeypatch):
+    """Tests that valid records are inserted and identical routes estimated once."""
+
+    payloads = []
+    monkeypatch.setattr(bulk_import, "get_carbon_data",
+                        lambda p: payloads.append(p) or CO2E_DATA)
+
+    journeys = mongomock.MongoClient().db.journeys
+    user_id = ObjectId()
+    failed = []
+
+    totals = import_journeys(write_history(tmp_path), user_id, journeys, chunk_size=3,
+                             on_error=lambda n, err: failed.append(n))
+
+    assert totals == {'records': 4, 'inserted': 3,
+                      'duplicates': 0, 'failed': 1}
+    assert failed == [2]
+    assert len(payloads) == 2
+    assert journeys.count_documents({'user_id': user_id}) == 3
+    assert journeys.find_one({'co2e.total': 1.5})['origin']['name'] == "Aber"
+
+
+def test_import_journeys_resumes_from_checkpoint(tmp_path, monkeypatch):
+    """Tests that a resumed or repeated import does not duplicate journeys."""
+
+    monkeypatch.setattr(bulk_import, "get_carbon_data", lambda p: CO2E_DATA)
+
+    journeys = mongomock.MongoClient().db.journeys
+    user_id = ObjectId()
+    source = write_history(tmp_path)
+    checkpoint = str(tmp_path / "import.checkpoint")
+
+    import_journeys(source, user_id, journeys, checkpoint=checkpoint)
+    resumed = import_journeys(source, user_id, journeys, checkpoint=checkpoint)
+    repeated = import_journeys(source, user_id, journeys)
+
+    assert resumed['inserted'] == 0
+    assert repeated['duplicates'] == 3
+    assert journeys.count_documents({}) == 3
+
+
+def test_import_journeys_reports_malformed_records(tmp_path, monkeypatch):
+    """Tests that records missing fields or with a bad time fail without stopping the import."""
+
+    monkeypatch.setattr(bulk_import, "get_carbon_data", lambda p: CO2E_DATA)
+
+    source = tmp_path / "history.jsonl"
+    source.write_text("\n".join(json.dumps(r) for r in [
+        {'origin': "Aber", 'destination': "York"},
+        {'transport': 'air', 'origin': "Heathrow", 'cabin_class': 'economy'},
+        {'transport': 'rail', 'origin': "Aber", 'destination': "York",
+         'submitted_at': "last Tuesday"},
+        RECORDS[0]
+    ]))
+
+    journeys = mongomock.MongoClient().db.journeys
+    failed = []
+
+    totals = import_journeys(str(source), ObjectId(), journeys,
+                             on_error=lambda n, err: failed.append(n))
+
+    assert totals['inserted'] == 1
+    assert totals['failed'] == 3
+    assert failed == [0, 1, 2]
+
+
+def test_import_journeys_without_postcodes_io(tmp_path, monkeypatch):
+    """Tests that car records fail, and others are still imported, if postcodes cannot resolve."""
+
+    def resolve_postcodes(postcodes):
+        raise ConnectionError("Could not connect to the API.")
+
+    monkeypatch.setattr(bulk_import, "get_carbon_data", lambda p: CO2E_DATA)
+    monkeypatch.setattr(bulk_import, "resolve_postcodes", resolve_postcodes)
+
+    source = tmp_path / "history.jsonl"
+    source.write_text("\n".join(json.dumps(r) for r in [
+        {'transport': 'car', 'origin': "SW1A 1AA", 'destination': "EH1 1YZ",
+         'car_size': 'small', 'car_type': 'petrol'},
+        RECORDS[0]
+    ]))
+
+    journeys = mongomock.MongoClient().db.journeys
+    failed = []
+
+    totals = import_journeys(str(source), ObjectId(), journeys,
+                             on_error=lambda n, err: failed.append((n, type(err))))
+
+    assert totals['inserted'] == 1
+    assert failed == [(0, ConnectionError)]
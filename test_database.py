@@ -0,0 +1,199 @@
+"""Unit tests for the dashboard's MongoDB queries."""
+
+from datetime import datetime
+
+from bson import ObjectId
+import mongomock
+import pymongo
+import pytest
+
+from database import (
+    PoolMetrics,
+    delete_user_journey,
+    ensure_indexes,
+    get_journey_page,
+    get_plan_stages,
+    get_stats_collection,
+    get_user_summary,
+    insert_journey,
+    insert_journeys,
+    reconcile_user_stats
+)
+
+
+def make_journey(user_id: ObjectId, transport: str, total: float, distance: float) -> dict:
+    """Returns a journey document as stored by the dashboard."""
+
+    return {'user_id': user_id, 'transport': {'type': transport},
+            'co2e': {'total': total, 'direct': total * 0.8, 'indirect': total * 0.2},
+            'distance': distance, 'submitted_at': datetime.now()}
+
+
+@pytest.fixture
+def journey_collection():
+    """Returns an in-memory journeys collection."""
+
+    return mongomock.MongoClient().db.journeys
+
+
+def test_get_user_summary(journey_collection):
+    """Tests that journeys are totalled and averaged per transport."""
+
+    user_id = ObjectId()
+
+    journey_collection.insert_many([
+        make_journey(user_id, 'rail', 2.0, 50.0),
+        make_journey(user_id, 'rail', 4.0, 50.0),
+        make_journey(user_id, 'car', 10.0, 40.0),
+        make_journey(ObjectId(), 'air', 100.0, 500.0)
+    ])
+
+    summary = get_user_summary(journey_collection, user_id)
+
+    assert summary.transports == ('rail', 'car')
+    assert summary.journeys == (2, 1)
+    assert summary.total == (6.0, 10.0)
+    assert summary.average == (3.0, 10.0)
+    assert summary.average_km == (0.06, 0.25)
+
+
+def test_get_user_summary_without_journeys(journey_collection):
+    """Tests that a user without journeys gets an empty summary."""
+
+    summary = get_user_summary(journey_collection, ObjectId())
+
+    assert summary.empty
+    assert 'average_km' in summary.to_frame()
+
+
+def test_get_journey_page(journey_collection):
+    """Tests that pages follow on from their cursor, even between journeys submitted together."""
+
+    user_id = ObjectId()
+    submitted_at = datetime(2023, 1, 1)
+
+    journey_collection.insert_many(
+        [make_journey(user_id, 'rail', 1.0, 1.0) | {'submitted_at': submitted_at}
+         for _ in range(5)])
+
+    first_page, after = get_journey_page(journey_collection, user_id, limit=3)
+    last_page, end = get_journey_page(
+        journey_collection, user_id, after=after, limit=3)
+
+    ids = [j['_id'] for j in first_page + last_page]
+
+    assert len(set(ids)) == 5 and end is None
+    assert ids == sorted(ids, reverse=True)
+    assert 'co2e' not in first_page[0]
+
+
+def test_get_journey_page_search(journey_collection):
+    """Tests that only journeys with a matching origin or destination are returned."""
+
+    user_id = ObjectId()
+
+    journey_collection.insert_many([
+        make_journey(user_id, 'rail', 1.0, 1.0) | {
+            'origin': {'name': "York"}, 'destination': {'name': "Leeds"}},
+        make_journey(user_id, 'rail', 1.0, 1.0) | {
+            'origin': {'name': "Bath Spa"}, 'destination': {'name': "Bristol (A+B)"}}
+    ])
+
+    journeys, _ = get_journey_page(journey_collection, user_id, search="(a+b")
+
+    assert [j['origin']['name'] for j in journeys] == ["Bath Spa"]
+
+
+def test_user_summary_is_maintained_incrementally(journey_collection):
+    """Tests that inserts and deletes keep the rollup equal to the aggregated summary."""
+
+    user_id = ObjectId()
+
+    insert_journey(journey_collection, make_journey(user_id, 'rail', 2.0, 50.0))
+    insert_journey(journey_collection, make_journey(user_id, 'car', 10.0, 40.0))
+    inserted, duplicates = insert_journeys(journey_collection, [
+        make_journey(user_id, 'rail', 4.0, 50.0),
+        make_journey(user_id, 'air', 100.0, 500.0)
+    ])
+    delete_user_journey(journey_collection, {'transport.type': 'air'})
+
+    summary = get_user_summary(journey_collection, user_id)
+    reconcile_user_stats(journey_collection, user_id)
+
+    assert (inserted, duplicates) == (2, 0)
+    assert summary.transports == ('rail', 'car')
+    assert summary == get_user_summary(journey_collection, user_id)
+
+
+def test_first_rollup_includes_existing_journeys(journey_collection):
+    """Tests that a user's first rollup counts the journeys stored before it existed."""
+
+    user_id = ObjectId()
+
+    journey_collection.insert_many([make_journey(user_id, 'rail', 2.0, 50.0)
+                                    for _ in range(3)])
+
+    insert_journey(journey_collection, make_journey(user_id, 'car', 10.0, 40.0))
+
+    summary = get_user_summary(journey_collection, user_id)
+    reconcile_user_stats(journey_collection, user_id)
+
+    assert summary.num_journeys == 4
+    assert summary == get_user_summary(journey_collection, user_id)
+
+
+def test_reconcile_user_stats(journey_collection):
+    """Tests that rollups are rebuilt from the journeys, correcting drift."""
+
+    user_id = ObjectId()
+
+    journey_collection.insert_many([make_journey(user_id, 'rail', 2.0, 50.0),
+                                    make_journey(ObjectId(), 'car', 10.0, 40.0)])
+    get_stats_collection(journey_collection).insert_one(
+        {'_id': user_id, 'journeys': 7})
+
+    assert reconcile_user_stats(journey_collection) == 2
+    assert get_stats_collection(journey_collection).find_one(
+        {'_id': user_id})['journeys'] == 1
+    assert get_user_summary(journey_collection, ObjectId()).empty
+
+
+def test_ensure_indexes_is_idempotent():
+    """Tests that indexes can be provisioned repeatedly and usernames are unique."""
+
+    db = mongomock.MongoClient().eco_travel
+
+    assert ensure_indexes(db) == ensure_indexes(db)
+
+    db.users.insert_one({'username': "zander"})
+
+    with pytest.raises(pymongo.errors.DuplicateKeyError):
+        db.users.insert_one({'username': "zander"})
+
+
+def test_get_plan_stages():
+    """Tests that nested stages are found in a winning plan."""
+
+    plan = {'stage': 'FETCH', 'inputStage': {
+        'stage': 'IXSCAN', 'indexName': 'user_id_submitted_at_id'}}
+
+    assert get_plan_stages(plan) == ['FETCH', 'IXSCAN']
+
+
+def test_pool_metrics():
+    """Tests that checkouts and wait times are counted from pool events."""
+
+    class Event:
+        """A stand-in for a pymongo connection pool event."""
+        duration = 0.002
+
+    pool_metrics = PoolMetrics()
+
+    pool_metrics.connection_created(Event())
+    pool_metrics.connection_checked_out(Event())
+    pool_metrics.connection_checked_out(Event())
+    pool_metrics.connection_checked_in(Event())
+
+    assert pool_metrics.snapshot() == {'open_connections': 1, 'checked_out': 1, 'checkouts': 2,
+                                       'checkout_failures': 0, 'mean_wait_ms': 2.0,
+                                       'max_wait_ms': 2.0}
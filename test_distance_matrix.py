@@ -0,0 +1,87 @@
+"""Unit tests for the station distance matrix."""
+
+from concurrent.futures import ThreadPoolExecutor
+import os
+import time
+
+import numpy as np
+import pytest
+
+import distance_matrix
+from distance_matrix import load_distance_matrix
+from location_index import LocationIndex
+from offline_estimator import haversine
+
+STATION_INDEX = LocationIndex(["Bristol Temple Meads", "Bath Spa", "London Paddington"],
+                              [51.449142, 51.377781, 51.516454],
+                              [-2.581315, -2.356936, -0.176865],
+                              ["BRI", "BTH", "PAD"], code_key='crs', kind="station")
+
+
+@pytest.fixture
+def stations_path(tmp_path):
+    """Returns a stations file for the matrix to be compared with."""
+
+    path = tmp_path / "stations.csv"
+    path.write_text("stationName,lat,long,crsCode\n")
+
+    return str(path)
+
+
+def test_load_distance_matrix(tmp_path, stations_path):
+    """Tests that distances are looked up by name or CRS code and match the haversine formula."""
+
+    matrix = load_distance_matrix(STATION_INDEX, str(tmp_path / "distances.npy"), stations_path)
+
+    expected = haversine(51.449142, -2.581315, 51.516454, -0.176865)
+
+    assert matrix.distances.dtype == np.float32
+    assert isinstance(matrix.distances, np.memmap)
+    assert matrix.get_distance("Bristol Temple Meads", "PAD") == pytest.approx(expected, rel=1e-6)
+    assert matrix.get_distance("pad", "BRI") == matrix.get_distance("PAD", "BRI")
+    assert matrix.get_distance("BTH", "Bath Spa") == 0
+    assert matrix.get_distances(["BRI", "BTH"], ["BTH", "BRI"]).tolist() == [
+        matrix.get_distance("BRI", "BTH")] * 2
+
+    with pytest.raises(ValueError):
+        matrix.get_distance("Atlantis", "BRI")
+
+
+def test_load_distance_matrix_rebuilds_when_stale(tmp_path, stations_path):
+    """Tests that a matrix is rebuilt when the stations change or it has the wrong size."""
+
+    matrix_path = str(tmp_path / "distances.npy")
+
+    np.save(matrix_path, np.zeros((2, 2), dtype=np.float32))
+
+    assert load_distance_matrix(STATION_INDEX, matrix_path, stations_path).get_distance(
+        "BRI", "BTH") > 0
+
+    np.save(matrix_path, np.zeros((3, 3), dtype=np.float32))
+    os.utime(stations_path, (os.path.getmtime(matrix_path) + 10,) * 2)
+
+    assert load_distance_matrix(STATION_INDEX, matrix_path, stations_path).get_distance(
+        "BRI", "BTH") > 0
+
+
+def test_concurrent_loads_build_the_matrix_once(tmp_path, stations_path, monkeypatch):
+    """Tests that threads loading a missing matrix at once build it once, with no files left over."""
+
+    matrix_path = str(tmp_path / "distances.npy")
+    builds = []
+    build = distance_matrix.build_distance_matrix
+
+    def slow_build(*args):
+        builds.append(args)
+        time.sleep(0.1)
+        build(*args)
+
+    monkeypatch.setattr(distance_matrix, "build_distance_matrix", slow_build)
+
+    with ThreadPoolExecutor(8) as executor:
+        matrices = list(executor.map(
+            lambda _: load_distance_matrix(STATION_INDEX, matrix_path, stations_path), range(8)))
+
+    assert len(builds) == 1
+    assert all(m.get_distance("BRI", "PAD") > 0 for m in matrices)
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["distances.npy", "stations.csv"]
@@ -0,0 +1,79 @@
+"""Unit tests for the emissions cache."""
+
+from emissions_cache import EmissionsCache, get_cache_key
+
+RAIL_PAYLOAD = {
+    "travel_mode": "rail",
+    "origin": {"latitude": 51.449142, "longitude": -2.581315, "country": "GB"},
+    "destination": {"latitude": 51.504728, "longitude": -2.563034, "country": "GB"}
+}
+
+CO2E_DATA = {'co2e': 0.5, 'direct_co2e': 0.4,
+             'indirect_co2e': 0.1, 'distance': 7.2}
+
+
+def test_get_cache_key_rounds_coordinates():
+    """Tests that nearby coordinates share a cache key."""
+
+    nearby = RAIL_PAYLOAD | {
+        "origin": {"latitude": 51.4491, "longitude": -2.5813, "country": "GB"}}
+
+    assert get_cache_key(RAIL_PAYLOAD) == get_cache_key(nearby)
+
+
+def test_get_cache_key_includes_details():
+    """Tests that cabin classes and IATA codes are part of the key."""
+
+    flight = {"travel_mode": "air", "origin": {"iata": "lhr"},
+              "destination": {"iata": "EDI"}, "air_details": {"class": "economy"}}
+
+    assert get_cache_key(flight) == "air|LHR|EDI|class=economy"
+
+
+def test_cache_hits_and_misses():
+    """Tests that the hit and miss counters are updated."""
+
+    emissions_cache = EmissionsCache()
+
+    assert emissions_cache.get("key") is None
+
+    emissions_cache.set("key", CO2E_DATA)
+
+    assert emissions_cache.get("key") == CO2E_DATA
+    assert emissions_cache.stats()['hits'] == 1
+    assert emissions_cache.stats()['misses'] == 1
+
+
+def test_cache_evicts_least_recently_used():
+    """Tests that the least recently used entry is evicted when full."""
+
+    emissions_cache = EmissionsCache(max_size=2)
+
+    emissions_cache.set("a", CO2E_DATA)
+    emissions_cache.set("b", CO2E_DATA)
+    emissions_cache.get("a")
+    emissions_cache.set("c", CO2E_DATA)
+
+    assert emissions_cache.get("b") is None
+    assert emissions_cache.get("a") == CO2E_DATA
+    assert emissions_cache.stats()['size'] == 2
+
+
+def test_cache_expires_entries():
+    """Tests that entries older than the TTL are not returned."""
+
+    emissions_cache = EmissionsCache(ttl=-1)
+
+    emissions_cache.set("key", CO2E_DATA)
+
+    assert emissions_cache.get("key") is None
+
+
+def test_cache_persists_to_disk(tmp_path):
+    """Tests that entries survive a new cache instance on the same file."""
+
+    path = str(tmp_path / "emissions.db")
+
+    EmissionsCache(path).set("key", CO2E_DATA)
+
+    assert EmissionsCache(path).get("key") == CO2E_DATA
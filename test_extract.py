@@ -1,15 +1,185 @@
 """Unit tests for the extract script."""
 
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+
 import pandas as pd
+import pytest
+
+import async_extract
+from async_extract import get_car_db_data_async, gather_db_data_async, run_blocking, run_sync
+from emissions_cache import EmissionsCache
+import extract
+from extract import get_airport_location, get_carbon_data, get_max_wait, get_rail_location
+from http_client import get_remaining_time, request_deadline
+from location_index import build_airport_index, build_station_index
+from rate_limit import TokenBucket
 
-from extract import get_airport_location
+CO2E_DATA = {'co2e': 1.5, 'direct_co2e': 1.2,
+             'indirect_co2e': 0.3, 'distance': 10.0}
 
 
 def test_get_airport_location():
     """Tests that the correct airport location is returned."""
 
-    airports_df = pd.read_csv("./data/airports.csv")
+    airport_index = build_airport_index(pd.read_csv("./data/airports.csv"))
 
-    location = get_airport_location("Aksu Hongqipo Airport", airports_df)
+    location = get_airport_location("Aksu Hongqipo Airport", airport_index)
 
     assert location == {'lat': 41.262501, 'long': 80.291702, 'iata': "AKU"}
+
+
+def test_build_airport_index_prefers_larger_airports():
+    """Tests that duplicate airport names resolve to the larger airport."""
+
+    airports_df = pd.DataFrame([
+        {'name': "Springfield Airport", 'type': 'small_airport',
+         'latitude_deg': 39.0, 'longitude_deg': -90.0, 'iata_code': "SPX"},
+        {'name': "Springfield Airport", 'type': 'medium_airport',
+         'latitude_deg': 37.2, 'longitude_deg': -93.4, 'iata_code': "SGF"}])
+
+    airport_index = build_airport_index(airports_df)
+
+    assert get_airport_location("Springfield Airport", airport_index)[
+        'iata'] == "SGF"
+    assert airport_index.get_location_by_code("SPX")['lat'] == 39.0
+    assert airport_index.get_names() == ["Springfield Airport"]
+
+
+def test_get_rail_location():
+    """Tests that a station is located by name and by CRS code."""
+
+    station_index = build_station_index(pd.read_csv("./data/stations.csv"))
+
+    assert get_rail_location("Aber", station_index) == {
+        'lat': 51.575363, 'long': -3.23089, 'crs': "ABE"}
+    assert station_index.get_location_by_code("abe")['name'] == "Aber"
+
+
+def test_get_rail_location_unknown_station():
+    """Tests that an unknown station raises a clear error."""
+
+    station_index = build_station_index(pd.read_csv("./data/stations.csv"))
+
+    with pytest.raises(ValueError, match="Unknown station: Atlantis"):
+        get_rail_location("Atlantis", station_index)
+
+
+def test_get_car_db_data_async_locates_both_postcodes_at_once(monkeypatch):
+    """Tests that both postcodes are located with a single bulk lookup."""
+
+    lookups = []
+
+    def resolve_postcodes(postcodes):
+        lookups.append(postcodes)
+        return {postcode: {'name': postcode, 'lat': 51.0, 'long': -2.0} for postcode in postcodes}
+
+    monkeypatch.setattr(async_extract, "resolve_postcodes", resolve_postcodes)
+    monkeypatch.setattr(async_extract, "get_car_carbon_data",
+                        lambda origin, dest, details: CO2E_DATA)
+
+    journey = run_sync(get_car_db_data_async(
+        "BS1 1AA", "BS2 2BB", {'car_size': 'small', 'car_type': 'petrol'}))
+
+    assert lookups == [["BS1 1AA", "BS2 2BB"]]
+    assert journey['origin'] == {'name': "BS1 1AA", 'lat': 51.0, 'lon': -2.0}
+    assert journey['co2e'] == {'total': 1.5, 'direct': 1.2, 'indirect': 0.3}
+    assert journey['distance'] == 10.0
+
+
+def test_gather_db_data_async_runs_journeys_concurrently():
+    """Tests that journeys are extracted at the same time, as each waits for the other."""
+
+    barrier = threading.Barrier(2, timeout=1)
+
+    results = run_sync(gather_db_data_async(
+        [run_blocking(barrier.wait) for _ in range(2)]))
+
+    assert sorted(results) == [0, 1]
+
+
+def test_get_carbon_data_coalesces_identical_requests(monkeypatch):
+    """Tests that identical payloads requested at once make one Climatiq call and are cached."""
+
+    emissions_cache = EmissionsCache()
+    started = threading.Event()
+    calls = []
+
+    def slow_request(payload):
+        calls.append(payload)
+        started.set()
+        time.sleep(0.2)
+        return CO2E_DATA
+
+    monkeypatch.setattr(extract, "ESTIMATION_MODE", "climatiq")
+    monkeypatch.setattr(extract, "get_emissions_cache", lambda: emissions_cache)
+    monkeypatch.setattr(extract, "request_carbon_data", slow_request)
+
+    payload = {'travel_mode': 'air', 'origin': {'iata': 'LHR'},
+               'destination': {'iata': 'EDI'}, 'air_details': {'class': 'economy'}}
+
+    with ThreadPoolExecutor(4) as executor:
+        first = executor.submit(get_carbon_data, payload)
+        started.wait(1)
+        results = list(executor.map(get_carbon_data, [payload] * 3)) + [first.result()]
+
+    assert len(calls) == 1
+    assert results == [CO2E_DATA] * 4
+    assert get_carbon_data(payload) == CO2E_DATA and len(calls) == 1
+
+
+def test_request_deadline_caps_the_rate_limit_wait(monkeypatch):
+    """Tests that a call made within a deadline gives up once waiting would pass it."""
+
+    limiter = TokenBucket(rate=1, capacity=1)
+    limiter.acquire(0)
+
+    monkeypatch.setattr(extract, "get_climatiq_limiter", lambda: limiter)
+
+    with request_deadline(0.1):
+        assert get_max_wait() <= 0.1
+
+        with pytest.raises(TimeoutError):
+            extract.request_carbon_data({'travel_mode': 'rail'})
+
+    assert get_max_wait() == extract.CLIMATIQ_MAX_WAIT
+
+
+def test_deadline_failures_are_not_shared_with_calls_without_one(monkeypatch):
+    """Tests that a call without a deadline does not wait on, or fail with, one that has one."""
+
+    started, released = threading.Event(), threading.Event()
+    calls = []
+
+    def request(payload):
+        calls.append(get_remaining_time() is not None)
+        if calls[-1]:
+            started.set()
+            released.wait(1)
+            raise TimeoutError("Timed out waiting for the Climatiq rate limit.")
+        return CO2E_DATA
+
+    def get_carbon_data_within_deadline(payload):
+        with request_deadline(5):
+            return get_carbon_data(payload)
+
+    monkeypatch.setattr(extract, "ESTIMATION_MODE", "climatiq")
+    monkeypatch.setattr(extract, "get_emissions_cache", EmissionsCache)
+    monkeypatch.setattr(extract, "request_carbon_data", request)
+
+    payload = {'travel_mode': 'air', 'origin': {'iata': 'LHR'},
+               'destination': {'iata': 'EDI'}, 'air_details': {'class': 'economy'}}
+
+    with ThreadPoolExecutor(1) as executor:
+        within_deadline = executor.submit(get_carbon_data_within_deadline, payload)
+        started.wait(1)
+
+        assert get_carbon_data(payload) == CO2E_DATA
+
+        released.set()
+
+        with pytest.raises(TimeoutError):
+            within_deadline.result()
+
+    assert calls == [True, False]
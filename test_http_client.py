@@ -0,0 +1,128 @@
+"""Unit tests for the shared HTTP session."""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+
+import pytest
+import requests
+
+import http_client
+from http_client import (DEFAULT_TIMEOUT, TIMEOUTS, get_session, http_get, http_post,
+                         request_deadline)
+
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    """Fails the first GET and POST to each path with the status in the path, then succeeds."""
+
+    protocol_version = "HTTP/1.1"
+
+    def send(self, status: int) -> None:
+        """Sends an empty response with the status."""
+
+        self.server.requests.append((self.command, self.path, self.client_address))
+
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        if status == 429:
+            self.send_header("Retry-After", "0")
+        self.end_headers()
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """Fails the first request to /<status>."""
+
+        if (self.command, self.path) not in self.server.failed:
+            self.server.failed.add((self.command, self.path))
+            self.send(int(self.path.strip("/")))
+        else:
+            self.send(200)
+
+    do_POST = do_GET
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        """Keeps the test output quiet."""
+
+
+@pytest.fixture
+def server():
+    """Returns a local server that fails the first request to each path."""
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), FlakyHandler)
+    httpd.requests, httpd.failed = [], set()
+
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+
+    yield httpd
+
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def get_url(httpd, path: str) -> str:
+    """Returns the URL of a path on the local server."""
+
+    return f"http://127.0.0.1:{httpd.server_address[1]}{path}"
+
+
+@pytest.mark.parametrize("status", [429, 503])
+def test_requests_are_retried(server, status):
+    """Tests that rate limited and unavailable responses are retried until they succeed."""
+
+    assert http_get(get_url(server, f"/{status}"), "postcodes").status_code == 200
+    assert http_post(get_url(server, f"/{status}"), "climatiq").status_code == 200
+
+    assert [(method, path) for method, path, _ in server.requests] == [
+        ('GET', f"/{status}"), ('GET', f"/{status}"),
+        ('POST', f"/{status}"), ('POST', f"/{status}")]
+
+
+class RecordingSession:
+    """Records the keyword arguments of each request."""
+
+    def __init__(self, calls: list):
+        self.calls = calls
+
+    def request(self, method, url, **kwargs):
+        """Records a request."""
+        self.calls.append(kwargs)
+
+
+def test_requests_use_the_endpoint_timeout(monkeypatch):
+    """Tests that each endpoint gets its own timeout unless one is given."""
+
+    calls = []
+    monkeypatch.setattr(http_client, "get_session", lambda: RecordingSession(calls))
+
+    http_get("https://example.com", "postcodes")
+    http_post("https://example.com", "unknown")
+    http_post("https://example.com", "climatiq", timeout=1)
+
+    assert [c['timeout'] for c in calls] == [TIMEOUTS['postcodes'], DEFAULT_TIMEOUT, 1]
+
+
+def test_requests_within_a_deadline(monkeypatch):
+    """Tests that a deadline caps the timeout, skips retries and fails once passed."""
+
+    assert http_client.get_deadline_session().adapters["https://"].max_retries.total == 0
+
+    calls = []
+    monkeypatch.setattr(http_client, "get_deadline_session", lambda: RecordingSession(calls))
+
+    with request_deadline(1):
+        http_post("https://example.com", "climatiq")
+
+    with request_deadline(0), pytest.raises(requests.exceptions.Timeout):
+        http_post("https://example.com", "climatiq")
+
+    assert len(calls) == 1
+    assert max(calls[0]['timeout']) <= 1
+
+
+def test_session_is_reused(server):
+    """Tests that every call shares one session and keeps its connection alive."""
+
+    assert get_session() is get_session()
+
+    http_get(get_url(server, "/200"), "postcodes")
+    http_get(get_url(server, "/200"), "postcodes")
+
+    assert len({client_address for _, _, client_address in server.requests}) == 1
@@ -0,0 +1,174 @@
+"""Unit tests for the journey outbox."""
+
+from datetime import datetime
+
+from bson import ObjectId
+from bson.errors import InvalidDocument
+import mongomock
+import pymongo
+import pytest
+
+from database import get_user_summary
+from journey_outbox import JourneyOutbox, OutboxFlusher
+
+
+def make_journey(user_id: ObjectId, total: float) -> dict:
+    """Returns a journey document as submitted by the dashboard."""
+
+    return {'user_id': user_id, 'transport': {'type': 'rail'},
+            'co2e': {'total': total, 'direct': total * 0.8, 'indirect': total * 0.2},
+            'distance': 10.0, 'submitted_at': datetime(2024, 1, 1, 12, 30)}
+
+
+def test_outbox_round_trips_journeys(tmp_path):
+    """Tests that journeys are given an _id and survive reopening the outbox, oldest first."""
+
+    path = str(tmp_path / "outbox.db")
+    user_id = ObjectId()
+
+    outbox = JourneyOutbox(path)
+    journey_ids = [outbox.append(make_journey(user_id, total)) for total in (1.0, 2.0)]
+
+    assert outbox.appended.is_set()
+
+    journeys = JourneyOutbox(path).peek(10)
+
+    assert [j['_id'] for j in journeys] == journey_ids
+    assert journeys[0] == make_journey(user_id, 1.0) | {'_id': journey_ids[0]}
+
+
+def test_flush_is_idempotent():
+    """Tests that flushing inserts each journey once, even if it is already stored."""
+
+    journey_collection = mongomock.MongoClient().db.journeys
+    outbox = JourneyOutbox()
+    user_id = ObjectId()
+    flushed = []
+
+    journey_id = outbox.append(make_journey(user_id, 1.0))
+    outbox.append(make_journey(user_id, 2.0))
+
+    # A journey inserted before the outbox was told it had been.
+    journey_collection.insert_one(outbox.peek(1)[0])
+
+    flusher = OutboxFlusher(outbox, journey_collection, batch_size=1, on_flush=flushed.extend)
+
+    assert flusher.flush() == 2
+    assert outbox.size() == 0
+    assert journey_collection.count_documents({'user_id': user_id}) == 2
+    assert flushed[0]['_id'] == journey_id
+    # The journey that was already stored is counted in the rollup too.
+    assert get_user_summary(journey_collection, user_id).num_journeys == 2
+
+
+def test_retried_batch_is_added_to_an_existing_rollup():
+    """Tests that a journey stored by a failed flush is counted when the batch is retried."""
+
+    journey_collection = mongomock.MongoClient().db.journeys
+    outbox = JourneyOutbox()
+    user_id = ObjectId()
+
+    outbox.append(make_journey(user_id, 1.0))
+    OutboxFlusher(outbox, journey_collection).flush()
+
+    outbox.append(make_journey(user_id, 2.0))
+
+    # Stored by a flush that failed before its stats were updated.
+    journey_collection.insert_one(outbox.peek(1)[0])
+
+    OutboxFlusher(outbox, journey_collection).flush()
+
+    summary = get_user_summary(journey_collection, user_id)
+    assert summary.num_journeys == 2
+    assert summary.total_co2e == 3.0
+
+
+def test_flush_keeps_journeys_when_the_database_fails(monkeypatch):
+    """Tests that journeys stay in the outbox when they cannot be inserted."""
+
+    journey_collection = mongomock.MongoClient().db.journeys
+    outbox = JourneyOutbox()
+    outbox.append(make_journey(ObjectId(), 1.0))
+
+    def fail(*args, **kwargs):
+        raise pymongo.errors.AutoReconnect("No primary")
+
+    monkeypatch.setattr(journey_collection, "insert_many", fail)
+
+    with pytest.raises(pymongo.errors.AutoReconnect):
+        OutboxFlusher(outbox, journey_collection).flush()
+
+    assert outbox.size() == 1
+
+
+def test_flush_dead_letters_journeys_that_can_never_be_inserted(monkeypatch):
+    """Tests that a rejected journey is moved aside while the rest of its batch is flushed."""
+
+    journey_collection = mongomock.MongoClient().db.journeys
+    outbox = JourneyOutbox()
+    user_id = ObjectId()
+
+    rejected_id = outbox.append(make_journey(user_id, 1.0))
+    outbox.append(make_journey(user_id, 2.0))
+
+    insert_many = journey_collection.insert_many
+
+    def reject_first(journeys, **kwargs):
+        if journeys[0]['_id'] != rejected_id:
+            return insert_many(journeys, **kwargs)
+
+        insert_many(journeys[1:], **kwargs)
+        raise pymongo.errors.BulkWriteError({'writeErrors': [
+            {'index': 0, 'code': 121, 'errmsg': "Document failed validation"}]})
+
+    monkeypatch.setattr(journey_collection, "insert_many", reject_first)
+
+    assert OutboxFlusher(outbox, journey_collection).flush() == 1
+    assert outbox.size() == 0
+    assert [d['journey']['_id'] for d in outbox.get_dead_letters()] == [rejected_id]
+    assert get_user_summary(journey_collection, user_id).total_co2e == 2.0
+
+
+def test_flush_dead_letters_journeys_that_cannot_be_encoded(monkeypatch):
+    """Tests that a journey which is not valid BSON is moved aside without blocking the rest."""
+
+    journey_collection = mongomock.MongoClient().db.journeys
+    outbox = JourneyOutbox()
+    user_id = ObjectId()
+
+    outbox.append(make_journey(user_id, 1.0))
+    outbox.append(make_journey(user_id, 2.0))
+
+    flusher = OutboxFlusher(outbox, journey_collection)
+    invalid = outbox.peek(1)[0]
+
+    def insert_journeys(collection, journeys):
+        if any(j['_id'] == invalid['_id'] for j in journeys):
+            raise InvalidDocument("key '$total' must not start with '$'")
+        collection.insert_many(journeys)
+
+    monkeypatch.setattr("journey_outbox.insert_journeys", insert_journeys)
+
+    assert flusher.flush() == 1
+    assert outbox.size() == 0
+    assert len(outbox.get_dead_letters()) == 1
+    assert journey_collection.count_documents({}) == 1
+
+
+def test_journeys_leave_the_outbox_after_on_flush():
+    """Tests that a journey is pending until on_flush has run, then flushed."""
+
+    journey_collection = mongomock.MongoClient().db.journeys
+    outbox = JourneyOutbox()
+    journey_id = outbox.append(make_journey(ObjectId(), 1.0))
+    states = []
+
+    flusher = OutboxFlusher(outbox, journey_collection,
+                            on_flush=lambda batch: states.append(outbox.get_state(journey_id)))
+
+    assert outbox.get_state(journey_id) == 'pending'
+
+    flusher.flush()
+
+    assert states == ['pending']
+    assert outbox.get_state(journey_id) == 'flushed'
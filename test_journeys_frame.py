@@ -0,0 +1,50 @@
+"""Unit tests for the columnar journeys dataframe builder."""
+
+from datetime import datetime
+
+from bson import ObjectId
+import mongomock
+import numpy as np
+
+from database import get_journeys_cursor
+from journeys_frame import build_journeys_df
+
+USER_ID = ObjectId()
+
+JOURNEYS = [
+    {'user_id': USER_ID, 'transport': {'type': 'car', 'car_size': 'small', 'car_type': 'petrol'},
+     'origin': {'name': "Bath", 'lat': 51.38, 'lon': -2.36},
+     'destination': {'name': "Bristol", 'lat': 51.45, 'lon': -2.58},
+     'co2e': {'total': 3.0, 'direct': 2.5, 'indirect': 0.5}, 'distance': 20.0,
+     'submitted_at': datetime(2023, 1, 2)},
+    {'user_id': USER_ID, 'transport': {'type': 'air', 'cabin_class': 'economy'},
+     'origin': {'name': "Heathrow", 'lat': 51.47, 'lon': -0.45},
+     'destination': {'name': "Edinburgh", 'lat': 55.95, 'lon': -3.37},
+     'co2e': {'total': 80.0, 'direct': 70.0, 'indirect': 10.0}, 'distance': 530.0,
+     'submitted_at': datetime(2023, 1, 1)}
+]
+
+
+def test_build_journeys_df_types_columns():
+    """Tests that nested fields become typed columns, missing ones empty."""
+
+    journeys_df = build_journeys_df(JOURNEYS, batch_size=1)
+
+    assert journeys_df['transport'].dtype == 'category'
+    assert journeys_df['total'].dtype == np.float32
+    assert journeys_df['submitted_at'].dtype == 'datetime64[ns]'
+    assert journeys_df['origin_name'].to_list() == ["Bath", "Heathrow"]
+    assert journeys_df['car_size'].isna().to_list() == [False, True]
+    assert journeys_df['dest_lat'].to_list() == [np.float32(51.45), np.float32(55.95)]
+
+
+def test_build_journeys_df_from_cursor():
+    """Tests that journeys are read from a cursor newest first, or an empty frame built."""
+
+    journeys = mongomock.MongoClient().db.journeys
+    journeys.insert_many(reversed(JOURNEYS))
+
+    journeys_df = build_journeys_df(get_journeys_cursor(journeys, USER_ID, batch_size=1))
+
+    assert journeys_df['distance'].to_list() == [20.0, 530.0]
+    assert build_journeys_df([]).empty
@@ -0,0 +1,69 @@
+"""Unit tests for the hot path instrumentation."""
+
+import pytest
+
+from async_extract import run_blocking, run_sync
+from metrics import MetricsRegistry, get_rerun_timings, start_rerun, timed
+
+
+def test_timed_records_rerun_timings():
+    """Tests that decorated calls and timed blocks are added to the current rerun."""
+
+    @timed('test')
+    def double(value):
+        return value * 2
+
+    start_rerun()
+
+    assert double(2) == 4
+
+    with pytest.raises(ValueError):
+        with timed('test', 'block'):
+            raise ValueError
+
+    timings = get_rerun_timings()
+
+    assert [(t['component'], t['operation'], t['failed']) for t in timings] == [
+        ('test', 'double', False), ('test', 'block', True)]
+    assert all(t['ms'] >= 0 for t in timings)
+
+
+def test_rerun_timings_cross_threads():
+    """Tests that operations run in the thread pool are recorded in the rerun that started them."""
+
+    timings = start_rerun()
+
+    run_sync(run_blocking(timed('test', 'worker')(lambda: None)))
+
+    assert [t['operation'] for t in timings] == ['worker']
+
+
+def test_to_prometheus():
+    """Tests that durations are exported as cumulative histogram buckets with error counts."""
+
+    registry = MetricsRegistry()
+    registry.observe('mongo', 'find', 0.003)
+    registry.observe('mongo', 'find', 0.2, failed=True)
+
+    text = registry.to_prometheus()
+
+    labels = 'component="mongo",operation="find"'
+
+    assert f'greenroute_operation_seconds_bucket{{{labels},le="0.001"}} 0' in text
+    assert f'greenroute_operation_seconds_bucket{{{labels},le="0.005"}} 1' in text
+    assert f'greenroute_operation_seconds_bucket{{{labels},le="0.25"}} 2' in text
+    assert f'greenroute_operation_seconds_count{{{labels}}} 2' in text
+    assert f'greenroute_operation_errors_total{{{labels}}} 1' in text
+    assert registry.snapshot()[0]['errors'] == 1
+
+
+def test_gauges_are_exported():
+    """Tests that registered gauges, such as the MongoDB pool's, are read on export."""
+
+    registry = MetricsRegistry()
+    checked_out = iter([1, 2])
+
+    registry.register_gauges('mongo_pool', lambda: {'checked_out': next(checked_out)})
+
+    assert "greenroute_mongo_pool_checked_out 1" in registry.to_prometheus()
+    assert registry.read_gauges() == {'mongo_pool': {'checked_out': 2}}
@@ -0,0 +1,58 @@
+"""Unit tests for the offline emissions estimator."""
+
+import re
+
+import numpy as np
+import pytest
+
+from location_index import LocationIndex
+import offline_estimator
+from offline_estimator import estimate_carbon_data, estimate_emissions, haversine
+
+AIRPORT_INDEX = LocationIndex(["Heathrow Airport", "Edinburgh Airport"], [51.4700, 55.9500],
+                              [-0.4543, -3.3725], ["LHR", "EDI"], code_key='iata', kind="airport")
+
+
+def test_haversine():
+    """Tests the great-circle distance from London to Edinburgh."""
+
+    distance = haversine(np.array([51.5074]), np.array([-0.1278]),
+                         np.array([55.9533]), np.array([-3.1883]))
+
+    assert distance[0] == pytest.approx(534, abs=1)
+
+
+def test_estimate_emissions_is_vectorised():
+    """Tests that each journey uses the factor for its own mode."""
+
+    estimates = estimate_emissions(np.array(["rail", "car|small|petrol"]),
+                                   np.array([51.0, 51.0]), np.array([-2.0, -2.0]),
+                                   np.array([52.0, 52.0]), np.array([-2.0, -2.0]))
+
+    assert estimates['distance'][1] > estimates['distance'][0]
+    assert estimates['co2e'][1] > estimates['co2e'][0]
+    np.testing.assert_allclose(
+        estimates['co2e'], estimates['direct_co2e'] + estimates['indirect_co2e'])
+
+
+def test_estimate_carbon_data_matches_climatiq_shape(monkeypatch):
+    """Tests that a flight estimate has the same keys as get_carbon_data."""
+
+    monkeypatch.setattr(offline_estimator, "get_airport_index", lambda: AIRPORT_INDEX)
+
+    flight = {"travel_mode": "air", "origin": {"iata": "LHR"},
+              "destination": {"iata": "EDI"}, "air_details": {"class": "economy"}}
+
+    co2e_data = estimate_carbon_data(flight)
+
+    assert set(co2e_data) == {'co2e', 'direct_co2e',
+                              'indirect_co2e', 'distance'}
+    assert co2e_data['distance'] > 500
+
+
+def test_estimate_emissions_unknown_factor():
+    """Tests that an unknown car type raises a clear error."""
+
+    with pytest.raises(ValueError, match=re.escape("car|small|steam")):
+        estimate_emissions(np.array(["car|small|steam"]), np.array([51.0]), np.array([0.0]),
+                           np.array([52.0]), np.array([0.0]))
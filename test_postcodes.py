@@ -0,0 +1,67 @@
+"""Unit tests for the postcode resolver."""
+
+import postcodes
+from postcodes import PostcodeResolver
+
+BATH_RESULT = {'postcode': 'BA1 1AA', 'parish': 'Bath, unparished area',
+               'admin_ward': 'Kingsmead', 'latitude': 51.38, 'longitude': -2.36}
+
+
+class FakeResponse:
+    """A stand-in for a requests response."""
+
+    def __init__(self, status_code: int, data: dict):
+        self.status_code = status_code
+        self.data = data
+
+    def json(self) -> dict:
+        """Returns the response body."""
+        return self.data
+
+
+def test_resolve_memoises_results(monkeypatch):
+    """Tests that a postcode is only requested once."""
+
+    calls = []
+
+    def fake_get(url, endpoint):
+        calls.append(url)
+        return FakeResponse(200, {'result': BATH_RESULT})
+
+    monkeypatch.setattr(postcodes, "http_get", fake_get)
+
+    resolver = PostcodeResolver()
+
+    assert resolver.resolve("ba1 1aa") == {
+        'name': 'Bath', 'lat': 51.38, 'long': -2.36}
+    assert resolver.is_valid("BA11AA")
+    assert len(calls) == 1
+
+
+def test_resolve_invalid_postcode(monkeypatch):
+    """Tests that unknown postcodes resolve to None."""
+
+    monkeypatch.setattr(postcodes, "http_get",
+                        lambda url, endpoint: FakeResponse(404, {'error': 'Invalid postcode'}))
+
+    assert PostcodeResolver().resolve("XX1 1XX") is None
+
+
+def test_resolve_many_uses_bulk_lookup(monkeypatch):
+    """Tests that unknown postcodes are resolved in one bulk request."""
+
+    requested = []
+
+    def fake_post(url, endpoint, json):
+        requested.append(json['postcodes'])
+        return FakeResponse(200, {'result': [
+            {'query': 'BA11AA', 'result': BATH_RESULT},
+            {'query': 'XX11XX', 'result': None}]})
+
+    monkeypatch.setattr(postcodes, "http_post", fake_post)
+
+    locations = PostcodeResolver().resolve_many(["BA1 1AA", "XX1 1XX"])
+
+    assert requested == [['BA11AA', 'XX11XX']]
+    assert locations == {'BA1 1AA': {'name': 'Bath', 'lat': 51.38, 'long': -2.36},
+                         'XX1 1XX': None}
@@ -0,0 +1,48 @@
+"""Unit tests for the API rate limiter and call coalescing."""
+
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+
+from rate_limit import SingleFlight, TokenBucket
+
+
+def test_token_bucket_bursts_then_queues():
+    """Tests that a burst is allowed, then callers queue until the wait is too long."""
+
+    bucket = TokenBucket(rate=10, capacity=2)
+
+    assert bucket.reserve(0) == 0
+    assert bucket.reserve(0) == 0
+    assert bucket.reserve(0) is None
+    assert 0.09 < bucket.reserve(0.15) <= 0.1
+    assert 0.19 < bucket.reserve(0.25) <= 0.2
+    assert bucket.reserve(0.25) is None
+
+
+def test_single_flight_coalesces_calls():
+    """Tests that calls with the same key made at once share one call and its result."""
+
+    flights = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def slow_call(value):
+        calls.append(value)
+        release.wait(1)
+        return {'value': value}
+
+    with ThreadPoolExecutor(4) as executor:
+
+        futures = [executor.submit(flights.do, 'key', slow_call, 1) for _ in range(4)]
+
+        while flights.coalesced < 3:
+            time.sleep(0.01)
+
+        release.set()
+
+        results = [f.result() for f in futures]
+
+    assert calls == [1]
+    assert results == [{'value': 1}] * 4
+    assert flights.do('key', slow_call, 2) == {'value': 2}
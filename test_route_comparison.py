@@ -0,0 +1,58 @@
+"""Unit tests for the multi-mode route comparison."""
+
+import threading
+
+from async_extract import run_sync
+from location_index import LocationIndex
+import route_comparison
+from route_comparison import compare_routes_async, get_nearest_airport
+
+AIRPORT_INDEX = LocationIndex(["Heliport", "Bristol Airport", "Edinburgh Airport"],
+                              [51.45, 51.3827, 55.95], [-2.58, -2.7191, -3.3725],
+                              [None, "BRS", "EDI"], code_key='iata', kind="airport")
+
+BRISTOL = {'lat': 51.449142, 'long': -2.581315}
+EDINBURGH = {'lat': 55.952061, 'long': -3.188228}
+
+
+def get_carbon_data(co2e: float) -> dict:
+    """Returns CO2e data with the given total."""
+
+    return {'co2e': co2e, 'direct_co2e': co2e * 0.8,
+            'indirect_co2e': co2e * 0.2, 'distance': 500.0}
+
+
+def test_get_nearest_airport():
+    """Tests that the nearest airport with a code is found, if it is close enough."""
+
+    assert get_nearest_airport(BRISTOL, AIRPORT_INDEX)['iata'] == "BRS"
+    assert get_nearest_airport({'lat': 0.0, 'long': 0.0}, AIRPORT_INDEX) is None
+
+
+def test_compare_routes_ranks_partial_results(monkeypatch):
+    """Tests that modes are ranked by CO2e, leaving out any that fail or miss the deadline."""
+
+    released = threading.Event()
+
+    def slow_flight(origin, destination, cabin_class):
+        released.wait(5)
+        return get_carbon_data(100.0)
+
+    def car(origin, destination, car_details):
+        if car_details['car_type'] == 'battery':
+            raise ConnectionError("Could not connect to the API.")
+        return get_carbon_data({'small': 30.0, 'medium': 40.0, 'large': 50.0}[
+            car_details['car_size']])
+
+    monkeypatch.setattr(route_comparison, "get_carbon_rail_data",
+                        lambda origin, destination: get_carbon_data(10.0))
+    monkeypatch.setattr(route_comparison, "get_car_carbon_data", car)
+    monkeypatch.setattr(route_comparison, "get_flight_carbon_data", slow_flight)
+
+    comparison = run_sync(compare_routes_async(BRISTOL, EDINBURGH, AIRPORT_INDEX, deadline=0.2))
+    released.set()
+
+    assert [(o['label'], o['co2e']) for o in comparison['options']] == [
+        ('Train', 10.0), ('Small car', 30.0), ('Medium car', 40.0), ('Large car', 50.0)]
+    assert comparison['options'][0]['mode'] == 'rail'
+    assert comparison['missing'] == ['Electric car', 'Flight']
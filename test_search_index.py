@@ -0,0 +1,29 @@
+"""Unit tests for the station and airport search index."""
+
+from search_index import SearchIndex, normalise_search
+
+STATIONS = SearchIndex(["London Kings Cross", "Kingston", "Kings Langley", "York"],
+                       ["KGX", "KNG", "KGL", "YRK"])
+
+
+def test_normalise_search():
+    """Tests that case, punctuation and spacing are ignored."""
+
+    assert normalise_search("  St. Pancras  (International) ") == "st pancras international"
+
+
+def test_search_ranks_name_prefixes_before_later_words():
+    """Tests that names starting with the query beat names with a later word starting with it."""
+
+    assert [name for _, name in STATIONS.search("kings")] == [
+        "Kingston", "Kings Langley", "London Kings Cross"]
+    assert STATIONS.search("kings cr") == [("London Kings Cross (KGX)", "London Kings Cross")]
+
+
+def test_search_ranks_exact_codes_first():
+    """Tests that an exact code beats name matches and that results are limited."""
+
+    assert STATIONS.search("YRK")[0] == ("York (YRK)", "York")
+    assert STATIONS.search("kg")[0][1] == "London Kings Cross"
+    assert len(STATIONS.search("k", limit=2)) == 2
+    assert not STATIONS.search("") and not STATIONS.search("Atlantis")
@@ -0,0 +1,53 @@
+"""Unit tests for the background submission worker."""
+
+import threading
+
+import pytest
+
+from submission_worker import SubmissionWorker
+
+
+def test_submit_tracks_job_status():
+    """Tests that jobs report their status and result, or the error they raised."""
+
+    worker = SubmissionWorker(max_workers=2, max_pending=4)
+    release = threading.Event()
+
+    def fail():
+        raise ValueError("Invalid postcode: ZZ1 1ZZ")
+
+    job_id = worker.submit("Bath to Bristol", lambda: release.wait(1) and {'co2e': 1.0})
+    failed_id = worker.submit("ZZ1 1ZZ to Bath", fail)
+
+    assert worker.get_status(job_id)['status'] in ('queued', 'running')
+    assert worker.get_status(job_id)['name'] == "Bath to Bristol"
+
+    release.set()
+
+    assert worker.wait(job_id, 1)['status'] == 'done'
+    assert worker.get_status(job_id)['result'] == {'co2e': 1.0}
+    assert worker.wait(failed_id, 1)['status'] == 'failed'
+    assert worker.get_status(failed_id)['error'] == "Invalid postcode: ZZ1 1ZZ"
+    assert worker.get_status("unknown") is None
+    assert worker.get_pending_count() == 0
+
+
+def test_submit_refuses_jobs_when_full():
+    """Tests that jobs beyond max_pending are refused until a slot frees up."""
+
+    worker = SubmissionWorker(max_workers=1, max_pending=2)
+    release = threading.Event()
+
+    job_ids = [worker.submit("Journey", release.wait, 1) for _ in range(2)]
+
+    with pytest.raises(RuntimeError):
+        worker.submit("Journey", release.wait, 1)
+
+    assert worker.get_pending_count() == 2
+
+    release.set()
+
+    for job_id in job_ids:
+        worker.wait(job_id, 1)
+
+    assert worker.wait(worker.submit("Journey", lambda: None), 1)['status'] == 'done'
@@ -0,0 +1,49 @@
+"""Unit tests for the journey summary."""
+
+import dataclasses
+
+import pytest
+
+from summary import summarise_totals
+
+TRANSPORT_TOTALS = [
+    {'transport': 'air', 'journeys': 1, 'total': 100.0, 'direct': 80.0, 'indirect': 20.0,
+     'distance': 500.0},
+    {'transport': 'car', 'journeys': 2, 'total': 16.0, 'direct': 13.0, 'indirect': 3.0,
+     'distance': 40.0},
+    {'transport': 'rail', 'journeys': 2, 'total': 6.0, 'direct': 4.5, 'indirect': 1.5,
+     'distance': 100.0}
+]
+
+
+def test_summarise_totals():
+    """Tests that counts, totals and averages are computed per transport, most used first."""
+
+    summary = summarise_totals(TRANSPORT_TOTALS)
+
+    assert summary.transports == ('car', 'rail', 'air')
+    assert summary.labels == ('Car', 'Rail', 'Air')
+    assert summary.journeys == (2, 2, 1)
+    assert summary.total == (16.0, 6.0, 100.0)
+    assert summary.average == (8.0, 3.0, 100.0)
+    assert summary.average_km == (0.4, 0.06, 0.2)
+    assert summary.most_popular == ('car', 'rail')
+    assert summary.num_journeys == 5 and summary.total_co2e == 122.0
+
+
+def test_summary_is_immutable():
+    """Tests that a summary cannot be changed once built."""
+
+    summary = summarise_totals(TRANSPORT_TOTALS)
+
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        summary.total = ()
+
+
+def test_summarise_without_journeys():
+    """Tests that a user without journeys, or only emptied transports, gets an empty summary."""
+
+    summary = summarise_totals([TRANSPORT_TOTALS[0] | {'journeys': 0, 'total': 0.0}])
+
+    assert summary.empty and summary.num_journeys == 0
+    assert summary == summarise_totals([])
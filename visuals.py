@@ -1,10 +1,14 @@
 """Visualisations for the dashboard."""
 
 import altair as alt
+import numpy as np
 import pandas as pd
 import pydeck as pdk
 from pydeck.data_utils import compute_view
 
+from metrics import timed
+from summary import JourneySummary
+
 GREEN_RGB = [26, 147, 111]
 
 PIE_COLOURS = ["#1A936F", "#88D498", "#114B5F"]
@@ -26,6 +30,7 @@ def get_zoom_data(journey_data: dict) -> pdk.ViewState:
     return zoom
 
 
+@timed('pydeck')
 def get_journey_map(journey_data: dict) -> pdk.Deck:
     """Returns a map of the journey."""
 
@@ -68,24 +73,27 @@ def get_journey_map(journey_data: dict) -> pdk.Deck:
     return journey_map
 
 
-def get_car_train_bar(total_co2e: float) -> alt.Chart:
+@timed('altair')
+def get_comparison_bar(comparison: dict, journey_co2e: float) -> alt.Chart:
     """
-    Returns a bar chart comparing emissions from a train journey and
-    the equivalent car journey.
+    Returns a bar chart of the emissions of each way of making a journey,
+    lowest first, alongside the journey as made.
     """
 
-    data = pd.DataFrame([{'transport': "Train", 'total': total_co2e}, {
-        'transport': "Car", 'total': round(total_co2e * 5, 2)}])
+    data = pd.DataFrame([{'option': "Your journey", 'total': round(journey_co2e, 2)}] + [
+        {'option': o['label'], 'total': round(o['co2e'], 2)} for o in comparison['options']])
+
+    data['yours'] = data['option'] == "Your journey"
 
     base = alt.Chart(data).encode(
-        x=alt.X('transport', title=None, axis=alt.Axis(labelAngle=0)),
-        y=alt.Y('total', title=None, axis=None),
-        color=alt.Color('transport', scale=alt.Scale(
-            range=PIE_COLOURS), legend=None)
-    ).properties(height=200, width=140)
+        y=alt.Y('option', title=None, sort=alt.EncodingSortField('total')),
+        x=alt.X('total', title=None, axis=None),
+        color=alt.Color('yours', scale=alt.Scale(
+            domain=[True, False], range=PIE_COLOURS[:2]), legend=None)
+    ).properties(height=28 * len(data))
 
     text = base.transform_calculate(label_with_kg="datum.total + 'kg'").mark_text(
-        align='center', baseline='bottom', fontSize=12, fontWeight=600, dy=-3
+        align='left', baseline='middle', fontSize=12, fontWeight=600, dx=3
     ).encode(
         text='label_with_kg:N'
     )
@@ -95,6 +103,7 @@ def get_car_train_bar(total_co2e: float) -> alt.Chart:
     return chart
 
 
+@timed('altair')
 def get_carbon_pie(journey_data: dict) -> alt.Chart:
     """Returns a pie chart of the direct and indirect carbon emissions."""
 
@@ -120,6 +129,7 @@ def get_carbon_pie(journey_data: dict) -> alt.Chart:
     return pie + text
 
 
+@timed('altair')
 def get_transport_bar(journeys_df: pd.DataFrame) -> alt.Chart:
     """Returns a bar chart of CO2 per transport."""
 
@@ -133,15 +143,16 @@ def get_transport_bar(journeys_df: pd.DataFrame) -> alt.Chart:
     return bar_chart
 
 
-def get_transport_avgs(journeys_df: pd.DataFrame) -> alt.Chart:
+@timed('altair')
+def get_transport_avgs(summary: JourneySummary) -> alt.Chart:
     """Returns a bar chart of average CO2 per journey for each transport."""
 
-    journeys_df['transport'] = journeys_df['transport'].apply(
-        lambda x: x.capitalize())
+    data = pd.DataFrame({'transport': summary.labels,
+                         'average': np.round(summary.average, 2)})
 
-    chart = alt.Chart(journeys_df).mark_bar().encode(
+    chart = alt.Chart(data).mark_bar().encode(
         x=alt.X('transport', title=""),
-        y=alt.Y('mean(total)', title='CO2 (kg)'),
+        y=alt.Y('average', title='CO2 (kg)'),
         color=alt.Color('transport',
                         scale=alt.Scale(range=PIE_COLOURS)).legend(None)
     ).configure_axis(grid=False)
@@ -149,33 +160,12 @@ def get_transport_avgs(journeys_df: pd.DataFrame) -> alt.Chart:
     return chart
 
 
-def get_transport_avg_km(journeys_df: pd.DataFrame) -> alt.Chart:
-    """Returns a bar chart of CO2 per transport."""
-
-    co2_tot = journeys_df.groupby('transport')['total'].sum()
-    tot_dist = journeys_df.groupby('transport')['distance'].sum()
-
-    data = []
-
-    if 'Air' in journeys_df['transport'].values:
-        air_tot = co2_tot['Air']
-        air_dist = tot_dist['Air']
-        air_avg_km = round(air_tot / air_dist, 2)
-        data.append({'transport': 'Air', 'average': air_avg_km})
-
-    if 'Car' in journeys_df['transport'].values:
-        car_tot = co2_tot['Car']
-        car_dist = tot_dist['Car']
-        car_avg_km = round(car_tot / car_dist, 2)
-        data.append({'transport': 'Car', 'average': car_avg_km})
+@timed('altair')
+def get_transport_avg_km(summary: JourneySummary) -> alt.Chart:
+    """Returns a bar chart of CO2 per km for each transport."""
 
-    if 'Rail' in journeys_df['transport'].values:
-        rail_tot = co2_tot['Rail']
-        rail_dist = tot_dist['Rail']
-        rail_avg_km = round(rail_tot / rail_dist, 2)
-        data.append({'transport': 'Rail', 'average': rail_avg_km})
-
-    transport_data = pd.DataFrame(data)
+    transport_data = pd.DataFrame({'transport': summary.labels,
+                                   'average': np.round(summary.average_km, 2)})
 
     bar_chart = alt.Chart(transport_data).mark_bar().encode(
         x=alt.X('transport', title=""),
@@ -187,26 +177,12 @@ def get_transport_avg_km(journeys_df: pd.DataFrame) -> alt.Chart:
     return bar_chart
 
 
-def get_transport_donut(journeys_df: pd.DataFrame) -> alt.Chart:
-    """Returns a bar chart of CO2 per transport."""
-
-    totals = journeys_df.groupby('transport')['total'].sum()
-
-    data = []
-
-    if 'air' in journeys_df['transport'].values:
-        air_tot = totals['air']
-        data.append({'transport': 'Air', 'total': round(air_tot, 1)})
-
-    if 'rail' in journeys_df['transport'].values:
-        rail_tot = totals['rail']
-        data.append({'transport': 'Rail', 'total': round(rail_tot, 1)})
-
-    if 'car' in journeys_df['transport'].values:
-        car_tot = totals['car']
-        data.append({'transport': 'Car', 'total': round(car_tot, 1)})
+@timed('altair')
+def get_transport_donut(summary: JourneySummary) -> alt.Chart:
+    """Returns a donut chart of total CO2 per transport."""
 
-    transport_data = pd.DataFrame(data)
+    transport_data = pd.DataFrame({'transport': summary.labels,
+                                   'total': np.round(summary.total, 1)})
 
     base = alt.Chart(transport_data).encode(
         theta=alt.Theta('total', stack=True)